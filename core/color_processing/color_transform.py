@@ -1,14 +1,15 @@
 import numpy as np
 
-def rgb_to_ycbcr(image):
+def rgb_to_ycbcr(image, validate=True):
     if image.ndim != 3 or image.shape[2] != 3:
         raise ValueError("Ảnh đầu vào phải có dạng (H, W, 3)")
     if not np.issubdtype(image.dtype, np.integer) and not np.issubdtype(image.dtype, np.floating):
         raise ValueError("Ảnh phải có dtype số (int hoặc float)")
-    if np.isnan(image).any() or np.isinf(image).any():
-        raise ValueError("Ảnh không được chứa NaN hoặc Inf")
-    if image.max() > 255 or image.min() < 0:
-        raise ValueError("Giá trị pixel RGB phải nằm trong [0, 255]")
+    if validate:
+        if np.isnan(image).any() or np.isinf(image).any():
+            raise ValueError("Ảnh không được chứa NaN hoặc Inf")
+        if image.max() > 255 or image.min() < 0:
+            raise ValueError("Giá trị pixel RGB phải nằm trong [0, 255]")
     
     image = image.astype(np.float32)
     coeffs = np.array([
@@ -20,15 +21,16 @@ def rgb_to_ycbcr(image):
     ycbcr[:, :, 1:] += 128.0
     return ycbcr
 
-def ycbcr_to_rgb(ycbcr):
+def ycbcr_to_rgb(ycbcr, validate=True):
     if ycbcr.ndim != 3 or ycbcr.shape[2] != 3:
         raise ValueError("Ảnh đầu vào phải có dạng (H, W, 3)")
     if not np.issubdtype(ycbcr.dtype, np.integer) and not np.issubdtype(ycbcr.dtype, np.floating):
         raise ValueError("Ảnh phải có dtype số (int hoặc float)")
-    if np.isnan(ycbcr).any() or np.isinf(ycbcr).any():
-        raise ValueError("Ảnh không được chứa NaN hoặc Inf")
-    if ycbcr.max() > 255 or ycbcr.min() < 0:
-        raise ValueError("Giá trị YCbCr phải nằm trong [0, 255]")
+    if validate:
+        if np.isnan(ycbcr).any() or np.isinf(ycbcr).any():
+            raise ValueError("Ảnh không được chứa NaN hoặc Inf")
+        if ycbcr.max() > 255 or ycbcr.min() < 0:
+            raise ValueError("Giá trị YCbCr phải nằm trong [0, 255]")
 
     ycbcr = ycbcr.astype(np.float32)
     ycbcr[:, :, 1:] -= 128.0
@@ -39,3 +41,107 @@ def ycbcr_to_rgb(ycbcr):
     ])
     rgb = ycbcr @ coeffs.T
     return np.clip(np.round(rgb), 0, 255).astype(np.uint8)
+
+# Chuyển màu số nguyên kiểu libjpeg (jccolor/jdcolor): hệ số nhân 2**SCALEBITS, cộng dồn int32 qua bảng tra 256 phần tử
+SCALEBITS = 16
+ONE_HALF = 1 << (SCALEBITS - 1)
+CBCR_OFFSET = 128 << SCALEBITS
+
+def _fix(x):
+    return int(x * (1 << SCALEBITS) + 0.5)
+
+def _rgb_ycc_tables():
+    i = np.arange(256, dtype=np.int64)
+    # Bảng [thành phần ra][kênh vào]; ONE_HALF (làm tròn) và độ lệch 128 gộp vào bảng B (Y, Cb) và R (Cr)
+    tables = np.array([
+        [_fix(0.299) * i, _fix(0.587) * i, _fix(0.114) * i + ONE_HALF],
+        [-_fix(0.168736) * i, -_fix(0.331264) * i, _fix(0.5) * i + CBCR_OFFSET + ONE_HALF - 1],
+        [_fix(0.5) * i + CBCR_OFFSET + ONE_HALF - 1, -_fix(0.418688) * i, -_fix(0.081312) * i],
+    ])
+    return tables.astype(np.int32)
+
+def _ycc_rgb_tables():
+    x = np.arange(256, dtype=np.int64) - 128
+    return {
+        'cr_r': ((_fix(1.402) * x + ONE_HALF) >> SCALEBITS).astype(np.int16),
+        'cb_b': ((_fix(1.772) * x + ONE_HALF) >> SCALEBITS).astype(np.int16),
+        'cr_g': (-_fix(0.714136) * x).astype(np.int32),
+        'cb_g': (-_fix(0.344136) * x + ONE_HALF).astype(np.int32),
+    }
+
+RGB_YCC_TABLES = _rgb_ycc_tables()
+YCC_RGB_TABLES = _ycc_rgb_tables()
+
+def rgb_to_ycbcr_planar(image, multiple=(8, 8), dtype=np.float32):
+    """
+    Chuyển RGB uint8 sang YCbCr bằng số nguyên (bảng tra int32, dịch phải SCALEBITS), ghi thẳng vào
+    mặt phẳng (3, H', W') cấp phát trước, H', W' là bội của `multiple` và phần pad lặp lại pixel biên
+    như pad_image_to_multiple_of_8. Layout planar là layout split_into_blocks dùng, không cần transpose.
+
+    Parameters:
+    -----------
+    image : ndarray
+        Ảnh RGB (H, W, 3), dtype=uint8
+    multiple : tuple, optional
+        (cao, rộng) mà kích thước sau pad phải chia hết, default=(8, 8)
+    dtype : dtype, optional
+        np.float32 hoặc np.int16 (engine 'islow'), default=np.float32
+
+    Returns:
+    --------
+    ndarray
+        (3, H', W'), giá trị nguyên trong [0, 255]
+    """
+    if image.ndim != 3 or image.shape[2] != 3:
+        raise ValueError("Ảnh đầu vào phải có dạng (H, W, 3)")
+    if image.dtype != np.uint8:
+        raise ValueError("Ảnh phải có dtype uint8")
+    if min(multiple) <= 0:
+        raise ValueError("multiple phải dương")
+
+    height, width = image.shape[:2]
+    out = np.empty((3, height + (-height % multiple[0]), width + (-width % multiple[1])), dtype=dtype)
+    channels = (image[:, :, 0], image[:, :, 1], image[:, :, 2])
+    acc = np.empty((height, width), dtype=np.int32)
+    for c in range(3):
+        np.take(RGB_YCC_TABLES[c, 0], channels[0], out=acc)
+        acc += RGB_YCC_TABLES[c, 1][channels[1]]
+        acc += RGB_YCC_TABLES[c, 2][channels[2]]
+        acc >>= SCALEBITS
+        out[c, :height, :width] = acc
+
+    # Pad kiểu 'edge': lặp cột rồi hàng cuối
+    out[:, :height, width:] = out[:, :height, width - 1:width]
+    out[:, height:, :] = out[:, height - 1:height, :]
+    return out
+
+def ycbcr_planes_to_rgb(y, cb, cr):
+    """
+    Chuyển ba mặt phẳng Y, Cb, Cr cùng kích thước sang RGB uint8 bằng số nguyên (bảng tra).
+    Nhận view bất kỳ (ví dụ image[:, :, 0] của ảnh (H, W, 3)), không cần stack thành một mảng.
+
+    Parameters:
+    -----------
+    y, cb, cr : ndarray
+        Mặt phẳng (H, W), giá trị nguyên trong [0, 255] (số thực được làm tròn)
+
+    Returns:
+    --------
+    ndarray
+        Ảnh RGB (H, W, 3), dtype=uint8
+    """
+    if y.ndim != 2 or cb.shape != y.shape or cr.shape != y.shape:
+        raise ValueError("Y, Cb, Cr phải là mặt phẳng 2D cùng kích thước")
+    y, cb, cr = (plane if plane.dtype == np.uint8 else np.rint(plane).astype(np.uint8) for plane in (y, cb, cr))
+
+    rgb = np.empty(y.shape + (3,), dtype=np.uint8)
+    y16 = y.astype(np.int16)
+    tables = YCC_RGB_TABLES
+    rgb[:, :, 0] = np.clip(y16 + tables['cr_r'][cr], 0, 255)
+    green = tables['cb_g'][cb]
+    green += tables['cr_g'][cr]
+    green >>= SCALEBITS
+    green += y16
+    rgb[:, :, 1] = np.clip(green, 0, 255)
+    rgb[:, :, 2] = np.clip(y16 + tables['cb_b'][cb], 0, 255)
+    return rgb
@@ -1,6 +1,10 @@
 import numpy as np
+from core.color_processing.color_transform import ycbcr_planes_to_rgb, YCC_RGB_TABLES, SCALEBITS
 
-def apply_chroma_subsampling(ycbcr_image, subsampling='4:2:0'):
+# Số block Y theo (dọc, ngang) trong một MCU; Cb và Cr luôn có một block mỗi MCU
+SUBSAMPLING_FACTORS = {'4:4:4': (1, 1), '4:2:2': (1, 2), '4:2:0': (2, 2)}
+
+def apply_chroma_subsampling(ycbcr_image, subsampling='4:2:0', validate=True):
     """
     Áp dụng lấy mẫu phụ cho các kênh màu Cb và Cr trong ảnh YCbCr.
     
@@ -10,6 +14,8 @@ def apply_chroma_subsampling(ycbcr_image, subsampling='4:2:0'):
         Ảnh YCbCr, shape (H, W, 3), dtype=float32, giá trị trong [0, 255]
     subsampling : str, optional
         Kiểu lấy mẫu phụ ('4:4:4', '4:2:2', '4:2:0'), default='4:2:0'
+    validate : bool, optional
+        Nếu False, bỏ qua lượt quét khoảng [0, 255] (ảnh đã kiểm tra ở biên pipeline), default=True
     
     Returns:
     --------
@@ -29,7 +35,7 @@ def apply_chroma_subsampling(ycbcr_image, subsampling='4:2:0'):
     """
     if ycbcr_image.ndim != 3 or ycbcr_image.shape[2] != 3:
         raise ValueError("Ảnh đầu vào phải có shape (H, W, 3)")
-    if ycbcr_image.max() > 255 or ycbcr_image.min() < 0:
+    if validate and (ycbcr_image.max() > 255 or ycbcr_image.min() < 0):
         raise ValueError("Giá trị pixel phải nằm trong [0, 255]")
     
     height, width = ycbcr_image.shape[:2]
@@ -105,4 +111,83 @@ def apply_chroma_upsampling(channels, subsampling='4:2:0'):
     else:
         raise ValueError("Kiểu lấy mẫu phụ phải là '4:4:4', '4:2:2', hoặc '4:2:0'")
     
-    return np.stack((y_channel, cb_channel, cr_channel), axis=2)
\ No newline at end of file
+    return np.stack((y_channel, cb_channel, cr_channel), axis=2)
+
+# Cách nội suy Cb/Cr khi giải nén: lặp mẫu hoặc tam giác ("fancy", như libjpeg)
+UPSAMPLING_METHODS = ('replicate', 'fancy')
+
+def _as_uint8_plane(plane):
+    return plane if plane.dtype == np.uint8 else np.rint(plane).astype(np.uint8)
+
+def _fancy_upsample(plane, v, h):
+    """
+    Nội suy tam giác kiểu libjpeg (h2v1, h2v2): mỗi mẫu ra là 3/4 mẫu gần nhất + 1/4 mẫu kế tiếp
+    theo mỗi chiều được nhân đôi, biên lặp lại mẫu cuối. Trả về uint8.
+    """
+    x = plane.astype(np.int32)
+    if v == 2:
+        # Theo chiều dọc: giữ tổng cột gấp 4 lần, làm tròn ở bước ngang
+        above = np.concatenate((x[:1], x[:-1]), axis=0)
+        below = np.concatenate((x[1:], x[-1:]), axis=0)
+        x = np.stack((3 * x + above, 3 * x + below), axis=1).reshape(-1, x.shape[1])
+        bias, shift = (8, 7), 4
+    else:
+        bias, shift = (1, 2), 2
+    if h == 2:
+        left = np.concatenate((x[:, :1], x[:, :-1]), axis=1)
+        right = np.concatenate((x[:, 1:], x[:, -1:]), axis=1)
+        x = np.stack(((3 * x + left + bias[0]) >> shift, (3 * x + right + bias[1]) >> shift), axis=2)
+        x = x.reshape(x.shape[0], -1)
+    return x.astype(np.uint8)
+
+def upsample_ycbcr_to_rgb(channels, subsampling='4:2:0', method='replicate'):
+    """
+    Nội suy Cb/Cr và chuyển YCbCr sang RGB trong một kernel, ghi thẳng vào một bộ đệm uint8 (H, W, 3).
+    Với 'replicate', bảng tra màu (ycbcr_planes_to_rgb) được tính ở độ phân giải Cb/Cr rồi cộng
+    broadcast vào Y qua view (Hc, v, Wc, h), không tạo bản lặp của Cb/Cr. Với 'fancy', Cb/Cr được nội
+    suy tam giác kiểu libjpeg trước khi tra bảng.
+
+    Parameters:
+    -----------
+    channels : tuple
+        (y_channel, cb_channel, cr_channel): Y (Hc * v, Wc * h), Cb/Cr (Hc, Wc) theo hệ số lấy mẫu,
+        giá trị nguyên trong [0, 255] (uint8 hoặc số thực đã làm tròn)
+    subsampling : str, optional
+        Kiểu lấy mẫu phụ ('4:4:4', '4:2:2', '4:2:0'), default='4:2:0'
+    method : str, optional
+        'replicate' hoặc 'fancy', default='replicate'
+
+    Returns:
+    --------
+    ndarray
+        Ảnh RGB (H, W, 3), dtype=uint8
+    """
+    if subsampling not in SUBSAMPLING_FACTORS:
+        raise ValueError("Kiểu lấy mẫu phụ phải là '4:4:4', '4:2:2', hoặc '4:2:0'")
+    if method not in UPSAMPLING_METHODS:
+        raise ValueError("method phải là 'replicate' hoặc 'fancy'")
+    y_channel, cb_channel, cr_channel = channels
+    v, h = SUBSAMPLING_FACTORS[subsampling]
+    chroma_h, chroma_w = cb_channel.shape
+    if cr_channel.shape != cb_channel.shape or y_channel.shape != (chroma_h * v, chroma_w * h):
+        raise ValueError("Y phải có shape (Hc * v, Wc * h) với Cb, Cr có shape (Hc, Wc)")
+
+    y_channel, cb_channel, cr_channel = (_as_uint8_plane(plane) for plane in (y_channel, cb_channel, cr_channel))
+    if method == 'fancy' or (v, h) == (1, 1):
+        if (v, h) != (1, 1):
+            cb_channel, cr_channel = _fancy_upsample(cb_channel, v, h), _fancy_upsample(cr_channel, v, h)
+        return ycbcr_planes_to_rgb(y_channel, cb_channel, cr_channel)
+
+    rgb = np.empty(y_channel.shape + (3,), dtype=np.uint8)
+    rgb_blocks = rgb.reshape(chroma_h, v, chroma_w, h, 3)
+    y_blocks = y_channel.astype(np.int16).reshape(chroma_h, v, chroma_w, h)
+    tables = YCC_RGB_TABLES
+    green = tables['cb_g'][cb_channel]
+    green += tables['cr_g'][cr_channel]
+    green >>= SCALEBITS
+    terms = (tables['cr_r'][cr_channel], green.astype(np.int16), tables['cb_b'][cb_channel])
+    channel = np.empty_like(y_blocks)
+    for c, term in enumerate(terms):
+        np.add(y_blocks, term[:, None, :, None], out=channel)
+        rgb_blocks[..., c] = np.clip(channel, 0, 255, out=channel)
+    return rgb
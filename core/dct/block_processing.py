@@ -1,6 +1,6 @@
 import numpy as np
 
-def pad_image_to_multiple_of_8(image):
+def pad_image_to_multiple_of_8(image, multiple=(8, 8), validate=True):
     """
     Thêm padding để chiều cao và chiều rộng của ảnh chia hết cho 8.
     
@@ -8,11 +8,17 @@ def pad_image_to_multiple_of_8(image):
     -----------
     image : ndarray
         Ảnh 2D (H, W) hoặc 3D (H, W, C), dtype=float32, giá trị trong [0, 255]
+    multiple : tuple, optional
+        (cao, rộng) mà kích thước sau pad phải chia hết, là bội của 8; ví dụ (16, 16)
+        cho MCU 4:2:0, default=(8, 8)
+    validate : bool, optional
+        Nếu False, bỏ qua lượt quét NaN/Inf và khoảng [0, 255] (đầu vào đã kiểm tra ở biên pipeline);
+        kiểm tra shape và dtype vẫn chạy, default=True
     
     Returns:
     --------
     ndarray
-        Ảnh sau khi pad, shape (H', W') hoặc (H', W', C) với H', W' chia hết cho 8,
+        Ảnh sau khi pad, shape (H', W') hoặc (H', W', C) với H', W' chia hết cho multiple (mặc định 8),
         dtype=float32, giá trị trong [0, 255]
     
     Raises:
@@ -26,28 +32,40 @@ def pad_image_to_multiple_of_8(image):
     if not np.issubdtype(image.dtype, np.integer) and not np.issubdtype(image.dtype, np.floating):
         raise ValueError("Ảnh phải có dtype là số (int hoặc float)")
 
-    if np.isnan(image).any() or np.isinf(image).any():
-        raise ValueError("Ảnh không được chứa NaN hoặc Inf")
-    
-    if image.max() > 255 or image.min() < 0:
-        raise ValueError("Giá trị pixel phải nằm trong [0, 255]")
+    if validate:
+        if np.isnan(image).any() or np.isinf(image).any():
+            raise ValueError("Ảnh không được chứa NaN hoặc Inf")
+
+        if image.max() > 255 or image.min() < 0:
+            raise ValueError("Giá trị pixel phải nằm trong [0, 255]")
     
     if image.ndim == 3 and image.shape[2] != 3:
         raise ValueError("Ảnh màu phải có đúng 3 kênh (H, W, 3)")
     
+    if multiple[0] % 8 or multiple[1] % 8 or min(multiple) <= 0:
+        raise ValueError("multiple phải là bội dương của 8")
+
     image = image.astype(np.float32)
-    pad_h = (8 - image.shape[0] % 8) % 8
-    pad_w = (8 - image.shape[1] % 8) % 8
+    pad_h = -image.shape[0] % multiple[0]
+    pad_w = -image.shape[1] % multiple[1]
 
     if image.ndim == 2:
         return np.pad(image, ((0, pad_h), (0, pad_w)), mode='edge')
     else:
         return np.pad(image, ((0, pad_h), (0, pad_w), (0, 0)), mode='edge')
 
-def split_into_blocks(image):
+def _as_block_dtype(image, dtype):
+    if np.issubdtype(dtype, np.integer) and not np.issubdtype(image.dtype, np.integer):
+        image = np.round(image)
+    return image.astype(dtype, copy=False)
+
+def split_into_blocks(image, dtype=np.float32, validate=True):
     """
     Chia ảnh thành các khối 8x8 cho ảnh xám hoặc ảnh màu (YCbCr).
     Hỗ trợ shape (H, W), (H, W, C) và (C, H, W).
+    dtype: kiểu của khối trả về; với kiểu số nguyên (ví dụ np.int16 cho engine 'islow')
+    giá trị được làm tròn trước khi ép kiểu.
+    validate: nếu False, bỏ qua lượt quét NaN/Inf và khoảng [0, 255] (đầu vào đã kiểm tra ở biên pipeline).
 
     Returns:
         - Ảnh xám: (H//8, W//8, 8, 8)
@@ -60,17 +78,18 @@ def split_into_blocks(image):
     if not np.issubdtype(image.dtype, np.integer) and not np.issubdtype(image.dtype, np.floating):
         raise ValueError("Ảnh phải có dtype là số (int hoặc float)")
 
-    if np.isnan(image).any() or np.isinf(image).any():
-        raise ValueError("Ảnh không được chứa NaN hoặc Inf")
-    
-    if image.max() > 255 or image.min() < 0:
-        raise ValueError("Giá trị pixel phải nằm trong [0, 255]")
+    if validate:
+        if np.isnan(image).any() or np.isinf(image).any():
+            raise ValueError("Ảnh không được chứa NaN hoặc Inf")
+
+        if image.max() > 255 or image.min() < 0:
+            raise ValueError("Giá trị pixel phải nằm trong [0, 255]")
 
     if image.ndim == 2:  # Ảnh xám
         H, W = image.shape
         if H % 8 != 0 or W % 8 != 0:
             raise ValueError("Chiều cao và chiều rộng phải chia hết cho 8")
-        image = image.astype(np.float32)
+        image = _as_block_dtype(image, dtype)
         return image.reshape(H//8, 8, W//8, 8).transpose(0, 2, 1, 3)
 
     # Ảnh màu
@@ -88,63 +107,71 @@ def split_into_blocks(image):
     if H % 8 != 0 or W % 8 != 0:
         raise ValueError("Chiều cao và chiều rộng phải chia hết cho 8")
 
-    image = image.astype(np.float32)
+    image = _as_block_dtype(image, dtype)
     return image.reshape(C, H//8, 8, W//8, 8).transpose(0, 1, 3, 2, 4)
 
-def merge_blocks(blocks, original_shape):
+def merge_blocks(blocks, original_shape, validate=True):
     """
     Ghép các khối 8x8 thành ảnh đầy đủ và crop về kích thước gốc.
+    Khối vuông nhỏ hơn (1x1, 2x2, 4x4, từ giải nén thu nhỏ) được ghép theo cùng cách.
 
     Parameters:
     -----------
     blocks : ndarray
-        - 4D: shape (H//8, W//8, 8, 8) cho ảnh xám
-        - 5D: shape (C, H//8, W//8, 8, 8) cho ảnh màu
-        dtype=float32, giá trị trong [0, 255]
+        - 4D: shape (H//8, W//8, n, n) cho ảnh xám
+        - 5D: shape (C, H//8, W//8, n, n) cho ảnh màu
+        n là 8 (hoặc 4, 2, 1), dtype=float32 (hoặc uint8), giá trị trong [0, 255]
     
     original_shape : tuple
         - (H, W) cho ảnh xám
         - (H, W, C) cho ảnh màu
+    validate : bool, optional
+        Nếu False, bỏ qua lượt quét NaN/Inf và khoảng [0, 255] của khối số thực (ví dụ khối ra từ
+        IDCT đã clip), default=True
 
     Returns:
     --------
     ndarray
-        Ảnh đã được ghép và crop, dtype=float32, shape = original_shape
+        Ảnh đã được ghép và crop, dtype=float32 (uint8 nếu khối là uint8), shape = original_shape
     """
     if blocks.ndim not in (4, 5):
         raise ValueError("Khối đầu vào phải là mảng 4D hoặc 5D")
     
-    if not np.issubdtype(blocks.dtype, np.floating):
-        raise ValueError("Khối đầu vào phải là float32 hoặc float")
-
-    if np.isnan(blocks).any() or np.isinf(blocks).any():
-        raise ValueError("Khối không được chứa NaN hoặc Inf")
-    
-    if blocks.max() > 255 or blocks.min() < 0:
-        raise ValueError("Giá trị pixel phải nằm trong [0, 255]")
+    if blocks.dtype == np.uint8:
+        out_dtype = np.uint8
+    elif np.issubdtype(blocks.dtype, np.floating):
+        out_dtype = np.float32
+        if validate:
+            if np.isnan(blocks).any() or np.isinf(blocks).any():
+                raise ValueError("Khối không được chứa NaN hoặc Inf")
+
+            if blocks.max() > 255 or blocks.min() < 0:
+                raise ValueError("Giá trị pixel phải nằm trong [0, 255]")
+    else:
+        raise ValueError("Khối đầu vào phải là float32, float hoặc uint8")
 
     if blocks.ndim == 4:  # ảnh xám
         h_blocks, w_blocks, block_h, block_w = blocks.shape
-        if (block_h, block_w) != (8, 8):
-            raise ValueError("Kích thước khối phải là 8x8")
-        image = blocks.transpose(0, 2, 1, 3).reshape(h_blocks * 8, w_blocks * 8)
+        if block_h != block_w or block_h not in (1, 2, 4, 8):
+            raise ValueError("Kích thước khối phải là 8x8 (hoặc 4x4, 2x2, 1x1)")
+        image = blocks.transpose(0, 2, 1, 3).reshape(h_blocks * block_h, w_blocks * block_w)
         H, W = original_shape
-        return image[:H, :W].astype(np.float32)
+        return image[:H, :W].astype(out_dtype)
 
     # ảnh màu
     C, h_blocks, w_blocks, block_h, block_w = blocks.shape
-    if (block_h, block_w) != (8, 8):
-        raise ValueError("Kích thước khối phải là 8x8")
+    if block_h != block_w or block_h not in (1, 2, 4, 8):
+        raise ValueError("Kích thước khối phải là 8x8 (hoặc 4x4, 2x2, 1x1)")
     
     if len(original_shape) != 3 or original_shape[2] != 3:
         raise ValueError("original_shape phải có dạng (H, W, 3)")
     
-    expected_h = h_blocks * 8
-    expected_w = w_blocks * 8
+    expected_h = h_blocks * block_h
+    expected_w = w_blocks * block_w
     if original_shape[0] > expected_h or original_shape[1] > expected_w:
         raise ValueError("original_shape vượt quá kích thước khối hợp lệ")
 
-    image = blocks.transpose(0, 1, 3, 2, 4).reshape(C, h_blocks * 8, w_blocks * 8)
+    image = blocks.transpose(0, 1, 3, 2, 4).reshape(C, expected_h, expected_w)
     image = image.transpose(1, 2, 0)  # (H, W, C)
     H, W, _ = original_shape
-    return image[:H, :W, :].astype(np.float32)
+    return image[:H, :W, :].astype(out_dtype)
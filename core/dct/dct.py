@@ -1,4 +1,31 @@
+import time
 import numpy as np
+from scipy import fft as scipy_fft
+from core.quantization.dequantization import adjust_quant_tables
+from core.entropy_coding.zigzag_rle import ZIGZAG_INDICES, INVERSE_ZIGZAG_INDICES
+
+def _dct_matrix(n):
+    C = np.zeros((n, n))
+    for k in range(n):
+        for i in range(n):
+            alpha = np.sqrt(1 / n) if k == 0 else np.sqrt(2 / n)
+            C[k, i] = alpha * np.cos((np.pi * (2 * i + 1) * k) / (2 * n))
+    return C.astype(np.float32)
+
+def _idct_matrix(n):
+    C = np.zeros((n, n))
+    for k in range(n):
+        for i in range(n):
+            alpha = np.sqrt(1 / n) if k == 0 else np.sqrt(2 / n)
+            C[i, k] = alpha * np.cos((np.pi * (2 * i + 1) * k) / (2 * n))
+    return C.astype(np.float32)
+
+# Ma trận tính sẵn một lần khi import
+DCT_MATRIX = _dct_matrix(8)
+IDCT_MATRIX = _idct_matrix(8)
+# vec(C X C^T) = kron(C, C) vec(X) với vec theo hàng: cả khối 8x8 là một phép nhân ma trận 64x64
+DCT_KRON = np.kron(DCT_MATRIX, DCT_MATRIX)
+IDCT_KRON = np.kron(IDCT_MATRIX, IDCT_MATRIX)
 
 def dct_2d_separable(block):
     """
@@ -8,62 +35,626 @@ def dct_2d_separable(block):
         raise ValueError("Khối phải có shape (8, 8)")
 
     block = block.astype(np.float32)
-    C = _dct_matrix(8)
+    C = DCT_MATRIX
     return C @ (block - 128.0) @ C.T
 
-def _dct_matrix(n):
-    C = np.zeros((n, n))
-    for k in range(n):
-        for i in range(n):
-            alpha = np.sqrt(1 / n) if k == 0 else np.sqrt(2 / n)
-            C[k, i] = alpha * np.cos((np.pi * (2 * i + 1) * k) / (2 * n))
-    return C.astype(np.float32)
+# === Các engine DCT/IDCT ===
+# forward: (N, 8, 8) float32 đã level-shift -> hệ số DCT (N, 8, 8) float32
+# inverse: hệ số DCT (N, 8, 8) float32 -> giá trị pixel chưa cộng 128, chưa làm tròn
+
+def _einsum_forward(blocks):
+    return np.einsum('ij,njk,kl->nil', DCT_MATRIX, blocks, DCT_MATRIX.T)
+
+def _einsum_inverse(coefficients):
+    return np.einsum('ij,njk,kl->nil', IDCT_MATRIX, coefficients, IDCT_MATRIX.T)
+
+def _gemm_forward(blocks):
+    # Một phép GEMM (N, 64) @ (64, 64), chạy đa luồng qua BLAS
+    return (blocks.reshape(-1, 64) @ DCT_KRON.T).reshape(-1, 8, 8)
+
+def _gemm_inverse(coefficients):
+    return (coefficients.reshape(-1, 64) @ IDCT_KRON.T).reshape(-1, 8, 8)
+
+def _scipy_forward(blocks):
+    return scipy_fft.dctn(blocks, type=2, axes=(1, 2), norm='ortho')
+
+def _scipy_inverse(coefficients):
+    return scipy_fft.idctn(coefficients, type=2, axes=(1, 2), norm='ortho')
+
+def _aan_forward_1d(x):
+    """DCT 1D kiểu AAN (Arai-Agui-Nakajima) trên trục cuối, kết quả chưa chuẩn hóa."""
+    d = [x[..., i] for i in range(8)]
+    tmp0, tmp7 = d[0] + d[7], d[0] - d[7]
+    tmp1, tmp6 = d[1] + d[6], d[1] - d[6]
+    tmp2, tmp5 = d[2] + d[5], d[2] - d[5]
+    tmp3, tmp4 = d[3] + d[4], d[3] - d[4]
+
+    # Phần chẵn
+    tmp10, tmp13 = tmp0 + tmp3, tmp0 - tmp3
+    tmp11, tmp12 = tmp1 + tmp2, tmp1 - tmp2
+    out0, out4 = tmp10 + tmp11, tmp10 - tmp11
+    z1 = (tmp12 + tmp13) * np.float32(0.707106781)
+    out2, out6 = tmp13 + z1, tmp13 - z1
+
+    # Phần lẻ
+    tmp10 = tmp4 + tmp5
+    tmp11 = tmp5 + tmp6
+    tmp12 = tmp6 + tmp7
+    z5 = (tmp10 - tmp12) * np.float32(0.382683433)
+    z2 = np.float32(0.541196100) * tmp10 + z5
+    z4 = np.float32(1.306562965) * tmp12 + z5
+    z3 = tmp11 * np.float32(0.707106781)
+    z11, z13 = tmp7 + z3, tmp7 - z3
+    out5, out3 = z13 + z2, z13 - z2
+    out1, out7 = z11 + z4, z11 - z4
+
+    return np.stack([out0, out1, out2, out3, out4, out5, out6, out7], axis=-1)
+
+def _aan_inverse_1d(x):
+    """IDCT 1D kiểu AAN trên trục cuối, đầu vào đã nhân hệ số tỉ lệ AAN_INVERSE_SCALE."""
+    # Phần chẵn
+    tmp10, tmp11 = x[..., 0] + x[..., 4], x[..., 0] - x[..., 4]
+    tmp13 = x[..., 2] + x[..., 6]
+    tmp12 = (x[..., 2] - x[..., 6]) * np.float32(1.414213562) - tmp13
+    tmp0, tmp3 = tmp10 + tmp13, tmp10 - tmp13
+    tmp1, tmp2 = tmp11 + tmp12, tmp11 - tmp12
+
+    # Phần lẻ
+    z13, z10 = x[..., 5] + x[..., 3], x[..., 5] - x[..., 3]
+    z11, z12 = x[..., 1] + x[..., 7], x[..., 1] - x[..., 7]
+    tmp7 = z11 + z13
+    tmp11 = (z11 - z13) * np.float32(1.414213562)
+    z5 = (z10 + z12) * np.float32(1.847759065)
+    tmp10 = np.float32(1.082392200) * z12 - z5
+    tmp12 = np.float32(-2.613125930) * z10 + z5
+    tmp6 = tmp12 - tmp7
+    tmp5 = tmp11 - tmp6
+    tmp4 = tmp10 + tmp5
+
+    return np.stack([tmp0 + tmp7, tmp1 + tmp6, tmp2 + tmp5, tmp3 - tmp4,
+                     tmp3 + tmp4, tmp2 - tmp5, tmp1 - tmp6, tmp0 - tmp7], axis=-1)
+
+# Hệ số tỉ lệ của butterfly so với DCT trực chuẩn, suy ra từ ma trận cơ sở:
+# ma trận butterfly thuận A = diag(s) C  =>  s = diag(A C^T)
+# ma trận butterfly nghịch M = C^T diag(1 / t)  =>  t = 1 / diag(C M)
+_AAN_FORWARD_SCALE = np.diag(_aan_forward_1d(np.eye(8)).T @ DCT_MATRIX.T.astype(np.float64))
+_AAN_INVERSE_SCALE = 1.0 / np.diag(DCT_MATRIX.astype(np.float64) @ _aan_inverse_1d(np.eye(8)).T)
+AAN_FORWARD_SCALE = (1.0 / np.outer(_AAN_FORWARD_SCALE, _AAN_FORWARD_SCALE)).astype(np.float32)
+AAN_INVERSE_SCALE = np.outer(_AAN_INVERSE_SCALE, _AAN_INVERSE_SCALE).astype(np.float32)
+
+def _aan_forward(blocks):
+    rows = _aan_forward_1d(blocks)
+    coefficients = _aan_forward_1d(rows.swapaxes(1, 2)).swapaxes(1, 2)
+    return coefficients * AAN_FORWARD_SCALE
+
+def _aan_inverse(coefficients):
+    scaled = coefficients * AAN_INVERSE_SCALE
+    columns = _aan_inverse_1d(scaled.swapaxes(1, 2)).swapaxes(1, 2)
+    return _aan_inverse_1d(columns)
+
+DCT_ENGINES = {
+    'einsum': (_einsum_forward, _einsum_inverse),
+    'gemm': (_gemm_forward, _gemm_inverse),
+    'scipy': (_scipy_forward, _scipy_inverse),
+    'aan': (_aan_forward, _aan_inverse),
+}
+
+def _reference_dct(blocks):
+    C = _dct_matrix(8).astype(np.float64)
+    return np.einsum('ij,njk,kl->nil', C, blocks.astype(np.float64), C.T)
+
+def check_dct_engine(name, tolerance=1e-2, num_blocks=256, seed=0):
+    """
+    So sánh một engine với DCT tham chiếu (float64) trên các khối ngẫu nhiên.
+
+    Parameters:
+    -----------
+    name : str
+        Tên engine trong DCT_ENGINES
+    tolerance : float, optional
+        Sai số tuyệt đối lớn nhất cho phép, default=1e-2
+    num_blocks : int, optional
+        Số khối ngẫu nhiên, default=256
+    seed : int, optional
+        Seed sinh dữ liệu, default=0
+
+    Returns:
+    --------
+    tuple
+        (forward_error, inverse_error): sai số tuyệt đối lớn nhất của DCT và IDCT
+
+    Raises:
+    -------
+    ValueError
+        Nếu engine không tồn tại hoặc sai số vượt quá tolerance
+    """
+    if name not in DCT_ENGINES:
+        raise ValueError(f"Không có DCT engine '{name}'")
+    forward, inverse = DCT_ENGINES[name]
+
+    rng = np.random.default_rng(seed)
+    blocks = rng.integers(-128, 128, size=(num_blocks, 8, 8)).astype(np.float32)
+    reference = _reference_dct(blocks)
+    forward_error = float(np.abs(forward(blocks) - reference).max())
+    inverse_error = float(np.abs(inverse(reference.astype(np.float32)) - blocks).max())
+    if forward_error > tolerance or inverse_error > tolerance:
+        raise ValueError(f"DCT engine '{name}' sai lệch so với tham chiếu: "
+                         f"DCT {forward_error:.2e}, IDCT {inverse_error:.2e} (cho phép {tolerance:.0e})")
+    return forward_error, inverse_error
+
+def register_dct_engine(name, forward, inverse, tolerance=1e-2):
+    """
+    Đăng ký engine DCT/IDCT mới sau khi kiểm tra với DCT tham chiếu.
+
+    Parameters:
+    -----------
+    name : str
+        Tên engine
+    forward : callable
+        (N, 8, 8) float32 đã level-shift -> hệ số DCT (N, 8, 8)
+    inverse : callable
+        Hệ số DCT (N, 8, 8) -> giá trị pixel chưa cộng 128, chưa làm tròn
+    tolerance : float, optional
+        Sai số tuyệt đối lớn nhất cho phép, default=1e-2
+    """
+    previous = DCT_ENGINES.get(name)
+    DCT_ENGINES[name] = (forward, inverse)
+    try:
+        check_dct_engine(name, tolerance)
+    except ValueError:
+        if previous is None:
+            del DCT_ENGINES[name]
+        else:
+            DCT_ENGINES[name] = previous
+        raise
+
+def benchmark_dct_engines(num_blocks=65536, repeat=3):
+    """
+    Đo thời gian DCT + IDCT của từng engine (giây, lấy lần nhanh nhất), dùng để chọn engine
+    nhanh nhất cho phần cứng hiện tại.
+
+    Returns:
+    --------
+    dict
+        {name: (forward_seconds, inverse_seconds)}
+    """
+    rng = np.random.default_rng(0)
+    blocks = rng.integers(-128, 128, size=(num_blocks, 8, 8)).astype(np.float32)
+    results = {}
+    for name, (forward, inverse) in DCT_ENGINES.items():
+        coefficients = forward(blocks)
+        timings = []
+        for function, data in ((forward, blocks), (inverse, coefficients)):
+            best = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                function(data)
+                best = min(best, time.perf_counter() - start)
+            timings.append(best)
+        results[name] = tuple(timings)
+    return results
+
+# === Engine số nguyên 'islow' (theo jfdctint.c / jidctint.c của libjpeg) ===
+# Hằng số dấu phẩy cố định: FIX(x) = round(x * 2**CONST_BITS)
+ISLOW_ENGINE = 'islow'
+CONST_BITS = 13
+PASS1_BITS = 2
+# Hệ số DCT của islow lớn gấp 8 lần DCT trực chuẩn; phần chia 8 được gộp vào lượng tử hóa
+ISLOW_OUTPUT_SCALE = 8
+FIX_0_298631336 = 2446
+FIX_0_390180644 = 3196
+FIX_0_541196100 = 4433
+FIX_0_765366865 = 6270
+FIX_0_899976223 = 7373
+FIX_1_175875602 = 9633
+FIX_1_501321110 = 12299
+FIX_1_847759065 = 15137
+FIX_1_961570560 = 16069
+FIX_2_053119869 = 16819
+FIX_2_562915447 = 20995
+FIX_3_072711026 = 25172
+
+def _descale(x, n):
+    """Chia cho 2**n có làm tròn, dùng phép dịch bit số học."""
+    return (x + (1 << (n - 1))) >> n
+
+def _islow_odd_part(tmp4, tmp5, tmp6, tmp7):
+    # Phần lẻ dùng chung cho DCT và IDCT (Loeffler, 12 phép nhân)
+    z1 = tmp4 + tmp7
+    z2 = tmp5 + tmp6
+    z3 = tmp4 + tmp6
+    z4 = tmp5 + tmp7
+    z5 = (z3 + z4) * FIX_1_175875602
+    tmp4 = tmp4 * FIX_0_298631336
+    tmp5 = tmp5 * FIX_2_053119869
+    tmp6 = tmp6 * FIX_3_072711026
+    tmp7 = tmp7 * FIX_1_501321110
+    z1 = z1 * -FIX_0_899976223
+    z2 = z2 * -FIX_2_562915447
+    z3 = z3 * -FIX_1_961570560 + z5
+    z4 = z4 * -FIX_0_390180644 + z5
+    return tmp4 + z1 + z3, tmp5 + z2 + z4, tmp6 + z2 + z3, tmp7 + z1 + z4
+
+def _islow_fdct_1d(x, first_pass):
+    """DCT 1D số nguyên trên trục cuối (int32)."""
+    d = [x[..., i] for i in range(8)]
+    tmp0, tmp7 = d[0] + d[7], d[0] - d[7]
+    tmp1, tmp6 = d[1] + d[6], d[1] - d[6]
+    tmp2, tmp5 = d[2] + d[5], d[2] - d[5]
+    tmp3, tmp4 = d[3] + d[4], d[3] - d[4]
+
+    # Phần chẵn
+    tmp10, tmp13 = tmp0 + tmp3, tmp0 - tmp3
+    tmp11, tmp12 = tmp1 + tmp2, tmp1 - tmp2
+    if first_pass:
+        out0, out4 = (tmp10 + tmp11) << PASS1_BITS, (tmp10 - tmp11) << PASS1_BITS
+        shift = CONST_BITS - PASS1_BITS
+    else:
+        out0, out4 = _descale(tmp10 + tmp11, PASS1_BITS), _descale(tmp10 - tmp11, PASS1_BITS)
+        shift = CONST_BITS + PASS1_BITS
+    z1 = (tmp12 + tmp13) * FIX_0_541196100
+    out2 = _descale(z1 + tmp13 * FIX_0_765366865, shift)
+    out6 = _descale(z1 - tmp12 * FIX_1_847759065, shift)
+
+    # Phần lẻ
+    odd7, odd5, odd3, odd1 = _islow_odd_part(tmp4, tmp5, tmp6, tmp7)
+    out1, out3, out5, out7 = (_descale(v, shift) for v in (odd1, odd3, odd5, odd7))
+
+    return np.stack([out0, out1, out2, out3, out4, out5, out6, out7], axis=-1)
+
+def _islow_idct_1d(x, shift):
+    """IDCT 1D số nguyên trên trục cuối (int32), kết quả chia 2**shift có làm tròn."""
+    # Phần chẵn
+    z1 = (x[..., 2] + x[..., 6]) * FIX_0_541196100
+    tmp2 = z1 - x[..., 6] * FIX_1_847759065
+    tmp3 = z1 + x[..., 2] * FIX_0_765366865
+    tmp0 = (x[..., 0] + x[..., 4]) << CONST_BITS
+    tmp1 = (x[..., 0] - x[..., 4]) << CONST_BITS
+    tmp10, tmp13 = tmp0 + tmp3, tmp0 - tmp3
+    tmp11, tmp12 = tmp1 + tmp2, tmp1 - tmp2
+
+    # Phần lẻ
+    tmp0, tmp1, tmp2, tmp3 = _islow_odd_part(x[..., 7], x[..., 5], x[..., 3], x[..., 1])
+
+    return np.stack([_descale(tmp10 + tmp3, shift), _descale(tmp11 + tmp2, shift),
+                     _descale(tmp12 + tmp1, shift), _descale(tmp13 + tmp0, shift),
+                     _descale(tmp13 - tmp0, shift), _descale(tmp12 - tmp1, shift),
+                     _descale(tmp11 - tmp2, shift), _descale(tmp10 - tmp3, shift)], axis=-1)
 
-def apply_dct_to_image(image_blocks):
+def islow_forward(blocks):
     """
-    Áp dụng DCT cho tất cả các khối 8x8 của ảnh bằng dct_2d_separable.
+    DCT 2D số nguyên kiểu libjpeg islow.
+
+    Parameters:
+    -----------
+    blocks : ndarray
+        (N, 8, 8) số nguyên đã level-shift (int16)
+
+    Returns:
+    --------
+    ndarray
+        Hệ số DCT (N, 8, 8) int32, lớn gấp ISLOW_OUTPUT_SCALE lần DCT trực chuẩn
+    """
+    rows = _islow_fdct_1d(blocks.astype(np.int32), first_pass=True)
+    return _islow_fdct_1d(rows.swapaxes(1, 2), first_pass=False).swapaxes(1, 2)
+
+def islow_inverse(coefficients):
+    """
+    IDCT 2D số nguyên kiểu libjpeg islow.
+
+    Parameters:
+    -----------
+    coefficients : ndarray
+        Hệ số đã giải lượng tử (N, 8, 8) số nguyên
+
+    Returns:
+    --------
+    ndarray
+        Giá trị pixel (N, 8, 8) int32 chưa cộng 128, chưa cắt
+    """
+    columns = _islow_idct_1d(coefficients.astype(np.int32).swapaxes(1, 2), CONST_BITS - PASS1_BITS)
+    return _islow_idct_1d(columns.swapaxes(1, 2), CONST_BITS + PASS1_BITS + 3)
+
+def dct_engine_names():
+    """Tên mọi engine dùng được với apply_dct_to_image/apply_idct_to_image."""
+    return sorted(DCT_ENGINES) + [ISLOW_ENGINE]
+
+def _engine(name, index):
+    if name not in DCT_ENGINES:
+        raise ValueError(f"Không có DCT engine '{name}', chọn một trong {sorted(DCT_ENGINES)}")
+    return DCT_ENGINES[name][index]
+
+def apply_dct_to_image(image_blocks, engine='einsum', validate=True):
+    """
+    Áp dụng DCT cho tất cả các khối 8x8 của ảnh.
     image_blocks: 4D (h,w,8,8) hoặc 5D (c,h,w,8,8), giá trị [0,255]
+    engine: tên engine trong DCT_ENGINES ('einsum', 'gemm', 'scipy', 'aan'), hoặc 'islow'
+            (số nguyên: trả về int32 gấp ISLOW_OUTPUT_SCALE lần, lượng tử hóa bằng quantize_integer)
+    validate: nếu False, bỏ qua lượt quét khoảng [0, 255] (khối đã kiểm tra ở biên pipeline)
     """
     if image_blocks.ndim not in (4, 5):
         raise ValueError("image_blocks phải là mảng 4D hoặc 5D")
     if image_blocks.shape[-2:] != (8, 8):
         raise ValueError("Kích thước khối phải là 8x8")
-    if image_blocks.max() > 255 or image_blocks.min() < 0:
+    if validate and (image_blocks.max() > 255 or image_blocks.min() < 0):
         raise ValueError("Giá trị pixel phải nằm trong [0, 255] trước level-shift")
+    if engine == ISLOW_ENGINE:
+        # Toàn bộ bằng số nguyên: int16 vào, int32 ra (gấp 8 lần, xem quantize_integer)
+        blocks = np.round(image_blocks).astype(np.int16) - np.int16(128)
+        return islow_forward(blocks.reshape(-1, 8, 8)).reshape(image_blocks.shape)
+    forward = _engine(engine, 0)
 
     blocks = image_blocks.astype(np.float32)
     shape = blocks.shape
     flat_blocks = blocks.reshape(-1, 8, 8)
 
-    # DCT tăng tốc với einsum
-    C = _dct_matrix(8)
-    C_T = C.T
-    dct_flat = np.einsum('ij,njk,kl->nil', C, flat_blocks - 128.0, C_T)
+    dct_flat = forward(flat_blocks - np.float32(128.0))
 
-    return dct_flat.reshape(shape)
+    return dct_flat.astype(np.float32, copy=False).reshape(shape)
 
-def _idct_matrix(n):
-    C = np.zeros((n, n))
-    for k in range(n):
-        for i in range(n):
-            alpha = np.sqrt(1 / n) if k == 0 else np.sqrt(2 / n)
-            C[i, k] = alpha * np.cos((np.pi * (2 * i + 1) * k) / (2 * n))
-    return C.astype(np.float32)
+_prescaled_dct_cache = {}
+
+def prescaled_dct_basis(quality, component):
+    """
+    Cơ sở DCT đã chia sẵn cho bảng lượng tử của một thành phần, cache theo (quality, component):
+    hệ số lượng tử (chưa làm tròn) (N, 64) = pixel (N, 64) @ basis + bias, với bias là phần
+    level-shift -128 đã đi qua DCT (chỉ khác 0 ở DC).
+
+    Parameters:
+    -----------
+    quality : int
+        Hệ số chất lượng (1-100)
+    component : int
+        0 cho Y (y_quant), khác 0 cho Cb/Cr (c_quant)
+
+    Returns:
+    --------
+    tuple
+        (basis (64, 64) float32, bias (64,) float32)
+    """
+    key = (quality, 0 if component == 0 else 1)
+    cached = _prescaled_dct_cache.get(key)
+    if cached is None:
+        y_quant, c_quant = adjust_quant_tables(quality)
+        q = (y_quant if key[1] == 0 else c_quant).astype(np.float32).reshape(64)
+        # (DCT_KRON @ x) / q = x @ (DCT_KRON / q[:, None]).T
+        basis = np.ascontiguousarray((DCT_KRON / q[:, None]).T)
+        bias = np.full(64, -128.0, dtype=np.float32) @ basis
+        cached = (basis, bias)
+        _prescaled_dct_cache[key] = cached
+    return cached
+
+def apply_fused_dct_to_image(image_blocks, quality=50, chunk_size=8192, component=0, validate=True):
+    """
+    DCT và lượng tử hóa hợp nhất: từ khối pixel ra thẳng hệ số lượng tử int16 đã làm tròn, bằng
+    cơ sở DCT chia sẵn bảng lượng tử (prescaled_dct_basis). Xử lý theo từng đoạn `chunk_size`
+    block, không tạo mảng hệ số DCT float32 cỡ cả ảnh.
+
+    Parameters:
+    -----------
+    image_blocks : ndarray
+        Khối pixel 4D (h, w, 8, 8) hoặc 5D (c, h, w, 8, 8), giá trị [0, 255] (chưa level-shift)
+    quality : int, optional
+        Hệ số chất lượng (1-100), default=50
+    component : int, optional
+        Với khối 4D: 0 dùng bảng Y, khác 0 dùng bảng Cb/Cr, default=0
+    validate : bool, optional
+        Nếu False, bỏ qua lượt quét khoảng [0, 255] (khối đã kiểm tra ở biên pipeline), default=True
+
+    Returns:
+    --------
+    ndarray
+        Khối lượng tử cùng shape, dtype=int16
+    """
+    if image_blocks.ndim not in (4, 5) or image_blocks.shape[-2:] != (8, 8):
+        raise ValueError("image_blocks phải là mảng 4D (h,w,8,8) hoặc 5D (c,h,w,8,8)")
+    if not 1 <= quality <= 100:
+        raise ValueError("Hệ số chất lượng phải từ 1 đến 100")
+    if validate and (image_blocks.max() > 255 or image_blocks.min() < 0):
+        raise ValueError("Giá trị pixel phải nằm trong [0, 255] trước level-shift")
+
+    num_channels = image_blocks.shape[0] if image_blocks.ndim == 5 else 1
+    channels = image_blocks.reshape(num_channels, -1, 64)
+    quant = np.empty(channels.shape, dtype=np.int16)
+    for ch, (pixels, out) in enumerate(zip(channels, quant)):
+        basis, bias = prescaled_dct_basis(quality, ch if image_blocks.ndim == 5 else component)
+        for start in range(0, len(pixels), chunk_size):
+            chunk = pixels[start:start + chunk_size].astype(np.float32) @ basis
+            chunk += bias
+            out[start:start + chunk_size] = np.rint(chunk, out=chunk)
+
+    return quant.reshape(image_blocks.shape)
+
+# Nhóm khối theo vị trí EOB zigzag (số hệ số đầu tiên theo thứ tự zigzag chứa mọi hệ số khác 0);
+# mỗi ngưỡng là độ dài tiền tố zigzag phủ trọn các đường chéo tần số thấp, 64 là IDCT đầy đủ
+PRUNED_PREFIXES = (1, 3, 6, 10, 15, 21, 28, 36, 64)
+# Vị trí zigzag (tính từ 1) của từng hệ số trong khối đã làm phẳng, để tính EOB không cần hoán vị khối
+_ZIGZAG_POSITIONS = (INVERSE_ZIGZAG_INDICES + 1).astype(np.uint8)
+# Cơ sở IDCT rút gọn cho tiền tố zigzag dài L < 64: (N, L) hệ số theo thứ tự zigzag @ PRUNED_BASES[L] -> (N, 64)
+PRUNED_BASES = {length: np.ascontiguousarray(IDCT_KRON.T[ZIGZAG_INDICES[:length]]) for length in PRUNED_PREFIXES[1:-1]}
+# Engine vốn là một phép nhân dày 64x64 (BLAS hoặc FFT): gom nhóm + gather/scatter không nhanh hơn,
+# nên pruned không dùng với các engine này
+PRUNED_DENSE_ENGINES = ('gemm', 'scipy')
+
+def eob_positions(coefficients):
+    """
+    Vị trí EOB theo thứ tự zigzag của từng khối: 0 nếu khối toàn 0, k nếu hệ số khác 0 cuối cùng
+    nằm ở vị trí zigzag thứ k - 1.
+
+    Parameters:
+    -----------
+    coefficients : ndarray
+        (N, 8, 8)
+
+    Returns:
+    --------
+    ndarray
+        (N,) uint8
+    """
+    return ((coefficients.reshape(-1, 64) != 0) * _ZIGZAG_POSITIONS).max(axis=1)
+
+def pruned_inverse(coefficients):
+    """
+    IDCT rút gọn theo vị trí EOB zigzag: khối được xếp một lần theo nhóm PRUNED_PREFIXES, mỗi nhóm
+    là một phép nhân (n, L) @ (L, 64) chỉ trên L hệ số zigzag đầu; khối chỉ có DC được tô hằng số DC / 8.
+
+    Parameters:
+    -----------
+    coefficients : ndarray
+        (N, 8, 8) float32
+
+    Returns:
+    --------
+    ndarray
+        Giá trị pixel (N, 8, 8) float32 chưa cộng 128, chưa làm tròn
+    """
+    flat = coefficients.reshape(-1, 64)
+    groups = np.searchsorted(PRUNED_PREFIXES, eob_positions(coefficients))
+    order = np.argsort(groups, kind='stable')
+    bounds = np.searchsorted(groups[order], np.arange(len(PRUNED_PREFIXES) + 1))
+    result = np.empty((len(flat), 64), dtype=np.float32)
+
+    for group, length in enumerate(PRUNED_PREFIXES):
+        idx = order[bounds[group]:bounds[group + 1]]
+        if not len(idx):
+            continue
+        if length == 1:
+            # Chỉ có DC (hoặc toàn 0): mọi pixel bằng DC * C[0, i] * C[0, j] = DC / 8
+            result[idx] = flat[idx, :1] * np.float32(0.125)
+        elif length == 64:
+            result[idx] = flat[idx] @ IDCT_KRON.T
+        else:
+            result[idx] = flat[idx][:, ZIGZAG_INDICES[:length]] @ PRUNED_BASES[length]
+    return result.reshape(-1, 8, 8)
+
+# Giải nén thu nhỏ: scale -> số pixel mỗi cạnh khối
+SCALED_BLOCK_SIZES = {1: 8, 0.5: 4, 0.25: 2, 0.125: 1}
+# IDCT n điểm trên góc tần số thấp n x n, nhân sqrt(n / 8) mỗi chiều để giữ mức sáng (n = 1: DC / 8)
+SCALED_IDCT_MATRICES = {n: (_idct_matrix(n) * np.float32(np.sqrt(n / 8))) for n in SCALED_BLOCK_SIZES.values()}
+
+def apply_scaled_idct_to_image(dct_blocks, scale):
+    """
+    IDCT thu nhỏ: mỗi khối 8x8 cho ra n x n pixel (n = 8 * scale) từ góc n x n tần số thấp
+    của hệ số đã giải lượng tử, dùng IDCT n điểm. Với scale = 1/8 mỗi khối là một pixel DC / 8.
+
+    Parameters:
+    -----------
+    dct_blocks : ndarray
+        Hệ số đã giải lượng tử, 4D (h, w, 8, 8) hoặc 5D (c, h, w, 8, 8)
+    scale : float
+        1, 1/2, 1/4 hoặc 1/8
+
+    Returns:
+    --------
+    ndarray
+        Khối (h, w, n, n) hoặc (c, h, w, n, n), dtype=float32, giá trị trong [0, 255]
+    """
+    if dct_blocks.ndim not in (4, 5) or dct_blocks.shape[-2:] != (8, 8):
+        raise ValueError("dct_blocks phải là mảng 4D hoặc 5D với block size 8x8")
+    if scale not in SCALED_BLOCK_SIZES:
+        raise ValueError("scale phải là 1, 1/2, 1/4 hoặc 1/8")
+
+    n = SCALED_BLOCK_SIZES[scale]
+    basis = SCALED_IDCT_MATRICES[n]
+    corner = dct_blocks[..., :n, :n].astype(np.float32).reshape(-1, n, n)
+    pixels = np.einsum('ik,nkl,jl->nij', basis, corner, basis)
+    pixels = np.clip(np.round(pixels + 128.0), 0, 255).astype(np.float32)
+    return pixels.reshape(dct_blocks.shape[:-2] + (n, n))
+
+_prescaled_basis_cache = {}
+
+def prescaled_idct_basis(quality, component):
+    """
+    Cơ sở IDCT đã nhân sẵn bảng lượng tử của một thành phần, cache theo (quality, component):
+    pixel (N, 64) = hệ số lượng tử (N, 64) @ basis, gộp giải lượng tử hóa vào IDCT.
+
+    Parameters:
+    -----------
+    quality : int
+        Hệ số chất lượng (1-100)
+    component : int
+        0 cho Y (y_quant), khác 0 cho Cb/Cr (c_quant)
+
+    Returns:
+    --------
+    ndarray
+        Ma trận (64, 64) float32
+    """
+    key = (quality, 0 if component == 0 else 1)
+    basis = _prescaled_basis_cache.get(key)
+    if basis is None:
+        y_quant, c_quant = adjust_quant_tables(quality)
+        q = (y_quant if key[1] == 0 else c_quant).astype(np.float32).reshape(64)
+        # (q * x) @ IDCT_KRON.T = x @ (IDCT_KRON * q).T
+        basis = np.ascontiguousarray((IDCT_KRON * q[None, :]).T)
+        _prescaled_basis_cache[key] = basis
+    return basis
+
+def apply_fused_idct_to_image(quant_blocks, quality=50, chunk_size=8192, component=0):
+    """
+    Giải lượng tử hóa và IDCT hợp nhất: đi thẳng từ hệ số lượng tử số nguyên tới pixel uint8
+    đã cắt, bằng cơ sở nhân sẵn bảng lượng tử (prescaled_idct_basis). Xử lý theo từng đoạn
+    `chunk_size` block nên chỉ có một lượt qua bộ nhớ, không tạo mảng float32 cỡ cả ảnh.
+
+    Parameters:
+    -----------
+    quant_blocks : ndarray
+        Khối lượng tử 4D (h, w, 8, 8) hoặc 5D (c, h, w, 8, 8), dtype số nguyên
+    quality : int, optional
+        Hệ số chất lượng (1-100), default=50
+    component : int, optional
+        Với khối 4D: 0 dùng bảng Y, khác 0 dùng bảng Cb/Cr, default=0
+
+    Returns:
+    --------
+    ndarray
+        Khối pixel cùng shape, dtype=uint8
+    """
+    if quant_blocks.ndim not in (4, 5) or quant_blocks.shape[-2:] != (8, 8):
+        raise ValueError("quant_blocks phải là mảng 4D (h,w,8,8) hoặc 5D (c,h,w,8,8)")
+    if not np.issubdtype(quant_blocks.dtype, np.integer):
+        raise ValueError("quant_blocks phải có dtype số nguyên")
+    if not 1 <= quality <= 100:
+        raise ValueError("Hệ số chất lượng phải từ 1 đến 100")
+
+    num_channels = quant_blocks.shape[0] if quant_blocks.ndim == 5 else 1
+    channels = quant_blocks.reshape(num_channels, -1, 64)
+    pixels = np.empty(channels.shape, dtype=np.uint8)
+    for ch, (coefficients, out) in enumerate(zip(channels, pixels)):
+        basis = prescaled_idct_basis(quality, ch if quant_blocks.ndim == 5 else component)
+        for start in range(0, len(coefficients), chunk_size):
+            chunk = coefficients[start:start + chunk_size].astype(np.float32) @ basis
+            chunk += np.float32(128.0)
+            np.rint(chunk, out=chunk)
+            np.clip(chunk, 0, 255, out=chunk)
+            out[start:start + chunk_size] = chunk
+
+    return pixels.reshape(quant_blocks.shape)
 
-def apply_idct_to_image(dct_blocks):
+def apply_idct_to_image(dct_blocks, engine='einsum', pruned=False):
     """
     Áp dụng IDCT 2D hiệu suất cao, hỗ trợ cả ảnh xám (4D) và ảnh màu (5D).
+    engine: tên engine trong DCT_ENGINES ('einsum', 'gemm', 'scipy', 'aan'), hoặc 'islow'
+            (số nguyên: nhận hệ số từ dequantize_integer, trả pixel uint8)
+    pruned: nếu True, dùng pruned_inverse: chỉ nhân các hệ số zigzag tới EOB của từng khối;
+            không dùng với 'islow' và các engine trong PRUNED_DENSE_ENGINES
     """
     if dct_blocks.ndim not in (4, 5) or dct_blocks.shape[-2:] != (8, 8):
         raise ValueError("dct_blocks phải là mảng 4D hoặc 5D với block size 8x8")
+    if engine == ISLOW_ENGINE:
+        if not np.issubdtype(dct_blocks.dtype, np.integer):
+            raise ValueError("Engine 'islow' cần hệ số số nguyên (xem dequantize_integer)")
+        pixels = islow_inverse(dct_blocks.reshape(-1, 8, 8)) + 128
+        return np.clip(pixels, 0, 255).astype(np.uint8).reshape(dct_blocks.shape)
+    if pruned and engine in PRUNED_DENSE_ENGINES:
+        raise ValueError(f"pruned không dùng với engine {PRUNED_DENSE_ENGINES}")
+    inverse = _engine(engine, 1)
 
     blocks = dct_blocks.astype(np.float32)
     shape = blocks.shape
     flat_blocks = blocks.reshape(-1, 8, 8)
 
-    C = _idct_matrix(8)
-    C_T = C.T
-    idct_flat = np.einsum('ij,njk,kl->nil', C, flat_blocks, C_T)
+    idct_flat = pruned_inverse(flat_blocks) if pruned else inverse(flat_blocks)
     idct_flat = np.clip(np.round(idct_flat + 128.0), 0, 255).astype(np.float32)
 
     return idct_flat.reshape(shape)
@@ -0,0 +1,258 @@
+import numpy as np
+
+class BitWriter:
+    """
+    Bộ ghi bit dùng thanh ghi số nguyên, đẩy từng byte hoàn chỉnh vào bytearray cấp phát trước.
+
+    Attributes:
+    -----------
+    total_bits : int
+        Tổng số bit đã ghi (không tính bit đệm cuối)
+    """
+    def __init__(self, capacity=1024):
+        if capacity < 1:
+            capacity = 1
+        self._buffer = bytearray(capacity)
+        self._pos = 0
+        self._acc = 0
+        self._nbits = 0
+        self.total_bits = 0
+
+    def write(self, value, length):
+        """
+        Ghi `length` bit thấp của `value` (MSB trước).
+
+        Parameters:
+        -----------
+        value : int
+            Giá trị không âm, < 2**length
+        length : int
+            Số bit cần ghi
+        """
+        acc = (self._acc << length) | value
+        nbits = self._nbits + length
+        self.total_bits += length
+        if nbits >= 32:
+            # Đẩy nhiều byte một lần để giảm số vòng lặp Python
+            n_bytes = nbits >> 3
+            nbits &= 7
+            pos = self._pos
+            end = pos + n_bytes
+            if end > len(self._buffer):
+                self._grow(end)
+            self._buffer[pos:end] = (acc >> nbits).to_bytes(n_bytes, 'big')
+            self._pos = end
+            acc &= (1 << nbits) - 1
+        self._acc = acc
+        self._nbits = nbits
+
+    def _grow(self, min_size):
+        new_size = max(min_size, 2 * len(self._buffer))
+        self._buffer.extend(bytes(new_size - len(self._buffer)))
+
+    def getvalue(self):
+        """
+        Trả về dữ liệu đã ghi dạng bytes, byte cuối được đệm bằng bit 0.
+        """
+        nbits = self._nbits
+        n_bytes = (nbits + 7) >> 3
+        tail = (self._acc << (n_bytes * 8 - nbits)).to_bytes(n_bytes, 'big')
+        return bytes(self._buffer[:self._pos]) + tail
+
+def pack_bits(values, lengths, chunk_size=1 << 20):
+    """
+    Ghép chuỗi giá trị có độ dài bit thay đổi thành bytes bằng NumPy (MSB trước, đệm bit 0).
+    Mỗi giá trị được đặt vào cửa sổ 64 bit rồi cộng dồn vào các word 32 bit bằng np.bincount,
+    xử lý theo từng đoạn `chunk_size` giá trị để giới hạn bộ nhớ tạm.
+
+    Parameters:
+    -----------
+    values : ndarray
+        Giá trị không âm, values[i] < 2**lengths[i]
+    lengths : ndarray
+        Số bit của từng giá trị, từ 1 đến 32
+
+    Returns:
+    --------
+    tuple
+        (encoded_bytes, total_bits)
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    if values.shape != lengths.shape:
+        raise ValueError("values và lengths phải cùng shape")
+    if len(lengths) == 0:
+        return b"", 0
+    if lengths.min() < 1 or lengths.max() > 32:
+        raise ValueError("Độ dài mỗi giá trị phải từ 1 đến 32 bit")
+
+    ends = np.cumsum(lengths)
+    total_bits = int(ends[-1])
+    words = np.zeros((total_bits + 31) // 32 + 1, dtype=np.uint32)
+
+    for start in range(0, len(lengths), chunk_size):
+        stop = start + chunk_size
+        length = lengths[start:stop]
+        offset = ends[start:stop] - length
+        word_idx = offset >> 5
+        shift = (64 - (offset & 31) - length).astype(np.uint64)
+        window = values[start:stop] << shift
+
+        # Các trường bit không chồng nhau nên cộng tương đương OR; float64 giữ chính xác giá trị < 2**32
+        base = int(word_idx[0])
+        rel = word_idx - base
+        size = int(rel[-1]) + 2
+        chunk_words = np.bincount(rel, weights=(window >> np.uint64(32)).astype(np.float64), minlength=size)
+        chunk_words += np.bincount(rel + 1, weights=(window & np.uint64(0xFFFFFFFF)).astype(np.float64), minlength=size)
+        words[base:base + size] |= chunk_words.astype(np.uint32)
+
+    return words.astype('>u4').tobytes()[:(total_bits + 7) // 8], total_bits
+
+class BitReader:
+    """
+    Bộ đọc bit trực tiếp trên bytes/memoryview/mmap, dùng thanh ghi số nguyên nạp từng byte.
+    Bộ nhớ phụ không phụ thuộc độ dài dữ liệu. Đọc quá cuối dữ liệu trả về bit 0.
+
+    Attributes:
+    -----------
+    total_bits : int
+        Số bit hợp lệ của dữ liệu
+    """
+    def __init__(self, data, total_bits=None):
+        self._data = memoryview(data).cast('B')
+        self._size = len(self._data)
+        if total_bits is None:
+            total_bits = self._size * 8
+        if total_bits > self._size * 8:
+            raise ValueError("total_bits vượt quá độ dài dữ liệu")
+        self.total_bits = total_bits
+        self._pos = 0
+        self._acc = 0
+        self._nbits = 0
+
+    @property
+    def position(self):
+        """Vị trí bit hiện tại tính từ đầu dữ liệu."""
+        return self._pos * 8 - self._nbits
+
+    def seek(self, bit_position):
+        """Di chuyển tới vị trí bit bất kỳ."""
+        if not 0 <= bit_position <= self.total_bits:
+            raise ValueError("Vị trí bit nằm ngoài dữ liệu")
+        self._pos = bit_position >> 3
+        self._acc = 0
+        self._nbits = 0
+        offset = bit_position & 7
+        if offset:
+            self._fill(8)
+            self._nbits -= offset
+            self._acc &= (1 << self._nbits) - 1
+
+    def _fill(self, n):
+        acc = self._acc
+        nbits = self._nbits
+        pos = self._pos
+        data = self._data
+        size = self._size
+        while nbits < n:
+            acc = (acc << 8) | (data[pos] if pos < size else 0)
+            pos += 1
+            nbits += 8
+        self._acc = acc
+        self._nbits = nbits
+        self._pos = pos
+
+    def peek(self, n):
+        """Xem trước n bit (MSB trước) mà không tiêu thụ."""
+        if self._nbits < n:
+            # Nạp dư để giảm số lần nạp
+            self._fill(n + 16)
+        return self._acc >> (self._nbits - n)
+
+    def skip(self, n):
+        """Bỏ qua n bit đã xem trước."""
+        if self._nbits < n:
+            self._fill(n)
+        self._nbits -= n
+        self._acc &= (1 << self._nbits) - 1
+
+    def read(self, n):
+        """Đọc n bit dạng số nguyên không dấu."""
+        if n == 0:
+            return 0
+        if self._nbits < n:
+            self._fill(n + 16)
+        nbits = self._nbits - n
+        value = self._acc >> nbits
+        self._acc &= (1 << nbits) - 1
+        self._nbits = nbits
+        return value
+
+def pack_segments(values, lengths, segment_ptr):
+    """
+    Ghép bit như pack_bits nhưng mỗi đoạn [segment_ptr[k], segment_ptr[k + 1]) được căn byte,
+    đệm bằng bit 1 (như JPEG trước marker RST).
+
+    Returns:
+    --------
+    list
+        List bytes, mỗi phần tử là một đoạn đã căn byte
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    segment_ptr = np.asarray(segment_ptr, dtype=np.int64)
+    segment_bits = np.add.reduceat(lengths, segment_ptr[:-1])
+    pad = (-segment_bits) % 8
+    has_pad = pad > 0
+    insert_at = segment_ptr[1:][has_pad]
+    values = np.insert(np.asarray(values, dtype=np.uint64), insert_at,
+                       ((1 << pad[has_pad]) - 1).astype(np.uint64))
+    lengths = np.insert(lengths, insert_at, pad[has_pad])
+
+    data, _ = pack_bits(values, lengths)
+    byte_ends = np.cumsum((segment_bits + pad) // 8)
+    starts = np.concatenate(([0], byte_ends[:-1]))
+    return [data[start:end] for start, end in zip(starts.tolist(), byte_ends.tolist())]
+
+def join_restart_segments(segments):
+    """
+    Nối các đoạn bằng marker RST (0xFFD0-0xFFD7), byte 0xFF trong dữ liệu được nhồi thành 0xFF00.
+    """
+    parts = []
+    for k, segment in enumerate(segments):
+        if k > 0:
+            parts.append(bytes((0xFF, 0xD0 + (k - 1) % 8)))
+        parts.append(bytes(segment).replace(b'\xff', b'\xff\x00'))
+    return b''.join(parts)
+
+def split_restart_segments(data):
+    """
+    Tách dòng byte tại các marker RST và bỏ nhồi byte, ngược với join_restart_segments.
+    Vị trí marker được tìm bằng find trên dữ liệu gốc (marker theo thứ tự RST0..RST7, byte 0xFF trong
+    dữ liệu luôn được nhồi 0xFF00 nên không trùng marker); mỗi đoạn là memoryview trỏ vào dữ liệu gốc,
+    chỉ đoạn có byte nhồi mới được chép để bỏ nhồi.
+
+    Parameters:
+    -----------
+    data : bytes, bytearray hoặc mmap
+        Dòng byte có marker RST
+
+    Returns:
+    --------
+    list
+        List đoạn (memoryview hoặc bytes), dùng được trực tiếp với BitReader
+    """
+    if not hasattr(data, 'find'):
+        data = bytes(data)
+    view = memoryview(data)
+    bounds = []
+    start = 0
+    while True:
+        end = data.find(bytes((0xFF, 0xD0 + len(bounds) % 8)), start)
+        if end < 0:
+            break
+        bounds.append((start, end))
+        start = end + 2
+    bounds.append((start, len(data)))
+    return [bytes(view[start:end]).replace(b'\xff\x00', b'\xff') if data.find(b'\xff\x00', start, end) >= 0
+            else view[start:end]
+            for start, end in bounds]
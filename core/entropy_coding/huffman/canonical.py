@@ -0,0 +1,192 @@
+import heapq
+
+MAX_CODE_LENGTH = 16
+
+def build_code_lengths(freq_table, max_length=MAX_CODE_LENGTH):
+    """
+    Tính độ dài mã Huffman cho từng symbol, giới hạn tối đa `max_length` bit.
+    Dùng thủ tục JPEG Annex K.2: thêm một symbol giả tần suất 1 để không có mã toàn bit 1,
+    sau đó điều chỉnh BITS theo Figure K.3 để không mã nào dài quá `max_length`.
+
+    Parameters:
+    -----------
+    freq_table : dict
+        Dict với key là symbol và value là tần suất
+    max_length : int, optional
+        Độ dài mã tối đa, default=16
+
+    Returns:
+    --------
+    tuple
+        (bits, huffval):
+        - bits: list độ dài `max_length`, bits[i] là số mã có độ dài i + 1
+        - huffval: list symbol theo thứ tự mã tăng dần
+
+    Raises:
+    -------
+    ValueError
+        Nếu bảng tần suất rỗng hoặc có quá nhiều symbol cho `max_length`
+    """
+    symbols = [symbol for symbol, freq in freq_table.items() if freq > 0]
+    if not symbols:
+        raise ValueError("Bảng tần suất không được rỗng")
+    if len(symbols) + 1 > (1 << max_length):
+        raise ValueError("Quá nhiều symbol cho độ dài mã tối đa")
+
+    # Huffman chuẩn trên tần suất, symbol giả (index = len(symbols)) có tần suất 1
+    freqs = [freq_table[symbol] for symbol in symbols] + [1]
+    code_size = [0] * len(freqs)
+    heap = [(freq, idx, [idx]) for idx, freq in enumerate(freqs)]
+    heapq.heapify(heap)
+    while len(heap) > 1:
+        freq1, tie1, members1 = heapq.heappop(heap)
+        freq2, tie2, members2 = heapq.heappop(heap)
+        for idx in members1:
+            code_size[idx] += 1
+        for idx in members2:
+            code_size[idx] += 1
+        heapq.heappush(heap, (freq1 + freq2, min(tie1, tie2), members1 + members2))
+
+    longest = max(code_size)
+    bits = [0] * (max(longest, max_length) + 1)
+    for size in code_size:
+        bits[size] += 1
+
+    # Figure K.3: dời các mã quá dài lên, giữ tính prefix-free
+    i = longest
+    while i > max_length:
+        while bits[i] > 0:
+            j = i - 2
+            while bits[j] == 0:
+                j -= 1
+            bits[i] -= 2
+            bits[i - 1] += 1
+            bits[j + 1] += 2
+            bits[j] -= 1
+        i -= 1
+
+    # Bỏ symbol giả (luôn nằm ở mã dài nhất)
+    i = max_length
+    while bits[i] == 0:
+        i -= 1
+    bits[i] -= 1
+
+    # Symbol có mã gốc ngắn hơn (tần suất cao hơn) nhận mã ngắn hơn
+    order = sorted(range(len(symbols)), key=lambda idx: (code_size[idx], idx))
+    huffval = [symbols[idx] for idx in order]
+    return bits[1:max_length + 1], huffval
+
+def canonical_codes_from_bits(bits, huffval):
+    """
+    Sinh mã canonical từ dạng gọn BITS/HUFFVAL (JPEG Annex C).
+
+    Parameters:
+    -----------
+    bits : list
+        bits[i] là số mã có độ dài i + 1
+    huffval : list
+        Symbol theo thứ tự mã tăng dần
+
+    Returns:
+    --------
+    dict
+        Dict với key là symbol và value là (code, length)
+
+    Raises:
+    -------
+    ValueError
+        Nếu tổng BITS không khớp số symbol trong HUFFVAL
+    """
+    if sum(bits) != len(huffval):
+        raise ValueError("Tổng BITS phải bằng số symbol trong HUFFVAL")
+
+    codes = {}
+    code = 0
+    k = 0
+    for length, count in enumerate(bits, start=1):
+        for _ in range(count):
+            codes[huffval[k]] = (code, length)
+            code += 1
+            k += 1
+        code <<= 1
+    return codes
+
+def build_canonical_codes(freq_table, max_length=MAX_CODE_LENGTH):
+    """
+    Xây dựng bảng mã Huffman canonical, giới hạn độ dài, từ bảng tần suất.
+
+    Parameters:
+    -----------
+    freq_table : dict
+        Dict với key là symbol và value là tần suất (ví dụ Counter từ build_frequency_table)
+    max_length : int, optional
+        Độ dài mã tối đa, default=16
+
+    Returns:
+    --------
+    tuple
+        (codes, bits, huffval):
+        - codes: dict {symbol: (code, length)}
+        - bits, huffval: dạng gọn của bảng mã (xem build_code_lengths)
+    """
+    bits, huffval = build_code_lengths(freq_table, max_length)
+    return canonical_codes_from_bits(bits, huffval), bits, huffval
+
+def symbol_to_byte(symbol):
+    """
+    Đổi symbol sang một byte: DC size giữ nguyên, AC (run, size) thành (run << 4) | size.
+    """
+    if isinstance(symbol, tuple):
+        run, size = symbol
+        return (run << 4) | size
+    return int(symbol)
+
+def byte_to_symbol(value, is_ac):
+    """
+    Đổi byte về symbol, ngược với symbol_to_byte.
+    """
+    return (value >> 4, value & 0x0F) if is_ac else value
+
+def table_to_bytes(bits, huffval):
+    """
+    Tuần tự hóa bảng mã: 16 byte BITS rồi tới các byte HUFFVAL (như segment DHT).
+
+    Parameters:
+    -----------
+    bits : list
+        Danh sách 16 số đếm độ dài mã
+    huffval : list
+        Symbol theo thứ tự mã tăng dần
+
+    Returns:
+    --------
+    bytes
+        Bảng mã dạng nhị phân
+    """
+    if len(bits) != MAX_CODE_LENGTH:
+        raise ValueError("BITS phải có đúng 16 phần tử")
+    return bytes(bits) + bytes(symbol_to_byte(symbol) for symbol in huffval)
+
+def table_from_bytes(data, is_ac):
+    """
+    Đọc bảng mã đã tuần tự hóa bởi table_to_bytes.
+
+    Parameters:
+    -----------
+    data : bytes
+        Dữ liệu bảng mã
+    is_ac : bool
+        True nếu là bảng AC (symbol dạng (run, size))
+
+    Returns:
+    --------
+    tuple
+        (bits, huffval)
+    """
+    if len(data) < MAX_CODE_LENGTH:
+        raise ValueError("Dữ liệu bảng mã quá ngắn")
+    bits = list(data[:MAX_CODE_LENGTH])
+    if len(data) != MAX_CODE_LENGTH + sum(bits):
+        raise ValueError("Độ dài dữ liệu bảng mã không khớp BITS")
+    huffval = [byte_to_symbol(value, is_ac) for value in data[MAX_CODE_LENGTH:]]
+    return bits, huffval
@@ -1,6 +1,21 @@
 import numpy as np
 import json
-from .huffman_encoder import build_huffman_tree, build_huffman_codes
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from .huffman_encoder import build_huffman_tree, build_huffman_codes, code_pairs, tables_per_channel, restart_segments
+from .bitstream import BitReader, split_restart_segments
+from core.entropy_coding.zigzag_rle import ZIGZAG_INDICES
+from core.entropy_coding.mcu import blocks_per_mcu, mcu_components, deinterleave_mcus
+from core.color_processing.subsampling import SUBSAMPLING_FACTORS
+
+# Số bit nhìn trước khi tra bảng; mã dài hơn đi theo đường chậm
+LOOKUP_BITS = 10
+
+# Số bảng tra giữ lại (LRU): bảng 'optimized' khác nhau theo từng ảnh, không giữ mãi trong process chạy lâu
+LOOKUP_CACHE_SIZE = 32
+
+# Vị trí (trong khối 8x8 đã làm phẳng) của hệ số thứ k theo thứ tự zigzag, dạng list cho vòng lặp Python
+_ZIGZAG_POSITIONS = ZIGZAG_INDICES.tolist()
 
 def decode_magnitude(bits):
     if not bits:
@@ -11,86 +26,457 @@ def decode_magnitude(bits):
         inverted = ''.join('1' if b == '0' else '0' for b in bits)
         return -int(inverted, 2)
 
-def huffman_decode_bitstring(encoded_data, dc_codes, ac_codes, total_bits,
-                              image_width, image_height, num_channels=1):
-    if not encoded_data or not dc_codes or not ac_codes:
-        raise ValueError("Dữ liệu và bảng mã phải không rỗng")
+def build_lookup_table(codes, lookup_bits=LOOKUP_BITS):
+    """
+    Xây bảng tra giải mã Huffman: nhìn trước `lookup_bits` bit để ra (symbol, độ dài mã) trong một bước.
+    Bảng được cache (LRU, LOOKUP_CACHE_SIZE bảng gần nhất) theo nội dung bảng mã, nên các đoạn restart
+    và các lần gọi liên tiếp với cùng bảng chỉ xây một lần.
 
-    blocks_x = (image_width + 7) // 8
-    blocks_y = (image_height + 7) // 8
-    blocks_per_channel = blocks_x * blocks_y
-    total_blocks = blocks_per_channel * num_channels
+    Parameters:
+    -----------
+    codes : dict
+        Bảng mã {symbol: chuỗi bit} hoặc {symbol: (code, length)}
+    lookup_bits : int, optional
+        Số bit nhìn trước, default=10
+
+    Returns:
+    --------
+    tuple
+        (lut, slow_codes, max_length):
+        - lut: list 2**lookup_bits phần tử (symbol, length), None nếu mã dài hơn lookup_bits hoặc không hợp lệ
+        - slow_codes: dict {(length, code): symbol} cho các mã dài hơn lookup_bits
+        - max_length: độ dài mã lớn nhất
+
+    Raises:
+    -------
+    ValueError
+        Nếu bảng mã rỗng
+    """
+    if not codes:
+        raise ValueError("Bảng mã không được rỗng")
+
+    return _build_lookup_table(frozenset(code_pairs(codes).items()), lookup_bits)
+
+@lru_cache(maxsize=LOOKUP_CACHE_SIZE)
+def _build_lookup_table(pairs, lookup_bits):
+    lut = [None] * (1 << lookup_bits)
+    slow_codes = {}
+    for symbol, (code, length) in pairs:
+        if length <= lookup_bits:
+            # Mọi chỉ số bắt đầu bằng mã này đều trỏ tới symbol
+            shift = lookup_bits - length
+            entry = (symbol, length)
+            for idx in range(code << shift, (code + 1) << shift):
+                lut[idx] = entry
+        else:
+            slow_codes[(length, code)] = symbol
+
+    return lut, slow_codes, max(length for _, (_, length) in pairs)
 
-    # Tối ưu: convert trực tiếp sang chuỗi nhị phân
-    bit_array = np.unpackbits(np.frombuffer(encoded_data, dtype=np.uint8))[:total_bits]
-    bitstring = ''.join(bit_array.astype(str))
+def decode_symbol(reader, table, lookup_bits=LOOKUP_BITS):
+    """
+    Giải mã một symbol Huffman từ BitReader bằng bảng tra.
 
-    reversed_dc = {code: value for value, code in dc_codes.items()}
-    reversed_ac = {code: value for value, code in ac_codes.items()}
-    max_dc_len = max(len(k) for k in reversed_dc)
-    max_ac_len = max(len(k) for k in reversed_ac)
+    Parameters:
+    -----------
+    reader : BitReader
+        Bộ đọc bit
+    table : tuple
+        Kết quả từ build_lookup_table với cùng lookup_bits
 
+    Returns:
+    --------
+    symbol hoặc None nếu không có mã hợp lệ tại vị trí hiện tại
+    """
+    lut, slow_codes, max_length = table
+    entry = lut[reader.peek(lookup_bits)]
+    if entry is not None:
+        reader.skip(entry[1])
+        return entry[0]
+    # Đường chậm: thử lần lượt các độ dài mã lớn hơn lookup_bits
+    for length in range(lookup_bits + 1, max_length + 1):
+        symbol = slow_codes.get((length, reader.peek(length)))
+        if symbol is not None:
+            reader.skip(length)
+            return symbol
+    return None
+
+def receive_extend(reader, size):
+    """
+    Đọc `size` bit magnitude và đổi về giá trị có dấu (JPEG F.2.2.1).
+    """
+    if size == 0:
+        return 0
+    value = reader.read(size)
+    if value < (1 << (size - 1)):
+        value -= (1 << size) - 1
+    return value
+
+def _decode_blocks(reader, dc_table, ac_table, num_blocks, first_block=0, previous_dc=0):
+    """
+    Giải mã tối đa `num_blocks` block liên tiếp, predictor DC bắt đầu từ `previous_dc`.
+    Dừng sớm nếu hết total_bits của reader.
+    """
+    n_bits = reader.total_bits
     decoded_data = []
-    i = 0
-    previous_dc = 0
-    block_idx = 0
+    block_idx = first_block
 
-    while i < len(bitstring) and len(decoded_data) < total_blocks:
+    for _ in range(num_blocks):
+        if reader.position >= n_bits:
+            break
         block_idx += 1
 
         # === GIẢI MÃ DC ===
-        current_code = ""
-        start_i = i
-        while i < len(bitstring) and len(current_code) <= max_dc_len:
-            current_code += bitstring[i]
-            i += 1
-            if current_code in reversed_dc:
-                dc_size = reversed_dc[current_code]
-                break
-        else:
+        start_i = reader.position
+        dc_size = decode_symbol(reader, dc_table)
+        if dc_size is None:
             raise ValueError(f"❌ Không tìm thấy mã DC tại block {block_idx}, từ bit index {start_i}")
-
-        if dc_size > 0:
-            if i + dc_size > len(bitstring):
-                raise ValueError(f"❌ Không đủ bit để đọc DC magnitude tại block {block_idx}, index {i}")
-            dc_bits = bitstring[i:i+dc_size]
-            i += dc_size
-            dc_diff = decode_magnitude(dc_bits)
-        else:
-            dc_diff = 0
-
-        dc_value = previous_dc + dc_diff
+        dc_value = previous_dc + receive_extend(reader, dc_size)
         previous_dc = dc_value
 
         # === GIẢI MÃ AC ===
         ac_list = []
         while True:
-            current_code = ""
-            start_i = i
-            while i < len(bitstring) and len(current_code) <= max_ac_len:
-                current_code += bitstring[i]
-                i += 1
-                if current_code in reversed_ac:
-                    runlength, size = reversed_ac[current_code]
-                    break
-            else:
-                raise ValueError(f"❌ Không tìm thấy mã AC tại block {block_idx}, từ bit index {start_i}")
+            symbol = decode_symbol(reader, ac_table)
+            if symbol is None:
+                raise ValueError(f"❌ Không tìm thấy mã AC tại block {block_idx}, từ bit index {reader.position}")
+            runlength, size = symbol
 
-            if (runlength, size) == (0, 0):  # EOB
+            if size == 0 and runlength == 0:  # EOB
                 ac_list.append((0, 0))
                 break
 
-            if i + size > len(bitstring):
-                raise ValueError(f"❌ Không đủ bit để đọc AC magnitude tại block {block_idx}, index {i}")
-
-            ac_bits = bitstring[i:i+size]
-            i += size
-            ac_value = decode_magnitude(ac_bits)
+            ac_list.append((runlength, receive_extend(reader, size)))
 
-            ac_list.append((runlength, ac_value))
+        # Bit đọc quá total_bits là bit đệm 0, không phải dữ liệu
+        if reader.position > n_bits:
+            raise ValueError(f"❌ Không đủ bit để giải mã block {block_idx}, từ bit index {start_i}")
 
         decoded_data.append((dc_value, ac_list))
 
+    return decoded_data
+
+def _decode_segment(segment, dc_codes, ac_codes, num_blocks, first_block):
+    """Giải mã một đoạn restart độc lập (chạy được trong process con)."""
+    reader = BitReader(segment)
+    blocks = _decode_blocks(reader, build_lookup_table(dc_codes), build_lookup_table(ac_codes),
+                            num_blocks, first_block)
+    if len(blocks) != num_blocks:
+        raise ValueError(f"❌ Đoạn restart bắt đầu tại block {first_block + 1} thiếu dữ liệu")
+    return blocks
+
+def _coefficient_view(out):
+    """memoryview phẳng ghi được trên mảng hệ số C-contiguous int16/int32."""
+    formats = {np.dtype(np.int16): 'h', np.dtype(np.int32): 'i'}
+    if out.dtype not in formats or not out.flags.c_contiguous:
+        raise ValueError("Mảng hệ số phải C-contiguous với dtype int16 hoặc int32")
+    return memoryview(out.reshape(-1)).cast('B').cast(formats[out.dtype])
+
+def _decode_blocks_into(reader, dc_table, ac_table, coefficients, num_blocks, first_block=0, previous_dc=0):
+    """
+    Giải mã `num_blocks` block liên tiếp và ghi thẳng từng hệ số vào vị trí đã bỏ zigzag
+    trong `coefficients` (memoryview phẳng, 64 phần tử mỗi block, đã khởi tạo 0).
+    Block đầu tiên được ghi tại chỉ số `first_block`.
+
+    Returns:
+    --------
+    tuple
+        (số block đã giải mã, predictor DC sau block cuối)
+    """
+    n_bits = reader.total_bits
+    positions = _ZIGZAG_POSITIONS
+    lut_bits = LOOKUP_BITS
+
+    for count in range(num_blocks):
+        if reader.position >= n_bits:
+            return count, previous_dc
+        block_idx = first_block + count
+        base = block_idx * 64
+
+        # === GIẢI MÃ DC ===
+        start_i = reader.position
+        dc_size = decode_symbol(reader, dc_table, lut_bits)
+        if dc_size is None:
+            raise ValueError(f"❌ Không tìm thấy mã DC tại block {block_idx + 1}, từ bit index {start_i}")
+        previous_dc += receive_extend(reader, dc_size)
+        coefficients[base] = previous_dc
+
+        # === GIẢI MÃ AC === (encoder luôn ghi EOB, kể cả khi hệ số cuối khác 0)
+        k = 1
+        while True:
+            symbol = decode_symbol(reader, ac_table, lut_bits)
+            if symbol is None:
+                raise ValueError(f"❌ Không tìm thấy mã AC tại block {block_idx + 1}, từ bit index {reader.position}")
+            runlength, size = symbol
+            if size == 0:
+                if runlength == 0:  # EOB
+                    break
+                k += 16  # ZRL
+                continue
+            k += runlength
+            if k > 63:
+                raise ValueError(f"❌ Hệ số AC vượt quá 64 tại block {block_idx + 1}")
+            coefficients[base + positions[k]] = receive_extend(reader, size)
+            k += 1
+
+        if reader.position > n_bits:
+            raise ValueError(f"❌ Không đủ bit để giải mã block {block_idx + 1}, từ bit index {start_i}")
+
+    return num_blocks, previous_dc
+
+def _decode_segment_to_array(segment, dc_codes, ac_codes, num_blocks, first_block, dtype):
+    """Giải mã một đoạn restart thành mảng (num_blocks, 64) đã bỏ zigzag (chạy được trong process con)."""
+    out = np.zeros((num_blocks, 64), dtype=dtype)
+    decoded, _ = _decode_blocks_into(BitReader(segment), build_lookup_table(dc_codes), build_lookup_table(ac_codes),
+                                     _coefficient_view(out), num_blocks)
+    if decoded != num_blocks:
+        raise ValueError(f"❌ Đoạn restart bắt đầu tại block {first_block + 1} thiếu dữ liệu")
+    return out
+
+def _decode_interleaved_into(reader, dc_tables, ac_tables, coefficients, components, first_block=0,
+                             previous_dc=(0, 0, 0)):
+    """
+    Giải mã các block của dòng xen kẽ MCU theo `components` (thành phần của từng block), mỗi thành
+    phần dùng bảng và predictor DC riêng; block đầu tiên được ghi tại chỉ số `first_block`.
+
+    Returns:
+    --------
+    list
+        Predictor DC của [Y, Cb, Cr] sau block cuối
+    """
+    previous_dc = list(previous_dc)
+    for k, component in enumerate(components.tolist()):
+        decoded, previous_dc[component] = _decode_blocks_into(reader, dc_tables[component], ac_tables[component],
+                                                              coefficients, 1, first_block + k, previous_dc[component])
+        if decoded != 1:
+            raise ValueError(f"❌ Không đủ dữ liệu để giải mã block {first_block + k + 1}")
+    return previous_dc
+
+def _decode_mcu_segment_to_array(segment, dc_codes, ac_codes, components, dtype):
+    """Giải mã một đoạn restart của dòng xen kẽ MCU thành mảng (len(components), 64) (chạy được trong process con)."""
+    out = np.zeros((len(components), 64), dtype=dtype)
+    _decode_interleaved_into(BitReader(segment), [build_lookup_table(codes) for codes in dc_codes],
+                             [build_lookup_table(codes) for codes in ac_codes], _coefficient_view(out), components)
+    return out
+
+def huffman_decode_to_blocks(encoded_data, dc_codes, ac_codes, total_bits, padded_shape,
+                             restart_interval=0, workers=1, dtype=np.int32):
+    """
+    Giải mã Huffman hợp nhất với giải RLE và zigzag: mỗi hệ số được ghi thẳng vào mảng khối
+    cấp phát trước, không tạo list (dc, [(run, value), ...]) trung gian.
+    Kết quả giống apply_inverse_zigzag_and_rle(huffman_decode_bitstring(...), padded_shape).
+
+    Parameters:
+    -----------
+    encoded_data : bytes
+        Dữ liệu mã hóa (bytes, memoryview hoặc mmap)
+    dc_codes, ac_codes : dict or list
+        Bảng mã Huffman (dùng chung hoặc theo từng kênh)
+    total_bits : int
+        Số bit hợp lệ
+    padded_shape : tuple
+        (H, W) hoặc (C, H, W) của ảnh đã pad
+    restart_interval : int, optional
+        Số block giữa hai marker RST, default=0
+    workers : int, optional
+        Số process giải mã song song các đoạn restart, default=1
+    dtype : dtype, optional
+        np.int16 hoặc np.int32, default=np.int32
+
+    Returns:
+    --------
+    ndarray
+        Khối lượng tử (H/8, W/8, 8, 8) hoặc (C, H/8, W/8, 8, 8)
+    """
+    if not len(encoded_data) or not dc_codes or not ac_codes:
+        raise ValueError("Dữ liệu và bảng mã phải không rỗng")
+    if len(padded_shape) == 2:
+        num_channels = 1
+        image_height, image_width = padded_shape
+    elif len(padded_shape) == 3:
+        num_channels, image_height, image_width = padded_shape
+    else:
+        raise ValueError("padded_shape phải là (h, w) hoặc (c, h, w)")
+
+    blocks_x = (image_width + 7) // 8
+    blocks_y = (image_height + 7) // 8
+    blocks_per_channel = blocks_x * blocks_y
+
+    out = np.zeros((num_channels * blocks_per_channel, 64), dtype=dtype)
+    coefficients = _coefficient_view(out)
+    dc_tables = tables_per_channel(dc_codes, num_channels)
+    ac_tables = tables_per_channel(ac_codes, num_channels)
+
+    if restart_interval > 0:
+        layout = restart_segments(num_channels, blocks_per_channel, restart_interval)
+        segments = split_restart_segments(encoded_data)
+        if len(segments) != len(layout):
+            raise ValueError("Số đoạn restart không khớp với kích thước ảnh")
+        if workers > 1:
+            # Gửi sang process khác cần bytes (memoryview không pickle được)
+            jobs = [
+                (bytes(segment), dc_tables[ch], ac_tables[ch], count, first, out.dtype)
+                for segment, (ch, first, count) in zip(segments, layout)
+            ]
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                chunksize = max(1, len(jobs) // (workers * 4))
+                for (_, first, count), blocks in zip(layout, executor.map(_decode_segment_to_array, *zip(*jobs),
+                                                                             chunksize=chunksize)):
+                    out[first:first + count] = blocks
+        else:
+            for segment, (ch, first, count) in zip(segments, layout):
+                decoded, _ = _decode_blocks_into(BitReader(segment), build_lookup_table(dc_tables[ch]),
+                                                 build_lookup_table(ac_tables[ch]), coefficients, count, first)
+                if decoded != count:
+                    raise ValueError(f"❌ Đoạn restart bắt đầu tại block {first + 1} thiếu dữ liệu")
+    else:
+        reader = BitReader(encoded_data, total_bits)
+        for ch in range(num_channels):
+            # Predictor DC reset ở đầu mỗi kênh
+            first = ch * blocks_per_channel
+            decoded, _ = _decode_blocks_into(reader, build_lookup_table(dc_tables[ch]), build_lookup_table(ac_tables[ch]),
+                                             coefficients, blocks_per_channel, first)
+            if decoded != blocks_per_channel:
+                raise ValueError(f"❌ Không đủ dữ liệu để giải mã kênh {ch}")
+
+    coefficients.release()
+    shape = (blocks_y, blocks_x, 8, 8)
+    if num_channels > 1:
+        shape = (num_channels,) + shape
+    return out.reshape(shape)
+
+def huffman_decode_mcus(encoded_data, dc_codes, ac_codes, total_bits, padded_shape, subsampling,
+                        restart_interval=0, workers=1, dtype=np.int32):
+    """
+    Giải mã dòng bit xen kẽ MCU của ảnh màu lấy mẫu phụ (encode_quantized_blocks với components
+    từ interleave_mcus): bảng mã chọn theo thành phần của từng block, mỗi thành phần có predictor
+    DC riêng. Hệ số được ghi thẳng vào mảng như huffman_decode_to_blocks.
+    Với restart_interval > 0, các đoạn restart (mỗi đoạn `restart_interval` MCU) được giải mã
+    độc lập, song song nếu workers > 1.
+
+    Parameters:
+    -----------
+    encoded_data : bytes
+        Dữ liệu mã hóa
+    dc_codes, ac_codes : dict or list
+        Bảng mã Huffman (dùng chung hoặc theo từng thành phần)
+    total_bits : int
+        Số bit hợp lệ
+    padded_shape : tuple
+        (3, H, W) của ảnh đã pad theo kích thước MCU
+    subsampling : str
+        '4:4:4', '4:2:2' hoặc '4:2:0'
+    restart_interval : int, optional
+        Số MCU giữa hai marker RST, default=0
+    workers : int, optional
+        Số process giải mã song song các đoạn restart, default=1
+    dtype : dtype, optional
+        np.int16 hoặc np.int32, default=np.int32
+
+    Returns:
+    --------
+    list
+        [Y (H/8, W/8, 8, 8), Cb, Cr] khối lượng tử, Cb/Cr có số block chia theo hệ số lấy mẫu
+    """
+    if not len(encoded_data) or not dc_codes or not ac_codes:
+        raise ValueError("Dữ liệu và bảng mã phải không rỗng")
+    if len(padded_shape) != 3 or padded_shape[0] != 3:
+        raise ValueError("padded_shape phải là (3, h, w)")
+    if subsampling not in SUBSAMPLING_FACTORS:
+        raise ValueError("Kiểu lấy mẫu phụ phải là '4:4:4', '4:2:2', hoặc '4:2:0'")
+    v, h = SUBSAMPLING_FACTORS[subsampling]
+    _, image_height, image_width = padded_shape
+    if image_height % (8 * v) or image_width % (8 * h):
+        raise ValueError("Kích thước ảnh phải chia hết cho kích thước MCU")
+
+    mcu_grid = (image_height // (8 * v), image_width // (8 * h))
+    components = mcu_components(subsampling, mcu_grid[0] * mcu_grid[1])
+    out = np.zeros((len(components), 64), dtype=dtype)
+    coefficients = _coefficient_view(out)
+    dc_codes = tables_per_channel(dc_codes, 3)
+    ac_codes = tables_per_channel(ac_codes, 3)
+
+    if restart_interval > 0:
+        # Predictor DC của cả ba thành phần reset ở đầu mỗi đoạn restart_interval MCU
+        segment_blocks = restart_interval * blocks_per_mcu(subsampling)
+        starts = range(0, len(components), segment_blocks)
+        segments = split_restart_segments(encoded_data)
+        if len(segments) != len(starts):
+            raise ValueError("Số đoạn restart không khớp với kích thước ảnh")
+        if workers > 1:
+            # Gửi sang process khác cần bytes (memoryview không pickle được)
+            jobs = [(bytes(segment), dc_codes, ac_codes, components[first:first + segment_blocks], out.dtype)
+                    for segment, first in zip(segments, starts)]
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                chunksize = max(1, len(jobs) // (workers * 4))
+                for first, blocks in zip(starts, executor.map(_decode_mcu_segment_to_array, *zip(*jobs),
+                                                              chunksize=chunksize)):
+                    out[first:first + len(blocks)] = blocks
+        else:
+            dc_tables = [build_lookup_table(codes) for codes in dc_codes]
+            ac_tables = [build_lookup_table(codes) for codes in ac_codes]
+            for segment, first in zip(segments, starts):
+                _decode_interleaved_into(BitReader(segment), dc_tables, ac_tables, coefficients,
+                                         components[first:first + segment_blocks], first)
+    else:
+        _decode_interleaved_into(BitReader(encoded_data, total_bits), [build_lookup_table(codes) for codes in dc_codes],
+                                 [build_lookup_table(codes) for codes in ac_codes], coefficients, components)
+
+    coefficients.release()
+    return deinterleave_mcus(out, mcu_grid, subsampling)
+
+def huffman_decode_bitstring(encoded_data, dc_codes, ac_codes, total_bits,
+                              image_width, image_height, num_channels=1,
+                              restart_interval=0, workers=1):
+    """
+    Giải mã Huffman trực tiếp trên bytes (hoặc memoryview/mmap) bằng BitReader,
+    bộ nhớ phụ không phụ thuộc độ dài dòng bit.
+
+    Với restart_interval > 0, dòng byte được tách tại các marker RST và các đoạn được
+    giải mã độc lập; nếu workers > 1 các đoạn chạy song song trên ProcessPoolExecutor.
+
+    Returns:
+    --------
+    list
+        [block] = (dc, ac) với ảnh xám, [channel][block] = (dc, ac) với ảnh màu
+    """
+    if not len(encoded_data) or not dc_codes or not ac_codes:
+        raise ValueError("Dữ liệu và bảng mã phải không rỗng")
+
+    blocks_x = (image_width + 7) // 8
+    blocks_y = (image_height + 7) // 8
+    blocks_per_channel = blocks_x * blocks_y
+
+    dc_tables = tables_per_channel(dc_codes, num_channels)
+    ac_tables = tables_per_channel(ac_codes, num_channels)
+
+    if restart_interval > 0:
+        layout = restart_segments(num_channels, blocks_per_channel, restart_interval)
+        segments = split_restart_segments(encoded_data)
+        if len(segments) != len(layout):
+            raise ValueError("Số đoạn restart không khớp với kích thước ảnh")
+        jobs = [
+            (segment, dc_tables[ch], ac_tables[ch], count, first)
+            for segment, (ch, first, count) in zip(segments, layout)
+        ]
+        if workers > 1:
+            # Gửi sang process khác cần bytes (memoryview không pickle được)
+            jobs = [(bytes(job[0]),) + job[1:] for job in jobs]
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                chunksize = max(1, len(jobs) // (workers * 4))
+                results = list(executor.map(_decode_segment, *zip(*jobs), chunksize=chunksize))
+        else:
+            results = [_decode_segment(*job) for job in jobs]
+        decoded_data = [block for blocks in results for block in blocks]
+    else:
+        reader = BitReader(encoded_data, total_bits)
+        decoded_data = []
+        for ch in range(num_channels):
+            # Predictor DC reset ở đầu mỗi kênh, giống apply_zigzag_and_rle
+            decoded_data.extend(_decode_blocks(
+                reader, build_lookup_table(dc_tables[ch]), build_lookup_table(ac_tables[ch]),
+                blocks_per_channel, ch * blocks_per_channel))
+
     print("✅ Giải mã hoàn tất: tổng số block =", len(decoded_data))
 
     if num_channels > 1:
@@ -101,3 +487,228 @@ def huffman_decode_bitstring(encoded_data, dc_codes, ac_codes, total_bits,
         return grouped
 
     return decoded_data
+
+def huffman_decode_region(encoded_data, dc_codes, ac_codes, total_bits, padded_shape,
+                          block_index, block_rows, block_cols, restart_interval=0):
+    """
+    Giải mã entropy chỉ các block trong vùng chữ nhật, dùng index từ build_block_index để
+    nhảy tới vị trí bit gần nhất trước mỗi hàng block cần thiết. Với dòng bit có restart marker,
+    các đoạn restart là điểm nhảy: chỉ các đoạn chứa block của vùng được giải mã.
+
+    Parameters:
+    -----------
+    encoded_data : bytes
+        Dòng bit (có restart marker nếu restart_interval > 0)
+    dc_codes, ac_codes : dict or list
+        Bảng mã Huffman (dùng chung hoặc theo từng kênh)
+    total_bits : int
+        Số bit hợp lệ
+    padded_shape : tuple
+        (H, W) hoặc (C, H, W) của ảnh đã pad
+    block_index : ndarray
+        Mảng (K, 3) (block, bit_offset, previous_dc) từ build_block_index; None nếu restart_interval > 0
+    block_rows, block_cols : tuple
+        Khoảng hàng/cột block [start, stop)
+    restart_interval : int, optional
+        Số block giữa hai marker RST, default=0
+
+    Returns:
+    --------
+    ndarray
+        Khối lượng tử (rows, cols, 8, 8) hoặc (C, rows, cols, 8, 8), dtype int32
+    """
+    if not len(encoded_data) or not dc_codes or not ac_codes:
+        raise ValueError("Dữ liệu và bảng mã phải không rỗng")
+    if len(padded_shape) == 2:
+        num_channels = 1
+        image_height, image_width = padded_shape
+    elif len(padded_shape) == 3:
+        num_channels, image_height, image_width = padded_shape
+    else:
+        raise ValueError("padded_shape phải là (h, w) hoặc (c, h, w)")
+
+    blocks_x = image_width // 8
+    blocks_y = image_height // 8
+    blocks_per_channel = blocks_x * blocks_y
+    row_start, row_stop = block_rows
+    col_start, col_stop = block_cols
+    if not (0 <= row_start < row_stop <= blocks_y and 0 <= col_start < col_stop <= blocks_x):
+        raise ValueError("Vùng block nằm ngoài ảnh")
+
+    dc_tables = tables_per_channel(dc_codes, num_channels)
+    ac_tables = tables_per_channel(ac_codes, num_channels)
+    region = np.zeros((num_channels, row_stop - row_start, col_stop - col_start, 8, 8), dtype=np.int32)
+
+    if restart_interval > 0:
+        layout = restart_segments(num_channels, blocks_per_channel, restart_interval)
+        segments = split_restart_segments(encoded_data)
+        if len(segments) != len(layout):
+            raise ValueError("Số đoạn restart không khớp với kích thước ảnh")
+        segment_starts = np.array([first for _, first, _ in layout])
+        decoded_segment, segment_blocks = -1, None
+        for ch in range(num_channels):
+            dc_table = build_lookup_table(dc_tables[ch])
+            ac_table = build_lookup_table(ac_tables[ch])
+            for row in range(row_start, row_stop):
+                first = ch * blocks_per_channel + row * blocks_x + col_start
+                stop = first + (col_stop - col_start)
+                block = first
+                while block < stop:
+                    # Giải mã trọn đoạn chứa block (predictor DC bắt đầu từ 0), giữ lại cho hàng sau
+                    k = int(np.searchsorted(segment_starts, block, side='right')) - 1
+                    _, segment_first, count = layout[k]
+                    if k != decoded_segment:
+                        segment_blocks = np.zeros((count, 64), dtype=np.int32)
+                        decoded, _ = _decode_blocks_into(BitReader(segments[k]), dc_table, ac_table,
+                                                         _coefficient_view(segment_blocks), count)
+                        if decoded != count:
+                            raise ValueError(f"❌ Đoạn restart bắt đầu tại block {segment_first + 1} thiếu dữ liệu")
+                        decoded_segment = k
+                    end = min(segment_first + count, stop)
+                    region[ch, row - row_start, block - first:end - first] = \
+                        segment_blocks[block - segment_first:end - segment_first].reshape(-1, 8, 8)
+                    block = end
+        return region[0] if num_channels == 1 else region
+
+    block_index = np.asarray(block_index, dtype=np.int64)
+    index_blocks = block_index[:, 0]
+    reader = BitReader(encoded_data, total_bits)
+    for ch in range(num_channels):
+        dc_table = build_lookup_table(dc_tables[ch])
+        ac_table = build_lookup_table(ac_tables[ch])
+        next_block, next_dc = -1, 0
+
+        for row in range(row_start, row_stop):
+            first = ch * blocks_per_channel + row * blocks_x + col_start
+            stop = first + (col_stop - col_start)
+            k = np.searchsorted(index_blocks, first, side='right') - 1
+            start_block, bit_offset, previous_dc = (int(v) for v in block_index[k])
+            if start_block < ch * blocks_per_channel:
+                raise ValueError("Index thiếu mục ở đầu kênh")
+
+            # Tiếp tục từ vị trí hiện tại nếu gần hơn mục index
+            if start_block <= next_block <= first:
+                start_block, previous_dc = next_block, next_dc
+            else:
+                reader.seek(bit_offset)
+
+            # Giải mã cả các block đứng trước vùng (từ mục index) vào mảng tạm, chỉ giữ phần trong vùng
+            row_blocks = np.zeros((stop - start_block, 64), dtype=np.int32)
+            decoded, last_dc = _decode_blocks_into(reader, dc_table, ac_table, _coefficient_view(row_blocks),
+                                                   stop - start_block, 0, previous_dc)
+            if decoded != stop - start_block:
+                raise ValueError(f"❌ Không đủ dữ liệu để giải mã hàng block {row}")
+            region[ch, row - row_start] = row_blocks[first - start_block:].reshape(-1, 8, 8)
+            next_block, next_dc = stop, last_dc
+
+    return region[0] if num_channels == 1 else region
+
+def huffman_decode_mcu_region(encoded_data, dc_codes, ac_codes, total_bits, padded_shape, subsampling,
+                              block_index, mcu_rows, mcu_cols, restart_interval=0):
+    """
+    Như huffman_decode_region cho dòng xen kẽ MCU của ảnh lấy mẫu phụ: chỉ giải mã các MCU trong
+    vùng chữ nhật, nhảy tới mục index gần nhất (build_block_index trên dòng xen kẽ, mỗi mục có
+    predictor DC của cả ba thành phần) hoặc tới đoạn restart chứa MCU trước mỗi hàng MCU.
+
+    Parameters:
+    -----------
+    encoded_data : bytes
+        Dòng bit xen kẽ MCU (có restart marker nếu restart_interval > 0)
+    dc_codes, ac_codes : dict or list
+        Bảng mã Huffman (dùng chung hoặc theo từng thành phần)
+    total_bits : int
+        Số bit hợp lệ
+    padded_shape : tuple
+        (3, H, W) của ảnh đã pad theo kích thước MCU
+    subsampling : str
+        '4:2:2' hoặc '4:2:0'
+    block_index : ndarray
+        Mảng (K, 5) (block, bit_offset, previous_dc Y, Cb, Cr) từ build_block_index;
+        None nếu restart_interval > 0
+    mcu_rows, mcu_cols : tuple
+        Khoảng hàng/cột MCU [start, stop)
+    restart_interval : int, optional
+        Số MCU giữa hai marker RST, default=0
+
+    Returns:
+    --------
+    list
+        [Y, Cb, Cr] khối lượng tử của vùng như deinterleave_mcus, dtype int32
+    """
+    if not len(encoded_data) or not dc_codes or not ac_codes:
+        raise ValueError("Dữ liệu và bảng mã phải không rỗng")
+    if len(padded_shape) != 3 or padded_shape[0] != 3:
+        raise ValueError("padded_shape phải là (3, h, w)")
+    if subsampling not in SUBSAMPLING_FACTORS:
+        raise ValueError("Kiểu lấy mẫu phụ phải là '4:4:4', '4:2:2', hoặc '4:2:0'")
+    if restart_interval <= 0:
+        block_index = np.asarray(block_index, dtype=np.int64)
+        if block_index.ndim != 2 or block_index.shape[1] != 5:
+            raise ValueError("block_index của dòng xen kẽ MCU phải có shape (K, 5)")
+    v, h = SUBSAMPLING_FACTORS[subsampling]
+    mcus_y = padded_shape[1] // (8 * v)
+    mcus_x = padded_shape[2] // (8 * h)
+    row_start, row_stop = mcu_rows
+    col_start, col_stop = mcu_cols
+    if not (0 <= row_start < row_stop <= mcus_y and 0 <= col_start < col_stop <= mcus_x):
+        raise ValueError("Vùng MCU nằm ngoài ảnh")
+
+    mcu_size = blocks_per_mcu(subsampling)
+    components = mcu_components(subsampling, mcus_y * mcus_x)
+    dc_tables = [build_lookup_table(codes) for codes in tables_per_channel(dc_codes, 3)]
+    ac_tables = [build_lookup_table(codes) for codes in tables_per_channel(ac_codes, 3)]
+    row_blocks = (col_stop - col_start) * mcu_size
+    region = np.zeros(((row_stop - row_start) * row_blocks, 64), dtype=np.int32)
+
+    if restart_interval > 0:
+        segment_size = restart_interval * mcu_size
+        segments = split_restart_segments(encoded_data)
+        if len(segments) != -(-len(components) // segment_size):
+            raise ValueError("Số đoạn restart không khớp với kích thước ảnh")
+        decoded_segment, segment_blocks = -1, None
+        for row in range(row_start, row_stop):
+            first = (row * mcus_x + col_start) * mcu_size
+            stop = first + row_blocks
+            out = (row - row_start) * row_blocks - first
+            block = first
+            while block < stop:
+                # Giải mã trọn đoạn chứa block (predictor DC bắt đầu từ 0), giữ lại cho hàng sau
+                k = block // segment_size
+                segment_first = k * segment_size
+                if k != decoded_segment:
+                    segment_components = components[segment_first:segment_first + segment_size]
+                    segment_blocks = np.zeros((len(segment_components), 64), dtype=np.int32)
+                    _decode_interleaved_into(BitReader(segments[k]), dc_tables, ac_tables,
+                                             _coefficient_view(segment_blocks), segment_components)
+                    decoded_segment = k
+                end = min(segment_first + segment_size, stop)
+                region[out + block:out + end] = segment_blocks[block - segment_first:end - segment_first]
+                block = end
+        return deinterleave_mcus(region, (row_stop - row_start, col_stop - col_start), subsampling)
+
+    index_blocks = block_index[:, 0]
+    reader = BitReader(encoded_data, total_bits)
+    next_block, next_dc = -1, None
+    for row in range(row_start, row_stop):
+        first = (row * mcus_x + col_start) * mcu_size
+        stop = first + row_blocks
+        k = np.searchsorted(index_blocks, first, side='right') - 1
+        if k < 0:
+            raise ValueError("Index thiếu mục ở đầu dòng bit")
+        start_block, bit_offset = (int(value) for value in block_index[k, :2])
+        previous_dc = block_index[k, 2:].tolist()
+
+        # Tiếp tục từ vị trí hiện tại nếu gần hơn mục index
+        if start_block <= next_block <= first:
+            start_block, previous_dc = next_block, next_dc
+        else:
+            reader.seek(bit_offset)
+
+        # Giải mã cả các block đứng trước vùng (từ mục index) vào mảng tạm, chỉ giữ phần trong vùng
+        decoded = np.zeros((stop - start_block, 64), dtype=np.int32)
+        next_dc = _decode_interleaved_into(reader, dc_tables, ac_tables, _coefficient_view(decoded),
+                                           components[start_block:stop], 0, previous_dc)
+        region[(row - row_start) * row_blocks:(row - row_start + 1) * row_blocks] = decoded[first - start_block:]
+        next_block = stop
+
+    return deinterleave_mcus(region, (row_stop - row_start, col_stop - col_start), subsampling)
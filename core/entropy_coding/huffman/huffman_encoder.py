@@ -1,10 +1,18 @@
 import numpy as np
 from collections import Counter
 from core.entropy_coding.huffman.node import Node
+from core.entropy_coding.huffman.bitstream import BitWriter, pack_bits, pack_segments, join_restart_segments
+from core.entropy_coding.huffman.canonical import MAX_CODE_LENGTH, build_canonical_codes
+from core.entropy_coding.huffman.standard_tables import standard_codes
+from core.entropy_coding.symbols import extract_symbols, count_symbol_frequencies, symbol_sizes
 import heapq
 import json
 
 def build_frequency_table(data):
+    # Dạng CSR: đếm bằng np.bincount, cùng kết quả với vòng lặp bên dưới
+    if isinstance(data, dict):
+        return count_symbol_frequencies(data)
+
     dc_freq = Counter()
     for dc, _ in data:
         dc_size = int(dc).bit_length() if dc != 0 else 0
@@ -92,18 +100,70 @@ def build_huffman_codes(root):
     traverse(root, '')
     return codes
 
+def code_pairs(codes):
+    """
+    Chuẩn hóa bảng mã về dạng {symbol: (code, length)} với code là số nguyên.
+    
+    Parameters:
+    -----------
+    codes : dict
+        Dict với value là chuỗi bit ('0', '1') hoặc cặp (code, length)
+    
+    Returns:
+    --------
+    dict
+        Dict với key là symbol và value là (code, length)
+    """
+    return {
+        symbol: (int(code, 2), len(code)) if isinstance(code, str) else (int(code[0]), int(code[1]))
+        for symbol, code in codes.items()
+    }
+
+def code_strings(codes):
+    """
+    Chuẩn hóa bảng mã về dạng {symbol: chuỗi bit}, ngược với code_pairs.
+    """
+    return {
+        symbol: code if isinstance(code, str) else format(int(code[0]), f"0{int(code[1])}b")
+        for symbol, code in codes.items()
+    }
+
+def tables_per_channel(codes, num_channels):
+    """
+    Trả về list bảng mã, mỗi kênh một bảng.
+    
+    Parameters:
+    -----------
+    codes : dict or list
+        Một bảng mã dùng chung, hoặc list bảng mã theo từng kênh
+    num_channels : int
+        Số kênh
+    
+    Returns:
+    --------
+    list
+        List `num_channels` bảng mã
+    """
+    if isinstance(codes, dict):
+        return [codes] * num_channels
+    if len(codes) != num_channels:
+        raise ValueError("Số bảng mã phải bằng số kênh")
+    return list(codes)
+
 def huffman_encode(data, dc_codes, ac_codes):
     """
     Mã hóa dữ liệu sử dụng mã Huffman riêng cho DC và AC.
     
     Parameters:
     -----------
-    data : list
-        List [channel][block] = (dc, ac) hoặc [block] = (dc, ac)
-    dc_codes : dict
-        Bảng mã Huffman cho DC coefficients
-    ac_codes : dict
-        Bảng mã Huffman cho AC coefficients
+    data : list or dict
+        List [channel][block] = (dc, ac) hoặc [block] = (dc, ac), hoặc dạng CSR
+        (extract_symbols / rle_to_csr), khi đó mã hóa bằng huffman_encode_symbols
+    dc_codes : dict or list
+        Bảng mã Huffman cho DC coefficients (chuỗi bit hoặc cặp (code, length)),
+        hoặc list bảng mã theo từng kênh
+    ac_codes : dict or list
+        Bảng mã Huffman cho AC coefficients, hoặc list bảng mã theo từng kênh
     
     Returns:
     --------
@@ -111,66 +171,351 @@ def huffman_encode(data, dc_codes, ac_codes):
         (encoded_bytes, total_bits): Dữ liệu mã hóa dạng bytes và số bit
     """
 
-    def safe_bit_length(x):
-        return int(x).bit_length() if x != 0 else 0
-
-    def encode_magnitude(value, size):
-        if value >= 0:
-            return bin(value)[2:].zfill(size)
-        else:
-            max_val = (1 << size) - 1
-            inverted = max_val - abs(value)
-            return bin(inverted)[2:].zfill(size)
-
+    if isinstance(data, dict):
+        return huffman_encode_symbols(data, dc_codes, ac_codes)
     if not data or not dc_codes or not ac_codes:
         raise ValueError("Dữ liệu và bảng mã phải không rỗng")
 
-    bits = []
     is_color = isinstance(data[0], (list, tuple)) and isinstance(data[0][0], tuple)
+    channels = data if is_color else [data]
+    dc_tables = tables_per_channel(dc_codes, len(channels))
+    ac_tables = tables_per_channel(ac_codes, len(channels))
+
+    num_blocks = sum(len(channel) for channel in channels)
+    writer = BitWriter(capacity=num_blocks * 8)
+    write = writer.write
 
-    if is_color:  # ảnh màu
-        for channel in data:
-            for dc, ac in channel:
-                dc_size = safe_bit_length(dc)
-                bits.append(dc_codes[dc_size])
-                if dc_size > 0:
-                    bits.append(encode_magnitude(dc, dc_size))
-
-                for run, value in ac:
-                    size = safe_bit_length(value)
-                    key = (run, size)
-                    bits.append(ac_codes[key])
-                    if size > 0:
-                        bits.append(encode_magnitude(value, size))
-
-                if not ac or ac[-1] != (0, 0):
-                    bits.append(ac_codes[(0, 0)])
-    else:  # ảnh xám
-        for dc, ac in data:
-            dc_size = safe_bit_length(dc)
-            bits.append(dc_codes[dc_size])
-            if dc_size > 0:
-                bits.append(encode_magnitude(dc, dc_size))
+    for channel, dc_codes, ac_codes in zip(channels, dc_tables, ac_tables):
+        dc_table = code_pairs(dc_codes)
+        ac_table = code_pairs(ac_codes)
+        eob_code, eob_len = ac_table[(0, 0)]
+        for dc, ac in channel:
+            # Mã Huffman và magnitude được ghép thành một lần ghi
+            dc = int(dc)
+            dc_size = abs(dc).bit_length()
+            code, length = dc_table[dc_size]
+            if dc < 0:
+                dc += (1 << dc_size) - 1
+            write((code << dc_size) | dc, length + dc_size)
 
             for run, value in ac:
-                size = safe_bit_length(value)
-                key = (run, size)
-                bits.append(ac_codes[key])
-                if size > 0:
-                    bits.append(encode_magnitude(value, size))
+                value = int(value)
+                size = abs(value).bit_length()
+                code, length = ac_table[(run, size)]
+                if value < 0:
+                    value += (1 << size) - 1
+                write((code << size) | value, length + size)
 
             if not ac or ac[-1] != (0, 0):
-                bits.append(ac_codes[(0, 0)])
+                write(eob_code, eob_len)
+
+    return writer.getvalue(), writer.total_bits
+
+def restart_segments(num_channels, blocks_per_channel, restart_interval):
+    """
+    Chia dòng block thành các đoạn restart: mỗi kênh được chia thành các đoạn `restart_interval` block.
+    
+    Returns:
+    --------
+    list
+        List (channel, first_block, num_blocks) theo thứ tự trong dòng bit;
+        first_block là chỉ số block toàn cục (theo thứ tự kênh)
+    """
+    if restart_interval <= 0:
+        raise ValueError("restart_interval phải dương")
+    return [
+        (ch, ch * blocks_per_channel + start, min(restart_interval, blocks_per_channel - start))
+        for ch in range(num_channels)
+        for start in range(0, blocks_per_channel, restart_interval)
+    ]
+
+def _restart_starts(symbols, num_blocks, num_channels):
+    """Chỉ số block đầu của từng đoạn restart; dòng xen kẽ MCU được chia như một kênh duy nhất."""
+    if 'components' in symbols:
+        num_channels = 1
+    segments = restart_segments(num_channels, num_blocks // num_channels, symbols['restart_interval'])
+    return [first for _, first, _ in segments]
+
+def symbol_channels(symbols):
+    """
+    Số kênh (bảng mã) của dạng CSR: 3 với ảnh màu hoặc dòng xen kẽ MCU, 1 với ảnh xám.
+    """
+    if 'components' in symbols or len(symbols['shape']) == 3:
+        return 3
+    return 1
+
+def _code_lookup(codes, num_symbols, to_index):
+    code_values = np.zeros(num_symbols, dtype=np.int64)
+    code_lengths = np.zeros(num_symbols, dtype=np.int64)
+    for symbol, (code, length) in code_pairs(codes).items():
+        if length > MAX_CODE_LENGTH:
+            raise ValueError("Mã Huffman phải dài tối đa 16 bit (dùng build_canonical_codes)")
+        code_values[to_index(symbol)] = code
+        code_lengths[to_index(symbol)] = length
+    return code_values, code_lengths
+
+def _magnitude_bits(values, sizes):
+    values = values.astype(np.int64)
+    return np.where(values < 0, values + (1 << sizes.astype(np.int64)) - 1, values)
+
+def _symbol_emissions(symbols, dc_codes, ac_codes, with_values=True):
+    """
+    Tính (giá trị, số bit) của từng lần ghi (DC, từng AC, EOB bổ sung) theo thứ tự dòng bit.
+    
+    Returns:
+    --------
+    tuple
+        (values, lengths, emission_ptr, num_channels): lần ghi của block i nằm trong
+        [emission_ptr[i], emission_ptr[i + 1]); values là None nếu with_values=False
+    """
+    if not dc_codes or not ac_codes:
+        raise ValueError("Dữ liệu và bảng mã phải không rỗng")
+
+    dc_size, size = symbol_sizes(symbols)
+    dc_size = dc_size.astype(np.int64)
+    size = size.astype(np.int64)
+    if np.any(dc_size > 15) or np.any(size > 15):
+        raise ValueError("Nhóm độ lớn phải nhỏ hơn 16")
+    ac_ids = (symbols['run'].astype(np.int64) << 4) | size
+
+    block_ptr = symbols['block_ptr']
+    run = symbols['run']
+    value = symbols['value']
+    num_blocks = len(dc_size)
+    counts = np.diff(block_ptr)
+
+    # Bảng tra theo (kênh, symbol); block của kênh c nằm liên tiếp theo thứ tự kênh,
+    # trừ dòng xen kẽ MCU (thành phần của từng block nằm trong 'components')
+    components = symbols.get('components')
+    num_channels = symbol_channels(symbols)
+    dc_luts = [_code_lookup(codes, 16, int) for codes in tables_per_channel(dc_codes, num_channels)]
+    ac_luts = [_code_lookup(codes, 256, lambda s: (s[0] << 4) | s[1])
+               for codes in tables_per_channel(ac_codes, num_channels)]
+    dc_code = np.stack([lut[0] for lut in dc_luts])
+    dc_len = np.stack([lut[1] for lut in dc_luts])
+    ac_code = np.stack([lut[0] for lut in ac_luts])
+    ac_len = np.stack([lut[1] for lut in ac_luts])
+
+    if components is not None:
+        block_channel = components.astype(np.int64)
+    else:
+        block_channel = np.repeat(np.arange(num_channels), num_blocks // num_channels)
+    entry_channel = np.repeat(block_channel, counts)
+    if np.any(dc_len[block_channel, dc_size] == 0) or np.any(ac_len[entry_channel, ac_ids] == 0):
+        raise ValueError("Bảng mã không chứa đủ symbol cần mã hóa")
+
+    # Khối không kết thúc bằng (0, 0) được thêm EOB như huffman_encode
+    last = np.maximum(block_ptr[1:] - 1, 0)
+    ends_with_eob = (counts > 0) & (run[last] == 0) & (value[last] == 0) if len(run) else np.zeros(num_blocks, dtype=bool)
+    needs_eob = ~ends_with_eob
+
+    emission_ptr = np.zeros(num_blocks + 1, dtype=np.int64)
+    np.cumsum(1 + counts + needs_eob, out=emission_ptr[1:])
+    values = np.empty(int(emission_ptr[-1]), dtype=np.int64) if with_values else None
+    lengths = np.empty(int(emission_ptr[-1]), dtype=np.int64)
+
+    dc_pos = emission_ptr[:-1]
+    entry_block = np.repeat(np.arange(num_blocks), counts)
+    ac_pos = emission_ptr[entry_block] + 1 + np.arange(len(run)) - block_ptr[entry_block]
+    eob_pos = emission_ptr[1:][needs_eob] - 1
+
+    lengths[dc_pos] = dc_len[block_channel, dc_size] + dc_size
+    lengths[ac_pos] = ac_len[entry_channel, ac_ids] + size
+    lengths[eob_pos] = ac_len[block_channel[needs_eob], 0]
+
+    if with_values:
+        # Mã và magnitude ghép thành một giá trị: code << size | magnitude
+        values[dc_pos] = (dc_code[block_channel, dc_size] << dc_size) | _magnitude_bits(symbols['dc_diff'], dc_size)
+        values[ac_pos] = (ac_code[entry_channel, ac_ids] << size) | _magnitude_bits(value, size)
+        values[eob_pos] = ac_code[block_channel[needs_eob], 0]
+
+    return values, lengths, emission_ptr, num_channels
 
-    bitstring = ''.join(bits)
+def huffman_encode_symbols(symbols, dc_codes, ac_codes):
+    """
+    Mã hóa Huffman trực tiếp từ mảng symbol (extract_symbols), vector hóa hoàn toàn.
+    Kết quả giống huffman_encode trên danh sách RLE tương ứng.
+    Nếu symbols có restart_interval > 0, mỗi đoạn restart được căn byte, nối bằng marker RST
+    và byte 0xFF được nhồi thành 0xFF00 (xem join_restart_segments).
+    
+    Parameters:
+    -----------
+    symbols : dict
+        Dạng CSR (extract_symbols, rle_to_csr hoặc load_rle_csr)
+    dc_codes : dict or list
+        Bảng mã DC (độ dài mã tối đa 16 bit), hoặc list bảng mã theo từng kênh
+    ac_codes : dict or list
+        Bảng mã AC (độ dài mã tối đa 16 bit), hoặc list bảng mã theo từng kênh
+    
+    Returns:
+    --------
+    tuple
+        (encoded_bytes, total_bits)
+    """
+    values, lengths, emission_ptr, num_channels = _symbol_emissions(symbols, dc_codes, ac_codes)
+
+    if symbols.get('restart_interval', 0) > 0:
+        starts = _restart_starts(symbols, len(emission_ptr) - 1, num_channels)
+        segment_ptr = np.append(emission_ptr[starts], emission_ptr[-1])
+        encoded = join_restart_segments(pack_segments(values, lengths, segment_ptr))
+        return encoded, len(encoded) * 8
+
+    return pack_bits(values, lengths)
+
+def encoded_bit_length(symbols, dc_codes, ac_codes):
+    """
+    Số bit dòng mã hóa của huffman_encode_symbols, tính từ nhóm độ lớn và độ dài mã, không ghi bit nào.
+    Với restart_interval > 0 có tính bit đệm căn byte và marker RST, nhưng không tính byte nhồi
+    0xFF00 (phụ thuộc giá trị bit) nên là cận dưới của total_bits thực.
+
+    Returns:
+    --------
+    int
+        Tổng số bit (không tính bit đệm cuối khi không có restart)
+    """
+    _, lengths, emission_ptr, num_channels = _symbol_emissions(symbols, dc_codes, ac_codes, with_values=False)
+
+    if symbols.get('restart_interval', 0) > 0:
+        starts = _restart_starts(symbols, len(emission_ptr) - 1, num_channels)
+        segment_bits = np.add.reduceat(lengths, emission_ptr[starts])
+        return int(((segment_bits + 7) // 8).sum() * 8 + 16 * (len(starts) - 1))
+
+    return int(lengths.sum())
+
+def block_bit_lengths(symbols, dc_codes, ac_codes):
+    """
+    Số bit mã hóa của từng block (mã Huffman + magnitude + EOB), không ghi bit nào.
+    
+    Returns:
+    --------
+    ndarray
+        Mảng (N,) int64 theo thứ tự block trong dòng bit
+    """
+    _, lengths, emission_ptr, _ = _symbol_emissions(symbols, dc_codes, ac_codes, with_values=False)
+    return np.add.reduceat(lengths, emission_ptr[:-1])
+
+def build_block_index(symbols, dc_codes, ac_codes, interval):
+    """
+    Xây index phụ cho giải mã truy cập ngẫu nhiên: mỗi `interval` block của mỗi kênh
+    ghi lại vị trí bit bắt đầu block và giá trị predictor DC trước block đó.
+    Với dòng xen kẽ MCU (có 'components'), mỗi mục ghi predictor DC của cả ba thành phần.
+    Chỉ áp dụng cho dòng bit không có restart marker.
+    
+    Parameters:
+    -----------
+    symbols : dict
+        Kết quả từ extract_symbols (restart_interval = 0)
+    dc_codes, ac_codes : dict or list
+        Bảng mã dùng để mã hóa
+    interval : int
+        Số block giữa hai mục index (ví dụ số block trên một hàng; bội của blocks_per_mcu
+        với dòng xen kẽ MCU)
+    
+    Returns:
+    --------
+    ndarray
+        Mảng (K, 3) int64, mỗi hàng là (block, bit_offset, previous_dc); với dòng xen kẽ MCU
+        là (K, 5): (block, bit_offset, previous_dc của Y, Cb, Cr)
+    """
+    if interval <= 0:
+        raise ValueError("interval phải dương")
+    if symbols.get('restart_interval', 0) > 0:
+        raise ValueError("Index chỉ hỗ trợ dòng bit không có restart marker")
+
+    bit_lengths = block_bit_lengths(symbols, dc_codes, ac_codes)
+    num_blocks = len(bit_lengths)
+    offsets = np.zeros(num_blocks, dtype=np.int64)
+    np.cumsum(bit_lengths[:-1], out=offsets[1:])
+
+    if 'components' in symbols:
+        # Predictor của thành phần c trước block = DC tuyệt đối của block thành phần c gần nhất trước đó
+        blocks = np.arange(0, num_blocks, interval)
+        previous_dc = []
+        for component in range(3):
+            idx = np.flatnonzero(symbols['components'] == component)
+            dc = np.concatenate(([0], np.cumsum(symbols['dc_diff'][idx].astype(np.int64))))
+            previous_dc.append(dc[np.searchsorted(idx, blocks)])
+        return np.stack([blocks, offsets[blocks]] + previous_dc, axis=1)
+
+    num_channels = symbols['shape'][0] if len(symbols['shape']) == 3 else 1
+    blocks_per_channel = num_blocks // num_channels
+
+    # Predictor trước block = DC tuyệt đối của block trước trong cùng kênh (0 ở đầu kênh)
+    dc = np.cumsum(symbols['dc_diff'].astype(np.int64).reshape(num_channels, -1), axis=1)
+    previous_dc = np.zeros_like(dc)
+    previous_dc[:, 1:] = dc[:, :-1]
+
+    blocks = (np.arange(num_channels)[:, None] * blocks_per_channel
+              + np.arange(0, blocks_per_channel, interval)[None, :]).reshape(-1)
+    return np.stack([blocks, offsets[blocks], previous_dc.reshape(-1)[blocks]], axis=1)
+
+def _select_codes(symbols, table_mode):
+    if table_mode == 'standard':
+        # Bảng chuẩn tính sẵn: không cần lượt đếm tần suất
+        return standard_codes(symbol_channels(symbols))
+    dc_freq, ac_freq = count_symbol_frequencies(symbols)
+    # Mã canonical giới hạn 16 bit: dạng (code, length)
+    dc_codes, _, _ = build_canonical_codes(dc_freq)
+    ac_codes, _, _ = build_canonical_codes(ac_freq)
+    return dc_codes, ac_codes
+
+def estimate_encoded_bits(quant_blocks, table_mode='optimized', restart_interval=0, components=None):
+    """
+    Số bit encode_quantized_blocks sẽ tạo ra cho cùng khối lượng tử và cùng bảng mã, tính
+    bằng encoded_bit_length (chạy khô, không ghép bit). Dùng cho quét chất lượng và điều khiển
+    kích thước.
+
+    Returns:
+    --------
+    int
+        total_bits (chính xác khi restart_interval = 0, xem encoded_bit_length)
+    """
+    if table_mode not in ('optimized', 'standard'):
+        raise ValueError("table_mode phải là 'optimized' hoặc 'standard'")
+
+    symbols = extract_symbols(quant_blocks, restart_interval, components)
+    dc_codes, ac_codes = _select_codes(symbols, table_mode)
+    return encoded_bit_length(symbols, dc_codes, ac_codes)
+
+def encode_quantized_blocks(quant_blocks, table_mode='optimized', restart_interval=0, components=None):
+    """
+    Mã hóa entropy thẳng từ khối lượng tử (kết quả optimize_quantization_for_speed) ra bytes.
+    Run được suy ra hàng loạt từ vị trí các hệ số khác 0 (extract_symbols), không tạo tuple
+    (run, value) cho từng hệ số; danh sách RLE chỉ cần khi hiển thị trung gian.
+
+    Parameters:
+    -----------
+    quant_blocks : ndarray
+        Khối lượng tử 4D (h, w, 8, 8) hoặc 5D (c, h, w, 8, 8), dtype số nguyên
+    table_mode : str, optional
+        'optimized' (bảng canonical theo tần suất của ảnh) hoặc 'standard' (bảng Annex K), default='optimized'
+    restart_interval : int, optional
+        Số block giữa hai marker RST (0 = không dùng; với components tính theo block của dòng), default=0
+    components : ndarray, optional
+        Thành phần của từng block khi quant_blocks là dòng xen kẽ MCU (xem interleave_mcus)
+
+    Returns:
+    --------
+    dict
+        {
+            'encoded_data': bytes,
+            'total_bits': int,
+            'dc_codes': dict hoặc list theo kênh {size: (code, length)},
+            'ac_codes': dict hoặc list theo kênh {(run, size): (code, length)},
+            'symbols': dict, kết quả extract_symbols (dùng lại cho build_block_index)
+        }
+    """
+    if table_mode not in ('optimized', 'standard'):
+        raise ValueError("table_mode phải là 'optimized' hoặc 'standard'")
 
-    # Chuyển bitstring thành bytes
-    byte_array = []
-    for i in range(0, len(bitstring), 8):
-        byte_str = bitstring[i:i+8]
-        if len(byte_str) < 8:
-            byte_str += '0' * (8 - len(byte_str))
-        byte_array.append(int(byte_str, 2))
+    symbols = extract_symbols(quant_blocks, restart_interval, components)
+    dc_codes, ac_codes = _select_codes(symbols, table_mode)
 
-    return bytes(byte_array), len(bitstring)
-    
\ No newline at end of file
+    encoded_data, total_bits = huffman_encode_symbols(symbols, dc_codes, ac_codes)
+    return {
+        'encoded_data': encoded_data,
+        'total_bits': total_bits,
+        'dc_codes': dc_codes,
+        'ac_codes': ac_codes,
+        'symbols': symbols,
+    }
@@ -0,0 +1,83 @@
+import numpy as np
+from core.color_processing.subsampling import SUBSAMPLING_FACTORS
+
+def blocks_per_mcu(subsampling):
+    """
+    Số block trong một MCU của dòng xen kẽ: v * h block Y, một block Cb và một block Cr.
+    """
+    if subsampling not in SUBSAMPLING_FACTORS:
+        raise ValueError("Kiểu lấy mẫu phụ phải là '4:4:4', '4:2:2', hoặc '4:2:0'")
+    v, h = SUBSAMPLING_FACTORS[subsampling]
+    return v * h + 2
+
+def mcu_components(subsampling, num_mcus):
+    """
+    Thành phần (0 = Y, 1 = Cb, 2 = Cr) của từng block theo thứ tự dòng bit xen kẽ MCU.
+
+    Returns:
+    --------
+    ndarray
+        (num_mcus * (v * h + 2),) uint8, mỗi MCU gồm v * h block Y rồi một block Cb, một block Cr
+    """
+    if subsampling not in SUBSAMPLING_FACTORS:
+        raise ValueError("Kiểu lấy mẫu phụ phải là '4:4:4', '4:2:2', hoặc '4:2:0'")
+    v, h = SUBSAMPLING_FACTORS[subsampling]
+    return np.tile(np.array([0] * (v * h) + [1, 2], dtype=np.uint8), num_mcus)
+
+def interleave_mcus(component_blocks, subsampling):
+    """
+    Xếp khối của ba thành phần theo thứ tự MCU (JPEG A.2.3): các MCU theo hàng, trong mỗi MCU
+    là v x h block Y (theo hàng) rồi block Cb và block Cr cùng vị trí.
+
+    Parameters:
+    -----------
+    component_blocks : list
+        [Y (mh * v, mw * h, 8, 8), Cb (mh, mw, 8, 8), Cr (mh, mw, 8, 8)]
+    subsampling : str
+        '4:4:4', '4:2:2' hoặc '4:2:0'
+
+    Returns:
+    --------
+    tuple
+        (stream, components): stream (1, N, 8, 8) dùng như một ảnh xám một hàng block,
+        components (N,) uint8 xem mcu_components
+    """
+    if subsampling not in SUBSAMPLING_FACTORS:
+        raise ValueError("Kiểu lấy mẫu phụ phải là '4:4:4', '4:2:2', hoặc '4:2:0'")
+    y, cb, cr = component_blocks
+    v, h = SUBSAMPLING_FACTORS[subsampling]
+    mcu_rows, mcu_cols = cb.shape[:2]
+    if cr.shape != cb.shape or y.shape[:2] != (mcu_rows * v, mcu_cols * h):
+        raise ValueError("Số block của Y, Cb, Cr không khớp với kiểu lấy mẫu phụ")
+
+    y_mcu = y.reshape(mcu_rows, v, mcu_cols, h, 8, 8).transpose(0, 2, 1, 3, 4, 5).reshape(mcu_rows, mcu_cols, v * h, 8, 8)
+    stream = np.concatenate((y_mcu, cb[:, :, None], cr[:, :, None]), axis=2)
+    return stream.reshape(1, -1, 8, 8), mcu_components(subsampling, mcu_rows * mcu_cols)
+
+def deinterleave_mcus(stream, mcu_grid, subsampling):
+    """
+    Ngược với interleave_mcus: tách dòng block MCU thành khối của từng thành phần.
+
+    Parameters:
+    -----------
+    stream : ndarray
+        (N, 8, 8), (N, 64) hoặc (1, N, 8, 8) theo thứ tự MCU
+    mcu_grid : tuple
+        (mcu_rows, mcu_cols)
+
+    Returns:
+    --------
+    list
+        [Y (mcu_rows * v, mcu_cols * h, 8, 8), Cb (mcu_rows, mcu_cols, 8, 8), Cr (mcu_rows, mcu_cols, 8, 8)]
+    """
+    if subsampling not in SUBSAMPLING_FACTORS:
+        raise ValueError("Kiểu lấy mẫu phụ phải là '4:4:4', '4:2:2', hoặc '4:2:0'")
+    v, h = SUBSAMPLING_FACTORS[subsampling]
+    mcu_rows, mcu_cols = mcu_grid
+    blocks = stream.reshape(mcu_rows, mcu_cols, v * h + 2, 8, 8)
+    y = blocks[:, :, :v * h].reshape(mcu_rows, mcu_cols, v, h, 8, 8).transpose(0, 2, 1, 3, 4, 5)
+    return [
+        y.reshape(mcu_rows * v, mcu_cols * h, 8, 8),
+        np.ascontiguousarray(blocks[:, :, v * h]),
+        np.ascontiguousarray(blocks[:, :, v * h + 1]),
+    ]
@@ -0,0 +1,265 @@
+import numpy as np
+from collections import Counter
+from core.entropy_coding.zigzag_rle import zigzag_scan_blocks
+
+def magnitude_category(values):
+    """
+    Tính nhóm độ lớn (số bit của |value|) cho cả mảng, tương đương int(value).bit_length().
+
+    Parameters:
+    -----------
+    values : ndarray
+        Mảng số nguyên
+
+    Returns:
+    --------
+    ndarray
+        Mảng uint8 cùng shape, 0 với giá trị 0
+    """
+    # frexp trả về số mũ e sao cho |v| = m * 2**e, m thuộc [0.5, 1) => e = bit_length
+    return np.frexp(np.abs(values).astype(np.float64))[1].astype(np.uint8)
+
+def extract_symbols(quant_blocks, restart_interval=0, components=None):
+    """
+    Tính toàn bộ symbol entropy (DC difference, cặp (run, size) của AC) bằng NumPy, không lặp Python.
+    Thứ tự và nội dung giống hệt apply_zigzag_and_rle: DC difference reset về 0 ở đầu mỗi kênh,
+    ZRL (15, 0) trước các run >= 16, EOB (0, 0) chỉ khi khối kết thúc bằng số 0.
+
+    Kết quả là dạng RLE kiểu CSR: AC của mọi block nằm liên tiếp trong các mảng song song
+    `run`/`value`, chỉ số bắt đầu của từng block nằm trong `block_ptr`. `dc_size`/`size` là nhóm
+    độ lớn tính sẵn, có thể thiếu (xem symbol_sizes).
+
+    Parameters:
+    -----------
+    quant_blocks : ndarray
+        Khối đã lượng tử hóa, 4D (h, w, 8, 8) hoặc 5D (c, h, w, 8, 8), dtype số nguyên
+    restart_interval : int, optional
+        Nếu > 0, predictor DC còn reset sau mỗi `restart_interval` block của mỗi kênh, default=0.
+        Với dòng xen kẽ MCU, tính theo block của dòng (bội của blocks_per_mcu)
+    components : ndarray, optional
+        Với dòng block xen kẽ MCU (interleave_mcus, quant_blocks dạng (1, N, 8, 8)): thành phần của
+        từng block; predictor DC tính riêng theo từng thành phần và được lưu trong key 'components'
+
+    Returns:
+    --------
+    dict
+        {
+            'shape': tuple, shape khối (h, w) hoặc (c, h, w),
+            'restart_interval': int,
+            'dc_diff': ndarray (N,) int32, DC difference theo thứ tự block,
+            'dc_size': ndarray (N,) uint8,
+            'block_ptr': ndarray (N + 1,) int64, AC của block i nằm trong [block_ptr[i], block_ptr[i + 1]),
+            'run': ndarray (M,) uint8,
+            'value': ndarray (M,) int16,
+            'size': ndarray (M,) uint8
+        }
+
+    Raises:
+    -------
+    ValueError
+        Nếu shape hoặc dtype không hợp lệ
+    """
+    if quant_blocks.ndim not in (4, 5) or quant_blocks.shape[-2:] != (8, 8):
+        raise ValueError("quant_blocks phải là mảng 4D (h,w,8,8) hoặc 5D (c,h,w,8,8)")
+    if not np.issubdtype(quant_blocks.dtype, np.integer):
+        raise ValueError("quant_blocks phải có dtype số nguyên")
+    if restart_interval < 0:
+        raise ValueError("restart_interval phải không âm")
+    if components is not None and (quant_blocks.ndim != 4 or len(components) != quant_blocks[..., 0, 0].size):
+        raise ValueError("components phải có một phần tử cho mỗi block của dòng (1, N, 8, 8)")
+
+    shape = quant_blocks.shape[:-2]
+    num_channels = shape[0] if quant_blocks.ndim == 5 else 1
+    zigzagged = zigzag_scan_blocks(quant_blocks).astype(np.int32, copy=False)
+    num_blocks = zigzagged.shape[0]
+
+    # DC difference, predictor reset ở đầu mỗi kênh
+    dc = zigzagged[:, 0].reshape(num_channels, -1)
+    dc_diff = np.diff(dc, axis=1, prepend=0)
+    if restart_interval > 0:
+        dc_diff[:, ::restart_interval] = dc[:, ::restart_interval]
+    dc_diff = dc_diff.reshape(-1).astype(np.int32)
+    if components is not None:
+        # Mỗi thành phần có predictor DC riêng trong dòng xen kẽ, reset ở block đầu tiên
+        # của thành phần đó trong mỗi đoạn restart
+        components = np.asarray(components, dtype=np.uint8)
+        segment = np.arange(num_blocks) // restart_interval if restart_interval > 0 else np.zeros(num_blocks, dtype=np.int64)
+        for component in np.unique(components):
+            idx = np.flatnonzero(components == component)
+            component_dc = dc[0, idx]
+            diff = np.diff(component_dc, prepend=0)
+            first = np.ones(len(idx), dtype=bool)
+            first[1:] = segment[idx[1:]] != segment[idx[:-1]]
+            diff[first] = component_dc[first]
+            dc_diff[idx] = diff
+
+    # AC: vị trí khác 0 theo thứ tự (block, vị trí zigzag)
+    block_idx, col = np.nonzero(zigzagged[:, 1:])
+    positions = col + 1
+    nz_values = zigzagged[block_idx, positions]
+
+    first_in_block = np.ones(len(block_idx), dtype=bool)
+    first_in_block[1:] = block_idx[1:] != block_idx[:-1]
+    last_in_block = np.ones(len(block_idx), dtype=bool)
+    last_in_block[:-1] = first_in_block[1:]
+
+    previous = np.zeros_like(positions)
+    previous[1:] = positions[:-1]
+    previous[first_in_block] = 0
+    runs = positions - previous - 1
+    zrl_count = runs >> 4
+
+    last_position = np.zeros(num_blocks, dtype=np.int64)
+    last_position[block_idx[last_in_block]] = positions[last_in_block]
+    has_eob = last_position < 63
+
+    # Mỗi giá trị khác 0 chiếm zrl_count ZRL + 1 entry, cộng EOB nếu có
+    entries_per_nz = zrl_count + 1
+    nz_entries = np.bincount(block_idx, weights=entries_per_nz, minlength=num_blocks).astype(np.int64)
+    block_ptr = np.zeros(num_blocks + 1, dtype=np.int64)
+    np.cumsum(nz_entries + has_eob, out=block_ptr[1:])
+    nz_before = np.zeros(num_blocks + 1, dtype=np.int64)
+    np.cumsum(nz_entries, out=nz_before[1:])
+
+    if len(nz_values) and np.abs(nz_values).max() > np.iinfo(np.int16).max:
+        raise ValueError("Hệ số AC vượt quá phạm vi int16")
+    total_entries = int(block_ptr[-1])
+    run = np.full(total_entries, 15, dtype=np.uint8)   # mặc định là ZRL (15, 0)
+    value = np.zeros(total_entries, dtype=np.int16)
+
+    entry_pos = block_ptr[block_idx] + np.cumsum(entries_per_nz) - nz_before[block_idx] - 1
+    run[entry_pos] = runs & 15
+    value[entry_pos] = nz_values
+    run[block_ptr[1:][has_eob] - 1] = 0
+
+    symbols = {
+        'shape': shape,
+        'restart_interval': restart_interval,
+        'dc_diff': dc_diff,
+        'dc_size': magnitude_category(dc_diff),
+        'block_ptr': block_ptr,
+        'run': run,
+        'value': value,
+        'size': magnitude_category(value),
+    }
+    if components is not None:
+        symbols['components'] = components
+    return symbols
+
+def symbol_sizes(symbols):
+    """
+    Trả về (dc_size, size) của dạng CSR, tính lại bằng magnitude_category nếu không có sẵn.
+    """
+    dc_size = symbols.get('dc_size')
+    if dc_size is None:
+        dc_size = magnitude_category(symbols['dc_diff'])
+    size = symbols.get('size')
+    if size is None:
+        size = magnitude_category(symbols['value'])
+    return dc_size, size
+
+def rle_to_csr(rle_data, shape=None, restart_interval=0):
+    """
+    Chuyển danh sách RLE cũ ([block] hoặc [channel][block] = (dc_diff, [(run, value), ...]))
+    sang dạng CSR của extract_symbols. Các cặp AC (kể cả ZRL, EOB) được giữ nguyên thứ tự.
+
+    Parameters:
+    -----------
+    rle_data : list
+        Kết quả apply_zigzag_and_rle
+    shape : tuple, optional
+        Shape khối (h, w) hoặc (c, h, w); mặc định (1, N) hoặc (c, 1, N)
+    restart_interval : int, optional
+        Restart interval đã dùng khi tính DC difference, default=0
+
+    Returns:
+    --------
+    dict
+        Cùng key với extract_symbols
+    """
+    is_color = bool(rle_data) and isinstance(rle_data[0], list)
+    channels = rle_data if is_color else [rle_data]
+    blocks = [block for channel in channels for block in channel]
+    if shape is None:
+        shape = (len(channels), 1, len(channels[0])) if is_color else (1, len(blocks))
+    if int(np.prod(shape)) != len(blocks) or len(shape) != (3 if is_color else 2):
+        raise ValueError("shape không khớp với số block của rle_data")
+
+    counts = np.fromiter((len(ac) for _, ac in blocks), dtype=np.int64, count=len(blocks))
+    block_ptr = np.zeros(len(blocks) + 1, dtype=np.int64)
+    np.cumsum(counts, out=block_ptr[1:])
+    total_entries = int(block_ptr[-1])
+    run = np.fromiter((r for _, ac in blocks for r, _ in ac), dtype=np.uint8, count=total_entries)
+    value = np.fromiter((v for _, ac in blocks for _, v in ac), dtype=np.int64, count=total_entries)
+    if len(value) and np.abs(value).max() > np.iinfo(np.int16).max:
+        raise ValueError("Hệ số AC vượt quá phạm vi int16")
+    value = value.astype(np.int16)
+    dc_diff = np.fromiter((dc for dc, _ in blocks), dtype=np.int32, count=len(blocks))
+
+    return {
+        'shape': tuple(shape),
+        'restart_interval': restart_interval,
+        'dc_diff': dc_diff,
+        'dc_size': magnitude_category(dc_diff),
+        'block_ptr': block_ptr,
+        'run': run,
+        'value': value,
+        'size': magnitude_category(value),
+    }
+
+def csr_block(symbols, index):
+    """
+    Trả về block thứ `index` của dạng CSR ở dạng cũ (dc_diff, [(run, value), ...]).
+    """
+    start, stop = int(symbols['block_ptr'][index]), int(symbols['block_ptr'][index + 1])
+    return int(symbols['dc_diff'][index]), list(zip(symbols['run'][start:stop].tolist(),
+                                                    symbols['value'][start:stop].tolist()))
+
+def csr_to_rle(symbols):
+    """
+    Chuyển dạng CSR về danh sách RLE cũ: [block] với ảnh xám, [channel][block] với ảnh màu.
+    """
+    shape = symbols['shape']
+    num_blocks = len(symbols['dc_diff'])
+    if len(shape) == 3:
+        blocks_per_channel = num_blocks // shape[0]
+        return [[csr_block(symbols, i) for i in range(ch * blocks_per_channel, (ch + 1) * blocks_per_channel)]
+                for ch in range(shape[0])]
+    return [csr_block(symbols, i) for i in range(num_blocks)]
+
+def _counter_in_first_occurrence_order(ids, to_symbol):
+    if len(ids) == 0:
+        return Counter()
+    counts = np.bincount(ids)
+    unique_ids, first_index = np.unique(ids, return_index=True)
+    ordered = unique_ids[np.argsort(first_index, kind='stable')]
+    return Counter({to_symbol(int(i)): int(counts[i]) for i in ordered})
+
+def count_symbol_frequencies(symbols):
+    """
+    Đếm tần suất symbol bằng np.bincount trên id đã đóng gói.
+    Kết quả giống build_frequency_table (kể cả thứ tự key), gồm cả EOB và ZRL.
+
+    Parameters:
+    -----------
+    symbols : dict
+        Dạng CSR (extract_symbols, rle_to_csr hoặc load_rle_csr)
+
+    Returns:
+    --------
+    tuple
+        (dc_freq, ac_freq): Counter với key là size (DC) và (run, size) (AC)
+    """
+    dc_size, size = symbol_sizes(symbols)
+    if np.any(size > 15) or np.any(dc_size > 15):
+        raise ValueError("Nhóm độ lớn phải nhỏ hơn 16")
+
+    dc_freq = _counter_in_first_occurrence_order(dc_size.astype(np.int64), lambda i: i)
+    ac_ids = (symbols['run'].astype(np.int64) << 4) | size
+    ac_freq = _counter_in_first_occurrence_order(ac_ids, lambda i: (i >> 4, i & 15))
+
+    # Thêm EOB và ZRL
+    ac_freq[(0, 0)] += 1
+    ac_freq[(15, 0)] += 1
+
+    return dc_freq, ac_freq
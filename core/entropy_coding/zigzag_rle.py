@@ -1,19 +1,43 @@
 import numpy as np
 
+# Thứ tự quét zigzag: vị trí thứ k trong vector là phần tử ZIGZAG_INDICES[k] của khối 8x8 đã làm phẳng
+ZIGZAG_INDICES = np.array([
+    0, 1, 8, 16, 9, 2, 3, 10, 17, 24, 32, 25, 18, 11, 4, 5,
+    12, 19, 26, 33, 40, 48, 41, 34, 27, 20, 13, 6, 7, 14, 21, 28,
+    35, 42, 49, 56, 57, 50, 43, 36, 29, 22, 15, 23, 30, 37, 44, 51,
+    58, 59, 52, 45, 38, 31, 39, 46, 53, 60, 61, 54, 47, 55, 62, 63
+])
+
+# Hoán vị nghịch: phần tử thứ i của khối đã làm phẳng nằm ở vị trí INVERSE_ZIGZAG_INDICES[i] trong vector
+INVERSE_ZIGZAG_INDICES = np.argsort(ZIGZAG_INDICES)
+
 def zigzag_scan(block):
     if block.shape != (8, 8):
         raise ValueError("Khối phải có shape (8, 8)")
     if block.dtype != np.int32:
         raise ValueError("Khối phải có dtype int32")
 
-    zigzag_indices = np.array([
-        0, 1, 8, 16, 9, 2, 3, 10, 17, 24, 32, 25, 18, 11, 4, 5,
-        12, 19, 26, 33, 40, 48, 41, 34, 27, 20, 13, 6, 7, 14, 21, 28,
-        35, 42, 49, 56, 57, 50, 43, 36, 29, 22, 15, 23, 30, 37, 44, 51,
-        58, 59, 52, 45, 38, 31, 39, 46, 53, 60, 61, 54, 47, 55, 62, 63
-    ])
+    return block.reshape(64)[ZIGZAG_INDICES]
+
+def zigzag_scan_blocks(blocks):
+    """
+    Quét zigzag toàn bộ khối của ảnh trong một lần gather với chỉ số tính sẵn.
 
-    return block.flatten()[zigzag_indices].astype(np.int32)
+    Parameters:
+    -----------
+    blocks : ndarray
+        Khối 4D (h, w, 8, 8) hoặc 5D (c, h, w, 8, 8)
+
+    Returns:
+    --------
+    ndarray
+        Mảng (N, 64) C-contiguous theo thứ tự quét, N = số block (theo thứ tự kênh, hàng, cột),
+        cùng dtype với blocks
+    """
+    if blocks.ndim not in (4, 5) or blocks.shape[-2:] != (8, 8):
+        raise ValueError("blocks phải là mảng 4D (h,w,8,8) hoặc 5D (c,h,w,8,8)")
+    # take theo trục 1 giữ kết quả C-contiguous (chỉ số mảng [:, idx] trả về thứ tự Fortran)
+    return blocks.reshape(-1, 64).take(ZIGZAG_INDICES, axis=1)
 
 def run_length_encode(array):
     if array.shape != (64,) or array.dtype != np.int32:
@@ -44,67 +68,131 @@ def apply_zigzag_and_rle(blocks):
     if blocks.dtype != np.int32:
         raise ValueError("blocks phải có dtype int32")
 
+    zigzagged = zigzag_scan_blocks(blocks)
+    num_channels = blocks.shape[0] if blocks.ndim == 5 else 1
+    blocks_per_channel = zigzagged.shape[0] // num_channels
+
     result = []
     dc_original = []
-    if blocks.ndim == 4:
-        h, w = blocks.shape[:2]
+    for ch in range(num_channels):
+        channel_result = []
+        channel_dc_original = []
         previous_dc = 0
-        for i in range(h):
-            for j in range(w):
-                zigzagged = zigzag_scan(blocks[i, j])
-                dc, ac = run_length_encode(zigzagged)
-                dc_diff = dc - previous_dc
-                previous_dc = dc
-                result.append((dc_diff, ac))
-                dc_original.append(dc)
-    else:
-        c, h, w = blocks.shape[:3]
-        for ch in range(c):
-            channel_result = []
-            channel_dc_original = []
-            previous_dc = 0
-            for i in range(h):
-                for j in range(w):
-                    zigzagged = zigzag_scan(blocks[ch, i, j])
-                    dc, ac = run_length_encode(zigzagged)
-                    dc_diff = dc - previous_dc
-                    previous_dc = dc
-                    channel_result.append((dc_diff, ac))
-                    channel_dc_original.append(dc)
-            result.append(channel_result)
-            dc_original.append(channel_dc_original)
+        for vector in zigzagged[ch * blocks_per_channel:(ch + 1) * blocks_per_channel]:
+            dc, ac = run_length_encode(vector)
+            dc_diff = dc - previous_dc
+            previous_dc = dc
+            channel_result.append((dc_diff, ac))
+            channel_dc_original.append(dc)
+        result.append(channel_result)
+        dc_original.append(channel_dc_original)
+
+    if blocks.ndim == 4:
+        return result[0], dc_original[0]
     return result, dc_original
 
-def apply_inverse_zigzag_and_rle(rle_blocks, image_shape):
+def absolute_dc(dc_diff, num_channels, restart_interval=0):
+    """
+    Cộng dồn DC difference về DC tuyệt đối, predictor reset ở đầu mỗi kênh
+    và sau mỗi `restart_interval` block nếu > 0.
+
+    Returns:
+    --------
+    ndarray
+        Mảng (N,) int32 cùng thứ tự với dc_diff
+    """
+    dc = np.asarray(dc_diff, dtype=np.int64).reshape(num_channels, -1)
+    if restart_interval > 0:
+        blocks_per_channel = dc.shape[1]
+        pad = (-blocks_per_channel) % restart_interval
+        segments = np.pad(dc, ((0, 0), (0, pad))).reshape(num_channels, -1, restart_interval)
+        dc = np.cumsum(segments, axis=2).reshape(num_channels, -1)[:, :blocks_per_channel]
+    else:
+        dc = np.cumsum(dc, axis=1)
+    return dc.reshape(-1).astype(np.int32)
+
+def inverse_zigzag_blocks(vectors, block_shape):
+    """
+    Đảo quét zigzag cho toàn bộ vector trong một lần gather với hoán vị nghịch tính sẵn.
+
+    Parameters:
+    -----------
+    vectors : ndarray
+        Mảng (N, 64) theo thứ tự quét zigzag
+    block_shape : tuple
+        (h, w) hoặc (c, h, w) số block, tích bằng N
+
+    Returns:
+    --------
+    ndarray
+        Khối (h, w, 8, 8) hoặc (c, h, w, 8, 8), cùng dtype với vectors
+    """
+    if vectors.ndim != 2 or vectors.shape[1] != 64:
+        raise ValueError("vectors phải có shape (N, 64)")
+    if int(np.prod(block_shape)) != vectors.shape[0]:
+        raise ValueError("block_shape không khớp với số vector")
+    return vectors[:, INVERSE_ZIGZAG_INDICES].reshape(tuple(block_shape) + (8, 8))
+
+def _block_grid(image_shape):
     if len(image_shape) == 2:
         h, w = image_shape
-        block_h, block_w = h // 8, w // 8
-        if len(rle_blocks) != block_h * block_w:
-            raise ValueError("Số lượng rle_blocks không khớp với image_shape")
-
-        blocks = np.zeros((block_h, block_w, 8, 8), dtype=np.int32)
-        for idx, rle in enumerate(rle_blocks):
-            i, j = divmod(idx, block_w)
-            flat = rle_to_array(rle)
-            blocks[i, j] = inverse_zigzag(flat)
-        return blocks
-
-    elif len(image_shape) == 3:
+        return (h // 8, w // 8)
+    if len(image_shape) == 3:
         c, h, w = image_shape
-        block_h, block_w = h // 8, w // 8
-        if len(rle_blocks) != c or any(len(channel) != block_h * block_w for channel in rle_blocks):
-            raise ValueError("Số lượng rle_blocks không khớp với image_shape")
+        return (c, h // 8, w // 8)
+    raise ValueError("image_shape phải có dạng (h, w) hoặc (c, h, w)")
+
+def _scatter_rle(dc, block_ptr, run, value, block_shape):
+    """
+    Dựng lại khối từ mảng RLE phẳng không cần vòng lặp theo block: vị trí zigzag của mỗi cặp
+    là tổng cộng dồn (run + 1) trong block, ghi một lần rồi đảo zigzag bằng hoán vị nghịch.
+    """
+    num_blocks = len(dc)
+    counts = np.diff(block_ptr)
+    entry_block = np.repeat(np.arange(num_blocks), counts)
+
+    # Cộng dồn toàn cục rồi trừ phần của các block trước
+    steps = np.zeros(len(run) + 1, dtype=np.int64)
+    np.cumsum(np.asarray(run, dtype=np.int64) + 1, out=steps[1:])
+    positions = steps[1:] - steps[block_ptr[:-1]][entry_block]
+
+    # ZRL/EOB có value 0; cặp vượt quá vị trí 63 bị bỏ như rle_to_array
+    keep = (positions < 64) & (np.asarray(value) != 0)
+    vectors = np.zeros((num_blocks, 64), dtype=np.int32)
+    vectors[:, 0] = dc
+    vectors[entry_block[keep], positions[keep]] = value[keep]
+    return inverse_zigzag_blocks(vectors, block_shape)
 
-        blocks = np.zeros((c, block_h, block_w, 8, 8), dtype=np.int32)
-        for ch in range(c):
-            for idx, rle in enumerate(rle_blocks[ch]):
-                i, j = divmod(idx, block_w)
-                flat = rle_to_array(rle)
-                blocks[ch, i, j] = inverse_zigzag(flat)
-        return blocks
-
-    else:
-        raise ValueError("image_shape phải có dạng (h, w) hoặc (c, h, w)")
+def apply_inverse_zigzag_and_rle(rle_blocks, image_shape):
+    block_shape = _block_grid(image_shape)
+    num_blocks = int(np.prod(block_shape))
+
+    # Dạng CSR (dict): DC lưu dạng difference, được cộng dồn lại
+    if isinstance(rle_blocks, dict):
+        block_ptr = rle_blocks['block_ptr']
+        if len(rle_blocks['dc_diff']) != num_blocks or len(block_ptr) != num_blocks + 1:
+            raise ValueError("Số lượng block của dạng CSR không khớp với image_shape")
+        num_channels = block_shape[0] if len(block_shape) == 3 else 1
+        dc = absolute_dc(rle_blocks['dc_diff'], num_channels, rle_blocks.get('restart_interval', 0))
+        return _scatter_rle(dc, block_ptr, rle_blocks['run'], rle_blocks['value'], block_shape)
+
+    # Danh sách cũ (DC tuyệt đối từ bộ giải mã): làm phẳng một lượt rồi dùng chung phép scatter
+    if len(image_shape) == 3:
+        c = block_shape[0]
+        if len(rle_blocks) != c or any(len(channel) != num_blocks // c for channel in rle_blocks):
+            raise ValueError("Số lượng rle_blocks không khớp với image_shape")
+        rle_blocks = [block for channel in rle_blocks for block in channel]
+    elif len(rle_blocks) != num_blocks:
+        raise ValueError("Số lượng rle_blocks không khớp với image_shape")
+
+    counts = np.fromiter((len(ac) for _, ac in rle_blocks), dtype=np.int64, count=num_blocks)
+    block_ptr = np.zeros(num_blocks + 1, dtype=np.int64)
+    np.cumsum(counts, out=block_ptr[1:])
+    total_entries = int(block_ptr[-1])
+    run = np.fromiter((r for _, ac in rle_blocks for r, _ in ac), dtype=np.int64, count=total_entries)
+    value = np.fromiter((v for _, ac in rle_blocks for _, v in ac), dtype=np.int32, count=total_entries)
+    dc = np.fromiter((dc for dc, _ in rle_blocks), dtype=np.int32, count=num_blocks)
+    return _scatter_rle(dc, block_ptr, run, value, block_shape)
 
 def rle_to_array(rle_data):
     dc, ac = rle_data
@@ -123,13 +211,6 @@ def inverse_zigzag(array):
     if array.shape != (64,) or array.dtype != np.int32:
         raise ValueError("Mảng phải có shape (64,) và dtype int32")
 
-    zigzag_indices = np.array([
-        0, 1, 8, 16, 9, 2, 3, 10, 17, 24, 32, 25, 18, 11, 4, 5,
-        12, 19, 26, 33, 40, 48, 41, 34, 27, 20, 13, 6, 7, 14, 21, 28,
-        35, 42, 49, 56, 57, 50, 43, 36, 29, 22, 15, 23, 30, 37, 44, 51,
-        58, 59, 52, 45, 38, 31, 39, 46, 53, 60, 61, 54, 47, 55, 62, 63
-    ])
-
     block = np.zeros(64, dtype=np.int32)
-    block[zigzag_indices] = array
+    block[ZIGZAG_INDICES] = array
     return block.reshape(8, 8)
@@ -48,9 +48,10 @@ def adjust_quant_tables(quality):
     _quant_table_cache[quality] = (y_quant, c_quant)
     return y_quant, c_quant
 
-def optimize_dequantization_for_speed(quant_blocks, quality=50):
+def optimize_dequantization_for_speed(quant_blocks, quality=50, component=0):
     """
     Giải lượng tử hóa toàn bộ khối lượng tử, hỗ trợ ảnh xám (4D) và ảnh màu (5D), dùng vector hóa.
+    Khối 4D dùng y_quant nếu component = 0, c_quant nếu khác 0 (một mặt phẳng Cb/Cr lấy mẫu phụ).
     """
     if quant_blocks.ndim not in (4, 5) or quant_blocks.shape[-2:] != (8, 8):
         raise ValueError("quant_blocks phải là mảng 4D (h,w,8,8) hoặc 5D (c,h,w,8,8)")
@@ -60,7 +61,7 @@ def optimize_dequantization_for_speed(quant_blocks, quality=50):
     y_quant, c_quant = adjust_quant_tables(quality)
 
     if quant_blocks.ndim == 4:
-        return (quant_blocks * y_quant).astype(np.float32)
+        return (quant_blocks * (y_quant if component == 0 else c_quant)).astype(np.float32)
 
     # Ảnh màu
     c = quant_blocks.shape[0]
@@ -71,3 +72,22 @@ def optimize_dequantization_for_speed(quant_blocks, quality=50):
         dct_blocks[ch] = (quant_blocks[ch] * q).astype(np.float32)
 
     return dct_blocks
+
+def dequantize_integer(quant_blocks, quality=50, component=0):
+    """
+    Giải lượng tử hóa bằng số nguyên: int16/int32 * bảng lượng tử -> int32, dùng với engine 'islow'.
+    Khối 4D dùng y_quant nếu component = 0, c_quant nếu khác 0.
+    """
+    if quant_blocks.ndim not in (4, 5) or quant_blocks.shape[-2:] != (8, 8):
+        raise ValueError("quant_blocks phải là mảng 4D (h,w,8,8) hoặc 5D (c,h,w,8,8)")
+    if not 1 <= quality <= 100:
+        raise ValueError("Hệ số chất lượng phải từ 1 đến 100")
+
+    y_quant, c_quant = adjust_quant_tables(quality)
+    y_quant = y_quant.astype(np.int32)
+    c_quant = c_quant.astype(np.int32)
+
+    if quant_blocks.ndim == 4:
+        return quant_blocks.astype(np.int32) * (y_quant if component == 0 else c_quant)
+    tables = np.stack([y_quant] + [c_quant] * (quant_blocks.shape[0] - 1))[:, None, None]
+    return quant_blocks.astype(np.int32) * tables
@@ -49,9 +49,10 @@ def adjust_quant_tables(quality):
     return y_quant, c_quant
 
 
-def optimize_quantization_for_speed(dct_blocks, quality=50):
+def optimize_quantization_for_speed(dct_blocks, quality=50, component=0):
     """
     Lượng tử hóa toàn bộ khối DCT, hỗ trợ ảnh xám (4D) và ảnh màu (5D), dùng vector hóa.
+    Khối 4D dùng y_quant nếu component = 0, c_quant nếu khác 0 (một mặt phẳng Cb/Cr lấy mẫu phụ).
     """
     if dct_blocks.ndim not in (4, 5) or dct_blocks.shape[-2:] != (8, 8):
         raise ValueError("dct_blocks phải là mảng 4D (h,w,8,8) hoặc 5D (c,h,w,8,8)")
@@ -64,8 +65,8 @@ def optimize_quantization_for_speed(dct_blocks, quality=50):
     dct_blocks = dct_blocks.astype(np.float32)
 
     if dct_blocks.ndim == 4:
-        # ảnh xám: toàn bộ khối dùng y_quant
-        quant = np.round(dct_blocks / y_quant).astype(np.int32)
+        # ảnh xám (hoặc một thành phần): toàn bộ khối dùng chung một bảng
+        quant = np.round(dct_blocks / (y_quant if component == 0 else c_quant)).astype(np.int32)
     else:
         # ảnh màu: mỗi channel dùng quant khác nhau
         c, h, w = dct_blocks.shape[:3]
@@ -78,3 +79,29 @@ def optimize_quantization_for_speed(dct_blocks, quality=50):
 
     return quant
 
+
+def quantize_integer(dct_blocks, quality=50, scale=8, component=0):
+    """
+    Lượng tử hóa bằng số nguyên kiểu libjpeg: hệ số DCT int32 (gấp `scale` lần, ví dụ từ engine
+    'islow') được chia cho bảng lượng tử * scale, làm tròn half-away-from-zero, kết quả int16.
+    Khối 4D dùng y_quant nếu component = 0, c_quant nếu khác 0.
+    """
+    if dct_blocks.ndim not in (4, 5) or dct_blocks.shape[-2:] != (8, 8):
+        raise ValueError("dct_blocks phải là mảng 4D (h,w,8,8) hoặc 5D (c,h,w,8,8)")
+    if not np.issubdtype(dct_blocks.dtype, np.integer):
+        raise ValueError("dct_blocks phải có dtype số nguyên")
+    if not 1 <= quality <= 100:
+        raise ValueError("Hệ số chất lượng phải từ 1 đến 100")
+
+    y_quant, c_quant = adjust_quant_tables(quality)
+    y_divisor = y_quant.astype(np.int32) * scale
+    c_divisor = c_quant.astype(np.int32) * scale
+
+    if dct_blocks.ndim == 4:
+        divisors = y_divisor if component == 0 else c_divisor
+    else:
+        divisors = np.stack([y_divisor] + [c_divisor] * (dct_blocks.shape[0] - 1))[:, None, None]
+
+    values = dct_blocks.astype(np.int32)
+    quant = (np.abs(values) + (divisors >> 1)) // divisors
+    return np.where(values < 0, -quant, quant).astype(np.int16)
@@ -2,18 +2,40 @@ import numpy as np
 import matplotlib.pyplot as plt
 import json
 import os
-from utils.image_io import save_image, save_npy, save_encoded_bytes_to_jpg
-from core.color_processing.color_transform import rgb_to_ycbcr, ycbcr_to_rgb
-from core.color_processing.subsampling import apply_chroma_subsampling
+from utils.image_io import save_image, save_npy, save_rle_csr, save_encoded_bytes_to_jpg
+from core.color_processing.subsampling import apply_chroma_subsampling, upsample_ycbcr_to_rgb, SUBSAMPLING_FACTORS, UPSAMPLING_METHODS
+from core.color_processing.color_transform import rgb_to_ycbcr, rgb_to_ycbcr_planar, ycbcr_planes_to_rgb
 from core.dct.block_processing import pad_image_to_multiple_of_8, split_into_blocks, merge_blocks
-from core.dct.dct import apply_dct_to_image, apply_idct_to_image
-from core.quantization.quantization import optimize_quantization_for_speed
-from core.quantization.dequantization import optimize_dequantization_for_speed
-from core.entropy_coding.zigzag_rle import apply_zigzag_and_rle, apply_inverse_zigzag_and_rle
-from core.entropy_coding.huffman.huffman_encoder import build_frequency_table, build_huffman_tree, build_huffman_codes, huffman_encode
-from core.entropy_coding.huffman.huffman_decoder import huffman_decode_bitstring
+from core.dct.dct import apply_dct_to_image, apply_idct_to_image, apply_scaled_idct_to_image, apply_fused_idct_to_image, apply_fused_dct_to_image, dct_engine_names, ISLOW_ENGINE, PRUNED_DENSE_ENGINES, SCALED_BLOCK_SIZES
+from core.quantization.quantization import optimize_quantization_for_speed, quantize_integer
+from core.quantization.dequantization import optimize_dequantization_for_speed, dequantize_integer
+from core.entropy_coding.zigzag_rle import apply_inverse_zigzag_and_rle
+from core.entropy_coding.symbols import extract_symbols
+from core.entropy_coding.huffman.huffman_encoder import encode_quantized_blocks, build_block_index, estimate_encoded_bits
+from core.entropy_coding.mcu import interleave_mcus, blocks_per_mcu
+from core.entropy_coding.huffman.huffman_decoder import huffman_decode_bitstring, huffman_decode_to_blocks, huffman_decode_region, huffman_decode_mcus, huffman_decode_mcu_region
+from core.entropy_coding.huffman.standard_tables import standard_codes
 from PIL import Image
 
+TABLE_MODES = ('optimized', 'standard')
+# Mức kiểm tra dữ liệu: mọi bước (mặc định), chỉ một lần ở đầu vào pipeline, hoặc không kiểm tra
+VALIDATION_LEVELS = ('full', 'boundary', 'none')
+
+def _check_pixels(image):
+    """Kiểm tra ảnh đầu vào một lượt ở biên pipeline: NaN/Inf (ảnh số thực) và khoảng [0, 255]."""
+    if image.dtype == np.uint8:
+        return
+    if not np.issubdtype(image.dtype, np.integer) and not np.issubdtype(image.dtype, np.floating):
+        raise ValueError("Ảnh phải có dtype là số (int hoặc float)")
+    if np.issubdtype(image.dtype, np.floating) and not np.isfinite(image).all():
+        raise ValueError("Ảnh không được chứa NaN hoặc Inf")
+    if image.max() > 255 or image.min() < 0:
+        raise ValueError("Giá trị pixel phải nằm trong [0, 255]")
+
+def _luma(blocks):
+    """Khối dùng cho file trung gian: thành phần Y nếu là list khối theo thành phần."""
+    return blocks[0] if isinstance(blocks, list) else blocks
+
 class JPEGProcessor:
     """
     Lớp xử lý pipeline nén và giải nén JPEG, hỗ trợ visualization cho Streamlit.
@@ -22,13 +44,99 @@ class JPEGProcessor:
     -----------
     quality : int
         Hệ số chất lượng (1-100)
+    table_mode : str
+        Bảng Huffman: 'optimized' (xây theo tần suất của từng ảnh, 2 lượt)
+        hoặc 'standard' (bảng chuẩn Annex K, 1 lượt, không đếm tần suất)
+    restart_interval : int
+        Số block giữa hai marker RST (0 = không dùng); predictor DC reset tại mỗi marker.
+        Với ảnh lấy mẫu phụ tính theo MCU, như DRI của JPEG
+    workers : int
+        Số process giải mã song song các đoạn restart khi decode
+    index_interval : int or str
+        Nếu khác 0, encode tạo index phụ (vị trí bit + predictor DC) mỗi `index_interval` block
+        (MCU với ảnh lấy mẫu phụ), hoặc mỗi hàng block (hàng MCU) nếu là 'row'; dùng cho decode_region
+    dct_engine : str
+        Engine DCT/IDCT trong DCT_ENGINES: 'einsum' (mặc định), 'gemm' (một phép nhân
+        ma trận 64x64 qua BLAS), 'scipy' (scipy.fft.dctn), 'aan' (butterfly AAN) hoặc 'islow'
+        (số nguyên kiểu libjpeg: khối int16, tích lũy int32, hệ số lượng tử int16, kết quả
+        giống hệt nhau trên mọi máy)
+    pruned_idct : bool
+        Nếu True, IDCT nhóm khối theo vị trí EOB zigzag và chỉ nhân các hệ số tới EOB (khối chỉ có
+        DC tô hằng số). Chỉ dùng với 'einsum' hoặc 'aan': 'gemm'/'scipy' vốn là một phép nhân dày,
+        gom nhóm không nhanh hơn
+    fused_idct : bool
+        Nếu True, giải lượng tử hóa và IDCT gộp thành một lượt (cơ sở IDCT nhân sẵn bảng lượng tử,
+        hệ số số nguyên ra thẳng pixel uint8); dùng cho decode_region và decode_pipeline khi
+        save_intermediates=False, scale=1. Không dùng với 'islow' hoặc pruned_idct
+    fused_dct : bool
+        Nếu True, encode gộp DCT và lượng tử hóa thành một lượt (cơ sở DCT chia sẵn bảng lượng tử,
+        ra thẳng hệ số int16) khi save_intermediates=False; không dùng với 'islow'
+    subsampling : str
+        Lấy mẫu phụ Cb/Cr của ảnh màu: '4:4:4' (mặc định, không lấy mẫu phụ), '4:2:2' hoặc '4:2:0'.
+        Khác '4:4:4' thì Cb/Cr được mã hóa ở độ phân giải giảm, các block xen kẽ theo MCU
+        (ảnh pad tới bội của kích thước MCU). Khi đó các file trung gian dạng khối chỉ chứa thành phần Y
+    chroma_upsampling : str
+        Cách nội suy Cb/Cr khi decode ảnh lấy mẫu phụ, gộp với chuyển sang RGB trong một kernel:
+        'replicate' (mặc định, lặp mẫu) hoặc 'fancy' (nội suy tam giác 3/4-1/4 như libjpeg, mịn hơn
+        ở biên màu)
+    validation : str
+        Mức kiểm tra dữ liệu: 'full' (mặc định, mọi bước tự quét NaN/Inf và khoảng giá trị),
+        'boundary' (chỉ kiểm tra ảnh một lượt ở đầu encode, các bước bên trong tin dữ liệu đã hợp lệ)
+        hoặc 'none' (chỉ kiểm tra shape, dùng khi nguồn ảnh đã đảm bảo)
+    save_intermediates : bool
+        Nếu True, lưu RLE dạng CSR cho các trang visualization và decode đi qua danh sách RLE trung gian;
+        nếu False, decode ghi thẳng hệ số vào mảng khối (nhanh hơn, ít bộ nhớ hơn)
     intermediates : dict
         Lưu kết quả trung gian của các bước
     """
-    def __init__(self, quality=50):
+    def __init__(self, quality=50, table_mode='optimized', restart_interval=0, workers=1, index_interval=0,
+                 save_intermediates=True, dct_engine='einsum', pruned_idct=False, fused_idct=False,
+                 fused_dct=False, subsampling='4:4:4', chroma_upsampling='replicate',
+                 validation='full'):
         if not 1 <= quality <= 100:
             raise ValueError("Hệ số chất lượng phải từ 1 đến 100")
+        if table_mode not in TABLE_MODES:
+            raise ValueError("table_mode phải là 'optimized' hoặc 'standard'")
+        if restart_interval < 0:
+            raise ValueError("restart_interval phải không âm")
+        if workers < 1:
+            raise ValueError("workers phải >= 1")
+        if index_interval != 'row' and (not isinstance(index_interval, int) or index_interval < 0):
+            raise ValueError("index_interval phải là số nguyên không âm hoặc 'row'")
+        if index_interval and restart_interval:
+            raise ValueError("index_interval không dùng chung với restart_interval")
+        if dct_engine not in dct_engine_names():
+            raise ValueError(f"dct_engine phải là một trong {dct_engine_names()}")
+        if pruned_idct and (dct_engine == ISLOW_ENGINE or dct_engine in PRUNED_DENSE_ENGINES):
+            raise ValueError(f"pruned_idct không dùng với engine 'islow' hoặc {PRUNED_DENSE_ENGINES}")
+        if fused_idct and (pruned_idct or dct_engine == ISLOW_ENGINE):
+            raise ValueError("fused_idct không dùng với engine 'islow' hoặc pruned_idct")
+        if fused_dct and dct_engine == ISLOW_ENGINE:
+            raise ValueError("fused_dct không dùng với engine 'islow'")
+        if subsampling not in SUBSAMPLING_FACTORS:
+            raise ValueError("Kiểu lấy mẫu phụ phải là '4:4:4', '4:2:2', hoặc '4:2:0'")
+        if chroma_upsampling not in UPSAMPLING_METHODS:
+            raise ValueError("chroma_upsampling phải là 'replicate' hoặc 'fancy'")
+        if validation not in VALIDATION_LEVELS:
+            raise ValueError("validation phải là 'full', 'boundary' hoặc 'none'")
         self.quality = quality
+        self.table_mode = table_mode
+        self.restart_interval = restart_interval
+        self.workers = workers
+        self.index_interval = index_interval
+        self.save_intermediates = save_intermediates
+        self.dct_engine = dct_engine
+        self.pruned_idct = pruned_idct
+        self.fused_idct = fused_idct
+        self.fused_dct = fused_dct
+        self.subsampling = subsampling
+        self.chroma_upsampling = chroma_upsampling
+        self.validation = validation
+
+    @property
+    def _stage_checks(self):
+        """Các hàm của từng bước có tự quét dữ liệu không (chỉ với validation='full')."""
+        return self.validation == 'full'
 
     def encode_pipeline(self, image):
         """
@@ -44,83 +152,265 @@ class JPEGProcessor:
         dict
             {
                 'encoded_data': bytes,
-                'dc_codes': dict,
-                'ac_codes': dict,
+                'dc_codes': dict {size: (code, length)} (list theo kênh nếu 'standard' và ảnh màu),
+                'ac_codes': dict {(run, size): (code, length)} (list theo kênh nếu 'standard' và ảnh màu),
+                'table_mode': str,
+                'restart_interval': int,
+                'block_index': ndarray (K, 3) ((K, 5) với ảnh lấy mẫu phụ) hoặc None,
                 'shape': tuple,
                 'total_bits': int,
                 'intermediates': dict
             }
         """
-        
+        blocks = self._prepare_blocks(image)
+
+        if self.fused_dct and not self.save_intermediates:
+            # Bước 3+4: DCT và lượng tử hóa một lượt, ra thẳng hệ số int16
+            print(" Start DCT + Quantization")
+            if isinstance(blocks, list):
+                quant_blocks = [apply_fused_dct_to_image(plane, self.quality, component=c, validate=self._stage_checks)
+                                for c, plane in enumerate(blocks)]
+            else:
+                quant_blocks = apply_fused_dct_to_image(blocks, self.quality, validate=self._stage_checks)
+            print(" Done DCT + Quantization")
+        else:
+            # Bước 3: DCT
+            print(" Start DCT")
+            dct_blocks = self._forward_dct(blocks)
+            print(" Done DCT")
+            save_npy(_luma(dct_blocks), "encode_step_dct.npy")
+
+            # Bước 4: Lượng tử hóa
+            print(" Start Quantization")
+            quant_blocks = self._quantize(dct_blocks, self.quality)
+            print(" Done Quantization")
+
+        return self._entropy_encode(quant_blocks)
+
+    def encode_to_target(self, image, target_bytes=None, target_bpp=None):
+        """
+        Nén ảnh theo ngân sách kích thước: chọn quality cao nhất có dòng mã hóa không vượt
+        `target_bytes` (hoặc `target_bpp` bit trên mỗi pixel của ảnh gốc).
+        DCT chỉ chạy một lần; quality được tìm nhị phân, mỗi bước chỉ lượng tử hóa và tính kích thước
+        bằng chạy khô (estimate_encoded_bits, không ghép bit). Chỉ quality được chọn tạo dòng bit thật.
+        Nếu cả quality 1 cũng vượt ngân sách, dùng quality 1.
+
+        self.quality được cập nhật thành quality đã chọn để decode_pipeline dùng đúng bảng lượng tử.
+
+        Parameters:
+        -----------
+        image : ndarray
+            Ảnh đầu vào: (h, w) hoặc (h, w, 3), giá trị [0, 255]
+        target_bytes : int, optional
+            Số byte tối đa của encoded_data
+        target_bpp : float, optional
+            Số bit trên mỗi pixel tối đa (chỉ truyền một trong hai)
+
+        Returns:
+        --------
+        dict
+            Như encode_pipeline, thêm 'quality': int là quality đã chọn
+        """
+        if (target_bytes is None) == (target_bpp is None):
+            raise ValueError("Cần truyền đúng một trong target_bytes hoặc target_bpp")
+        if target_bpp is not None:
+            if target_bpp <= 0:
+                raise ValueError("target_bpp phải dương")
+            target_bytes = int(target_bpp * image.shape[0] * image.shape[1] / 8)
+        if target_bytes <= 0:
+            raise ValueError("target_bytes phải dương")
+
+        blocks = self._prepare_blocks(image)
+        print(" Start DCT")
+        dct_blocks = self._forward_dct(blocks)
+        print(" Done DCT")
+
+        def search(budget, high):
+            # Kích thước tăng theo quality: tìm quality lớn nhất trong [1, high] có kích thước chạy khô
+            # không vượt `budget`; trả về (quality, khối lượng tử, số byte chạy khô hoặc None nếu chưa đo)
+            low, best, best_bytes = 1, None, None
+            while low < high:
+                middle = (low + high + 1) // 2
+                quant_blocks = self._quantize(dct_blocks, middle)
+                blocks, components, restart_interval = self._entropy_input(quant_blocks)
+                num_bytes = (estimate_encoded_bits(blocks, self.table_mode, restart_interval, components) + 7) // 8
+                if num_bytes <= budget:
+                    low, best, best_bytes = middle, quant_blocks, num_bytes
+                else:
+                    high = middle - 1
+            if best is None:
+                best = self._quantize(dct_blocks, low)
+            return low, best, best_bytes
+
+        # Kích thước chạy khô đã tính bit đệm và marker RST nhưng không tính byte nhồi 0xFF00: nếu
+        # dòng bit thật vượt ngân sách, trừ số byte nhồi đo được khỏi ngân sách chạy khô rồi tìm lại
+        # trong các quality thấp hơn (vẫn chạy khô), chỉ mã hóa thật quality được chọn ở mỗi vòng
+        budget, high = target_bytes, 100
+        while True:
+            self.quality, quant_blocks, estimated_bytes = search(budget, high)
+            result = self._entropy_encode(quant_blocks)
+            size = len(result['encoded_data'])
+            if size <= target_bytes or self.quality == 1:
+                break
+            stuffed = size - estimated_bytes if estimated_bytes is not None else size - target_bytes
+            budget = min(budget - 1, target_bytes - stuffed)
+            high = self.quality - 1
+        print(" Target bytes:", target_bytes, "-> quality", self.quality, "size", len(result['encoded_data']))
+        result['quality'] = self.quality
+        return result
+
+    def _forward_dct(self, blocks):
+        if isinstance(blocks, list):
+            return [apply_dct_to_image(plane, self.dct_engine, self._stage_checks) for plane in blocks]
+        return apply_dct_to_image(blocks, self.dct_engine, self._stage_checks)
+
+    def _quantize(self, dct_blocks, quality, component=0):
+        if isinstance(dct_blocks, list):
+            # Ảnh lấy mẫu phụ: mỗi thành phần một mặt phẳng khối, Y dùng y_quant, Cb/Cr dùng c_quant
+            return [self._quantize(plane, quality, c) for c, plane in enumerate(dct_blocks)]
+        if self.dct_engine == ISLOW_ENGINE:
+            return quantize_integer(dct_blocks, quality, component=component)
+        return optimize_quantization_for_speed(dct_blocks, quality, component)
+
+    def _entropy_input(self, quant_blocks):
+        """
+        (khối, components, restart_interval) cho bộ mã hóa entropy: ảnh lấy mẫu phụ được xếp thành
+        dòng xen kẽ MCU, restart_interval đổi từ số MCU sang số block của dòng.
+        """
+        if isinstance(quant_blocks, list):
+            stream, components = interleave_mcus(quant_blocks, self.subsampling)
+            return stream, components, self.restart_interval * blocks_per_mcu(self.subsampling)
+        return quant_blocks, None, self.restart_interval
+
+    def _dequantize(self, quant_blocks, component=0):
+        if isinstance(quant_blocks, list):
+            return [self._dequantize(plane, c) for c, plane in enumerate(quant_blocks)]
+        if self.dct_engine == ISLOW_ENGINE:
+            return dequantize_integer(quant_blocks, self.quality, component)
+        return optimize_dequantization_for_speed(quant_blocks, self.quality, component)
+
+    def _inverse_dct(self, dct_blocks, scale):
+        if isinstance(dct_blocks, list):
+            return [self._inverse_dct(plane, scale) for plane in dct_blocks]
+        if scale == 1:
+            return apply_idct_to_image(dct_blocks, self.dct_engine, self.pruned_idct)
+        return apply_scaled_idct_to_image(dct_blocks, scale)
+
+    def _fused_inverse(self, quant_blocks):
+        if isinstance(quant_blocks, list):
+            return [apply_fused_idct_to_image(plane, self.quality, component=c) for c, plane in enumerate(quant_blocks)]
+        return apply_fused_idct_to_image(quant_blocks, self.quality)
+
+    def _prepare_blocks(self, image):
+        """
+        Bước 1-2 của encode: kiểm tra, chuyển màu, padding và chia khối 8x8.
+        Ảnh màu với subsampling khác '4:4:4' trả về list khối [Y, Cb, Cr] (Cb/Cr đã lấy mẫu phụ).
+        """
         # Kiểm tra đầu vào
         if image.ndim not in (2, 3):
             raise ValueError("Ảnh phải là mảng 2D (xám) hoặc 3D (màu)")
-        if image.max() > 255 or image.min() < 0:
+        if self.validation == 'boundary':
+            _check_pixels(image)
+        elif self.validation == 'full' and (image.max() > 255 or image.min() < 0):
             raise ValueError("Giá trị pixel phải nằm trong [0, 255]")
+        checks = self._stage_checks
         save_image(image, "original.png")
         
         # Bước 1: Chuyển RGB sang YCbCr nếu là ảnh màu
+        block_dtype = np.int16 if self.dct_engine == ISLOW_ENGINE else np.float32
+        v, h = SUBSAMPLING_FACTORS[self.subsampling]
+        planar = False
         if image.ndim == 3:
             print(" Start RGB to YCbCr")
-            image = rgb_to_ycbcr(image)
-            save_image(image, "encode_step_ycbcr.png")
+            if image.dtype == np.uint8:
+                planar = True
+                # Số nguyên qua bảng tra, ghi thẳng mặt phẳng (3, H', W') đã pad theo MCU
+                height, width = image.shape[:2]
+                image = rgb_to_ycbcr_planar(image, (8 * v, 8 * h), block_dtype)
+                save_image(image[:, :height, :width].transpose(1, 2, 0), "encode_step_ycbcr.png")
+            else:
+                image = rgb_to_ycbcr(image, checks)
+                save_image(image, "encode_step_ycbcr.png")
         print(" Done RGB to YCbCr")
         
         # Bước 2: Padding ảnh và chia thành các khối 8x8
+        if image.ndim == 3 and self.subsampling != '4:4:4':
+            # Pad tới bội kích thước MCU rồi lấy mẫu phụ Cb/Cr, mỗi thành phần chia khối riêng
+            print(" Start padding image")
+            if planar:
+                image = image.transpose(1, 2, 0)
+            else:
+                image = pad_image_to_multiple_of_8(image, (8 * v, 8 * h), checks)
+            print(" Done padding image")
+            print(" Start split into blocks")
+            planes = apply_chroma_subsampling(image, self.subsampling, checks)
+            blocks = [split_into_blocks(plane, block_dtype, checks) for plane in planes]
+            print(" Done split into blocks")
+            save_npy(blocks[0], "encode_step_blocks.npy")
+            return blocks
+
+        if planar:
+            # Đã pad khi chuyển màu; split_into_blocks nhận thẳng layout (C, H, W)
+            print(" Start split into blocks")
+            blocks = split_into_blocks(image, block_dtype, checks)
+            print(" Done split into blocks")
+            save_npy(blocks, "encode_step_blocks.npy")
+            return blocks
+
         print(" Start padding image")
-        image = pad_image_to_multiple_of_8(image)
+        image = pad_image_to_multiple_of_8(image, validate=checks)
         print(" Done padding image")
         print(" Start split into blocks")
-        blocks = split_into_blocks(image)
+        blocks = split_into_blocks(image, block_dtype, checks)
         print(" Done split into blocks")
         save_npy(blocks, "encode_step_blocks.npy") 
-        if blocks.ndim == 4:
-            num_blocks = blocks.shape[0] * blocks.shape[1]  # ảnh xám
-        else:
-            num_blocks = blocks.shape[1] * blocks.shape[2]  # ảnh màu
+        return blocks
 
-        # Bước 3: DCT
-        print(" Start DCT")
-        dct_blocks = apply_dct_to_image(blocks)
-        print(" Done DCT")
-        save_npy(dct_blocks, "encode_step_dct.npy")
-        
-        # Bước 4: Lượng tử hóa
-        print(" Start Quantization")
-        quant_blocks = optimize_quantization_for_speed(dct_blocks, self.quality)
-        print(" Done Quantization")
-        save_npy(quant_blocks, "encode_step_quantized.npy")
-
-        # Bước 5: Zigzag và RLE
-        print(" Start Zigzag và RLE")
-        rle_data, dc_original = apply_zigzag_and_rle(quant_blocks)
-        print(" Done Zigzag và RLE")
-        save_npy(rle_data, "encode_step_rle.npy", allow_object=True)
-
-        # Bước 6: Huffman
+    def _entropy_encode(self, quant_blocks):
+        """
+        Bước 5-6 của encode: zigzag, RLE, Huffman và index phụ, trả về dict kết quả encode_pipeline.
+        """
+        save_npy(_luma(quant_blocks), "encode_step_quantized.npy")
+
+        # Bước 5+6: Zigzag, RLE và Huffman, mã hóa thẳng từ khối lượng tử
         print(" Start Huffman encode")
-        # Nếu ảnh màu:
-        if isinstance(rle_data[0], list):  # Ảnh màu
-            flat_rle = [item for channel in rle_data for item in channel]
+        blocks, components, restart_interval = self._entropy_input(quant_blocks)
+        entropy = encode_quantized_blocks(blocks, self.table_mode, restart_interval, components)
+        encoded_data, total_bits = entropy['encoded_data'], entropy['total_bits']
+        dc_codes, ac_codes = entropy['dc_codes'], entropy['ac_codes']
+        if self.save_intermediates:
+            # RLE dạng CSR (mảng, không pickle) cho trang visualization; ảnh lấy mẫu phụ chỉ lưu thành
+            # phần Y theo thứ tự raster như các file trung gian khác, không phải dòng xen kẽ MCU
+            symbols = extract_symbols(quant_blocks[0]) if components is not None else entropy['symbols']
+            save_rle_csr(symbols, "encode_step_rle.npz")
+        if isinstance(quant_blocks, list):
+            dc_original = [plane[..., 0, 0].reshape(-1).tolist() for plane in quant_blocks]
+        elif quant_blocks.ndim == 4:
+            dc_original = quant_blocks[..., 0, 0].reshape(-1).tolist()
         else:
-            flat_rle = rle_data  # Ảnh xám
-
-        dc_freq, ac_freq = build_frequency_table(flat_rle)
-        dc_tree = build_huffman_tree(dc_freq)
-        ac_tree = build_huffman_tree(ac_freq)
-        dc_codes = build_huffman_codes(dc_tree)
-        ac_codes = build_huffman_codes(ac_tree)
-        encoded_data, total_bits = huffman_encode(rle_data, dc_codes, ac_codes)
+            dc_original = quant_blocks[..., 0, 0].reshape(quant_blocks.shape[0], -1).tolist()
+        block_index = None
+        if self.index_interval:
+            if components is not None:
+                # Dòng xen kẽ MCU: mục index đặt ở đầu MCU, 'row' là một hàng MCU
+                mcus = quant_blocks[1].shape[1] if self.index_interval == 'row' else self.index_interval
+                interval = mcus * blocks_per_mcu(self.subsampling)
+            else:
+                interval = quant_blocks.shape[-3] if self.index_interval == 'row' else self.index_interval
+            block_index = build_block_index(entropy['symbols'], dc_codes, ac_codes, interval)
         save_encoded_bytes_to_jpg(encoded_data, "compressed_image.jpg")
         print(" Done Huffman encode")
 
         # Lưu shape
-        if blocks.ndim == 4:
+        if isinstance(quant_blocks, list):
+            # Ảnh màu lấy mẫu phụ: kích thước đã pad theo thành phần Y
+            padded_shape = (3, quant_blocks[0].shape[0] * 8, quant_blocks[0].shape[1] * 8)
+        elif quant_blocks.ndim == 4:
             # Ảnh xám
-            padded_shape = (blocks.shape[0] * 8, blocks.shape[1] * 8)
-        elif blocks.ndim == 5:
+            padded_shape = (quant_blocks.shape[0] * 8, quant_blocks.shape[1] * 8)
+        elif quant_blocks.ndim == 5:
             # Ảnh màu
-            padded_shape = (blocks.shape[0], blocks.shape[1] * 8, blocks.shape[2] * 8)
+            padded_shape = (quant_blocks.shape[0], quant_blocks.shape[1] * 8, quant_blocks.shape[2] * 8)
         
         return {
             'encoded_data': encoded_data,
@@ -128,10 +418,15 @@ class JPEGProcessor:
             'ac_codes': ac_codes,
             'padded_shape': padded_shape,
             'total_bits': total_bits,
+            'table_mode': self.table_mode,
+            'restart_interval': self.restart_interval,
+            'subsampling': self.subsampling if len(padded_shape) == 3 else '4:4:4',
+            'block_index': block_index,
             'encoded_dc_original': dc_original
         }
 
-    def decode_pipeline(self, encoded_data, dc_codes, ac_codes, padded_shape, total_bits, original_shape):
+    def decode_pipeline(self, encoded_data, dc_codes, ac_codes, padded_shape, total_bits, original_shape,
+                        table_mode='optimized', restart_interval=0, scale=1, subsampling='4:4:4'):
         """
         Pipeline giải nén JPEG, lưu kết quả trung gian.
         
@@ -145,6 +440,18 @@ class JPEGProcessor:
             Bảng mã Huffman cho AC
         shape : tuple
             Shape gốc: (h, w) hoặc (c, h, w)
+        table_mode : str, optional
+            'table_mode' trả về từ encode_pipeline; với 'standard' dùng bảng chuẩn,
+            bỏ qua dc_codes/ac_codes
+        restart_interval : int, optional
+            'restart_interval' trả về từ encode_pipeline; nếu > 0 các đoạn restart được
+            giải mã song song trên `workers` process
+        scale : float, optional
+            Tỉ lệ giải nén 1, 1/2, 1/4 hoặc 1/8 (ảnh xem trước): mỗi khối cho ra 8 * scale pixel
+            mỗi cạnh bằng IDCT thu nhỏ, ảnh kết quả có kích thước ceil(original_shape * scale)
+        subsampling : str, optional
+            'subsampling' trả về từ encode_pipeline; khác '4:4:4' thì dòng bit xen kẽ MCU được
+            giải mã theo từng thành phần và Cb/Cr được nội suy về kích thước Y
         
         Returns:
         --------
@@ -156,10 +463,19 @@ class JPEGProcessor:
         """
         
         # Kiểm tra đầu vào
+        if table_mode not in TABLE_MODES:
+            raise ValueError("table_mode phải là 'optimized' hoặc 'standard'")
+        if table_mode == 'standard':
+            dc_codes, ac_codes = standard_codes(3 if len(padded_shape) == 3 else 1)
         if not encoded_data or not dc_codes or not ac_codes:
             raise ValueError("Dữ liệu và bảng mã phải không rỗng")
         if len(padded_shape) not in (2, 3):
             raise ValueError("shape phải là (h, w) hoặc (c, h, w)")
+        if scale not in SCALED_BLOCK_SIZES:
+            raise ValueError("scale phải là 1, 1/2, 1/4 hoặc 1/8")
+        if subsampling not in SUBSAMPLING_FACTORS:
+            raise ValueError("Kiểu lấy mẫu phụ phải là '4:4:4', '4:2:2', hoặc '4:2:0'")
+        subsampled = len(padded_shape) == 3 and subsampling != '4:4:4'
         
         # Bước 1: Giải mã Huffman
         if len(padded_shape) == 2:
@@ -170,31 +486,146 @@ class JPEGProcessor:
             num_channels = 3
         else:
             raise ValueError("padded_shape không hợp lệ")
-        rle_data = huffman_decode_bitstring(encoded_data, dc_codes, ac_codes, total_bits, image_width, image_height, num_channels)
-        save_npy(rle_data, "decode_step_huffman_decode.npy", allow_object=True)
+        if subsampled:
+            # Bước 1+2: Dòng xen kẽ MCU -> list khối [Y, Cb, Cr]
+            quant_blocks = huffman_decode_mcus(encoded_data, dc_codes, ac_codes, total_bits, padded_shape, subsampling,
+                                               restart_interval=restart_interval, workers=self.workers,
+                                               dtype=np.int16 if self.dct_engine == ISLOW_ENGINE else np.int32)
+            if self.save_intermediates:
+                save_rle_csr(extract_symbols(quant_blocks[0]), "decode_step_huffman_decode.npz")
+            save_npy(quant_blocks[0], "decode_step_inverse_zigzag.npy")
+        elif self.save_intermediates:
+            rle_data = huffman_decode_bitstring(encoded_data, dc_codes, ac_codes, total_bits, image_width, image_height, num_channels,
+                                                restart_interval=restart_interval, workers=self.workers)
 
-        # Bước 2: Giải RLE và zigzag
-        quant_blocks = apply_inverse_zigzag_and_rle(rle_data, padded_shape)
-        save_npy(quant_blocks, "decode_step_inverse_zigzag.npy")
+            # Bước 2: Giải RLE và zigzag
+            quant_blocks = apply_inverse_zigzag_and_rle(rle_data, padded_shape)
+            # RLE dạng CSR (mảng, không pickle) cho trang visualization
+            save_rle_csr(extract_symbols(quant_blocks, restart_interval), "decode_step_huffman_decode.npz")
+            save_npy(quant_blocks, "decode_step_inverse_zigzag.npy")
+        else:
+            # Bước 1+2: Giải mã Huffman ghi thẳng vào mảng khối, không qua danh sách RLE
+            quant_blocks = huffman_decode_to_blocks(encoded_data, dc_codes, ac_codes, total_bits, padded_shape,
+                                                    restart_interval=restart_interval, workers=self.workers,
+                                                    dtype=np.int16 if self.dct_engine == ISLOW_ENGINE else np.int32)
 
-        # Bước 3: Giải lượng tử hóa
         print("Quality at dequantization:", self.quality)
-        dct_blocks = optimize_dequantization_for_speed(quant_blocks, self.quality)
-        save_npy(dct_blocks, "decode_step_dequantized.npy")
+        if self.fused_idct and scale == 1 and not self.save_intermediates:
+            # Bước 3+4: Giải lượng tử hóa và IDCT một lượt, ra thẳng pixel uint8
+            pixel_blocks = self._fused_inverse(quant_blocks)
+        else:
+            # Bước 3: Giải lượng tử hóa
+            dct_blocks = self._dequantize(quant_blocks)
+            save_npy(_luma(dct_blocks), "decode_step_dequantized.npy")
 
-        # Bước 4: IDCT
-        pixel_blocks = apply_idct_to_image(dct_blocks)
-        save_npy(pixel_blocks, "decode_step_idct.npy")
+            # Bước 4: IDCT (thu nhỏ nếu scale < 1)
+            pixel_blocks = self._inverse_dct(dct_blocks, scale)
+            save_npy(_luma(pixel_blocks), "decode_step_idct.npy")
 
-        # Bước 5: Gộp khối
-        image = merge_blocks(pixel_blocks, original_shape)
+        # Bước 5: Gộp khối, crop theo kích thước gốc đã thu nhỏ
+        output_shape = (-(-original_shape[0] * SCALED_BLOCK_SIZES[scale] // 8),
+                        -(-original_shape[1] * SCALED_BLOCK_SIZES[scale] // 8)) + tuple(original_shape[2:])
+        if subsampled:
+            # Gộp từng thành phần ở độ phân giải riêng, nội suy Cb/Cr về kích thước Y rồi crop
+            planes = [merge_blocks(plane, (plane.shape[0] * plane.shape[2], plane.shape[1] * plane.shape[3]),
+                                   self._stage_checks)
+                      for plane in pixel_blocks]
+            # Bước 6: Nội suy Cb/Cr và chuyển sang RGB một lượt, ghi thẳng vào ảnh ra
+            image = upsample_ycbcr_to_rgb(planes, subsampling, self.chroma_upsampling)[:output_shape[0], :output_shape[1]]
+            print("Pixel values range:", np.min(image), np.max(image))
+            save_image(image, "decompressed_image.jpg")
+            return image
+        image = merge_blocks(pixel_blocks, output_shape, self._stage_checks)
 
         # Bước 6: Chuyển YCbCr sang RGB nếu là ảnh màu
         if image.ndim == 3:
-            image = ycbcr_to_rgb(image)
+            image = ycbcr_planes_to_rgb(image[:, :, 0], image[:, :, 1], image[:, :, 2])
             print("Pixel values range:", np.min(image), np.max(image))
             save_image(image, "decompressed_image.jpg")
             return image
         print("Image shape:", image.shape)
         save_image(image.astype(np.uint8), "decompressed_image.jpg")
         return image.astype(np.uint8)
+
+    def decode_region(self, encoded, x, y, w, h):
+        """
+        Giải nén một vùng chữ nhật của ảnh: chỉ giải mã entropy các hàng/cột block cần thiết
+        (nhảy qua index phụ) và chỉ giải lượng tử hóa/IDCT các block đó.
+        Với ảnh lấy mẫu phụ, vùng được giải mã theo MCU, thêm một MCU viền mỗi phía để nội suy
+        Cb/Cr ở biên vùng giống hệt khi giải nén cả ảnh.
+        
+        Parameters:
+        -----------
+        encoded : dict
+            Kết quả encode_pipeline với index_interval khác 0 (có 'block_index') hoặc restart_interval khác 0
+        x, y : int
+            Góc trên trái của vùng (pixel)
+        w, h : int
+            Chiều rộng và chiều cao vùng (pixel)
+        
+        Returns:
+        --------
+        ndarray
+            Vùng ảnh (h, w) hoặc (h, w, 3), dtype=uint8
+        """
+        block_index = encoded.get('block_index')
+        restart_interval = encoded.get('restart_interval', 0)
+        if block_index is None and not restart_interval:
+            raise ValueError("Dữ liệu mã hóa không có block_index hoặc restart marker "
+                             "(cần index_interval hoặc restart_interval khác 0 khi encode)")
+        padded_shape = encoded['padded_shape']
+        image_height, image_width = padded_shape[-2:]
+        if w <= 0 or h <= 0 or x < 0 or y < 0 or x + w > image_width or y + h > image_height:
+            raise ValueError("Vùng cần giải nén nằm ngoài ảnh")
+
+        dc_codes, ac_codes = encoded['dc_codes'], encoded['ac_codes']
+        if encoded.get('table_mode', 'optimized') == 'standard':
+            dc_codes, ac_codes = standard_codes(3 if len(padded_shape) == 3 else 1)
+
+        subsampling = encoded.get('subsampling', '4:4:4')
+        if len(padded_shape) == 3 and subsampling != '4:4:4':
+            return self._decode_mcu_region(encoded, dc_codes, ac_codes, subsampling, x, y, w, h)
+
+        block_rows = (y // 8, (y + h + 7) // 8)
+        block_cols = (x // 8, (x + w + 7) // 8)
+        quant_blocks = huffman_decode_region(encoded['encoded_data'], dc_codes, ac_codes, encoded['total_bits'],
+                                             padded_shape, block_index, block_rows, block_cols, restart_interval)
+
+        if self.fused_idct:
+            pixel_blocks = self._fused_inverse(quant_blocks)
+        else:
+            pixel_blocks = self._inverse_dct(self._dequantize(quant_blocks), 1)
+        region_height = (block_rows[1] - block_rows[0]) * 8
+        region_width = (block_cols[1] - block_cols[0]) * 8
+        top, left = y - block_rows[0] * 8, x - block_cols[0] * 8
+
+        if len(padded_shape) == 3:
+            image = merge_blocks(pixel_blocks, (region_height, region_width, 3), self._stage_checks)
+            image = image[top:top + h, left:left + w]
+            return ycbcr_planes_to_rgb(image[:, :, 0], image[:, :, 1], image[:, :, 2])
+        image = merge_blocks(pixel_blocks, (region_height, region_width), self._stage_checks)
+        return image[top:top + h, left:left + w].astype(np.uint8)
+
+    def _decode_mcu_region(self, encoded, dc_codes, ac_codes, subsampling, x, y, w, h):
+        """
+        decode_region cho dòng xen kẽ MCU: giải mã các MCU phủ vùng cộng một MCU viền (trong ảnh),
+        nội suy Cb/Cr và chuyển RGB trên cả phần đã giải mã rồi mới crop.
+        """
+        padded_shape = encoded['padded_shape']
+        v, h_factor = SUBSAMPLING_FACTORS[subsampling]
+        mcu_height, mcu_width = 8 * v, 8 * h_factor
+        mcu_rows = (max(y // mcu_height - 1, 0), min(-(-(y + h) // mcu_height) + 1, padded_shape[1] // mcu_height))
+        mcu_cols = (max(x // mcu_width - 1, 0), min(-(-(x + w) // mcu_width) + 1, padded_shape[2] // mcu_width))
+        quant_blocks = huffman_decode_mcu_region(encoded['encoded_data'], dc_codes, ac_codes, encoded['total_bits'],
+                                                 padded_shape, subsampling, encoded['block_index'], mcu_rows, mcu_cols,
+                                                 encoded.get('restart_interval', 0))
+
+        if self.fused_idct:
+            pixel_blocks = self._fused_inverse(quant_blocks)
+        else:
+            pixel_blocks = self._inverse_dct(self._dequantize(quant_blocks), 1)
+        planes = [merge_blocks(plane, (plane.shape[0] * 8, plane.shape[1] * 8), self._stage_checks)
+                  for plane in pixel_blocks]
+        image = upsample_ycbcr_to_rgb(planes, subsampling, self.chroma_upsampling)
+        top, left = y - mcu_rows[0] * mcu_height, x - mcu_cols[0] * mcu_width
+        return image[top:top + h, left:left + w]
@@ -2,14 +2,15 @@ import streamlit as st
 import numpy as np
 import plotly.express as px
 import matplotlib.pyplot as plt
-from utils.image_io import load_npy
+from utils.image_io import load_npy, load_rle_csr
+from core.entropy_coding.symbols import csr_block
 
 def app():
     st.title("🔄 JPEG Decoding Pipeline")
     st.write("Explore each step of the JPEG decoding process.")
 
     # Load dữ liệu decode
-    inverse_zigzag_vectors = load_npy("decode_step_huffman_decode.npy", allow_pickle=True)
+    rle_csr = load_rle_csr("decode_step_huffman_decode.npz")
     dequantized_blocks = load_npy("decode_step_inverse_zigzag.npy")
     idct_blocks = load_npy("decode_step_dequantized.npy")
     blocks = load_npy("decode_step_idct.npy")
@@ -32,9 +33,8 @@ def app():
         st.markdown("Giải mã bitstream đã nén sử dụng bảng mã Huffman.")
 
         st.markdown("Vector sau khi giải mã Huffman:")
-        vector = inverse_zigzag_vectors[block_idx]
-        dc = int(vector[0])
-        ac = [(int(run), int(val)) for run, val in vector[1]]
+        _, ac = csr_block(rle_csr, block_idx)
+        dc = int(dequantized_blocks[block_height_idx, block_width_idx, 0, 0])  # DC tuyệt đối sau khi cộng dồn
         zigzag_vector = [dc, ac]
         st.code(f"{zigzag_vector}")
 
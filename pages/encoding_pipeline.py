@@ -3,7 +3,8 @@ import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from PIL import Image
-from utils.image_io import load_npy, build_huffman_result
+from utils.image_io import load_npy, load_rle_csr, build_huffman_result
+from core.entropy_coding.symbols import csr_block
 import matplotlib.pyplot as plt
 
 def app():
@@ -13,7 +14,7 @@ def app():
     blocks = load_npy("encode_step_blocks.npy")
     dct_blocks = load_npy("encode_step_dct.npy")       # shape (N, 8, 8)
     quantized_blocks = load_npy("encode_step_quantized.npy")
-    zigzag_vectors = load_npy("encode_step_rle.npy", allow_pickle=True)
+    rle_csr = load_rle_csr("encode_step_rle.npz")
     encoded_dc_original = st.session_state['encoded_dc_original']
     dc_codes = st.session_state['dc_codes']
     ac_codes = st.session_state['ac_codes']
@@ -110,9 +111,11 @@ def app():
         st.markdown(f"- (run, value): Số lượng giá trị 0 trước một giá trị khác 0, và giá trị đó.")
         st.markdown(f"- (0, 0): Dấu hiệu kết thúc block (EOB).")
         st.write(f"ZigZag vector for block #{block_idx}:")
-        zigzag_vector = zigzag_vectors[block_idx].tolist()  # Chuyển DC và danh sách AC sang list
-        dc_original  = encoded_dc_original[block_idx]  # DC coefficient
-        zigzag_vector = [int(dc_original), [(int(run), int(value)) for run, value in zigzag_vector[1]]]
+        _, ac = csr_block(rle_csr, block_idx)  # Danh sách AC (run, value) của block
+        # Ảnh màu: DC theo thành phần, trang hiển thị thành phần Y như các file trung gian
+        dc_list = encoded_dc_original[0] if isinstance(encoded_dc_original[0], list) else encoded_dc_original
+        dc_original  = dc_list[block_idx]  # DC coefficient
+        zigzag_vector = [int(dc_original), ac]
         st.code(f"{zigzag_vector}")
 
     with tab5:
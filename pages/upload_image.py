@@ -37,36 +37,32 @@ def app():
         st.subheader("Compression Settings")
         quality_factor = st.slider("Quality Factor", 1, 100, 80)
 
-        jpeg = JPEGProcessor(quality_factor)
+        # Ảnh màu: Cb/Cr lấy mẫu phụ 4:2:0, xen kẽ theo MCU
+        jpeg = JPEGProcessor(quality_factor, subsampling='4:2:0' if is_color_image else '4:4:4')
         # Nút Compress và Decompress
         col_compress, col_decompress = st.columns(2)
         with col_compress:
             if st.button("Compress"):
                 st.session_state['original_shape'] = image.shape
                 st.session_state['quality_factor'] = quality_factor
-                if is_color_image:
-                    image = Image.open(uploaded_file)
-                    ensure_dir()
-                    image.save("assets/images/processing/decompressed_image.jpg", format="JPEG", quality=quality_factor, optimize=True)
-                    st.image(load_image("decompressed_image.jpg"), caption="Decompressed Image", use_container_width=True)
-                    st.success("JPEG Pipeline completed!")
-                else:
-                    result = jpeg.encode_pipeline(image)
-                    st.session_state['encoded_dc_original'] = result['encoded_dc_original']
-                    st.session_state['compressed_image_path'] = f"assets/images/processing/compressed_image.jpg"
-                    st.session_state['encoded_data'] = result['encoded_data']
-                    st.session_state['dc_codes'] = result['dc_codes']
-                    st.session_state['ac_codes'] = result['ac_codes']
-                    st.session_state['padded_shape'] = result['padded_shape']
-                    st.session_state['total_bits'] = result['total_bits']
-                    st.success("Compression completed! Navigate to other pages to explore.")
+                result = jpeg.encode_pipeline(image)
+                st.session_state['encoded_dc_original'] = result['encoded_dc_original']
+                st.session_state['compressed_image_path'] = f"assets/images/processing/compressed_image.jpg"
+                st.session_state['encoded_data'] = result['encoded_data']
+                st.session_state['dc_codes'] = result['dc_codes']
+                st.session_state['ac_codes'] = result['ac_codes']
+                st.session_state['padded_shape'] = result['padded_shape']
+                st.session_state['total_bits'] = result['total_bits']
+                st.session_state['subsampling'] = result['subsampling']
+                st.success("Compression completed! Navigate to other pages to explore.")
         with col_decompress:
             if st.button("Decompress"):
                 encoded_data = st.session_state.get('encoded_data')
                 if encoded_data is None:
                     st.warning("Please compress an image first!")
                 else:
-                    decompressed_image = jpeg.decode_pipeline(encoded_data, st.session_state['dc_codes'], st.session_state['ac_codes'], st.session_state['padded_shape'], st.session_state['total_bits'], st.session_state.get('original_shape'))
+                    decompressed_image = jpeg.decode_pipeline(encoded_data, st.session_state['dc_codes'], st.session_state['ac_codes'], st.session_state['padded_shape'], st.session_state['total_bits'], st.session_state.get('original_shape'),
+                                                          subsampling=st.session_state.get('subsampling', '4:4:4'))
                     st.image(decompressed_image, caption="Decompressed Image", use_container_width=True)
                     st.session_state['decompressed_image_path'] = f"assets/images/processing/decompressed_image.jpg"
                     st.success("Decompression completed! Navigate to other pages to explore.")
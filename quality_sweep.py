@@ -0,0 +1,106 @@
+import csv
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from skimage.metrics import peak_signal_noise_ratio as psnr, structural_similarity as ssim
+from core.color_processing.color_transform import rgb_to_ycbcr_planar, ycbcr_planes_to_rgb
+from core.dct.block_processing import pad_image_to_multiple_of_8, split_into_blocks, merge_blocks
+from core.dct.dct import apply_dct_to_image, apply_fused_idct_to_image, DCT_ENGINES
+from core.quantization.quantization import optimize_quantization_for_speed
+from core.entropy_coding.huffman.huffman_encoder import estimate_encoded_bits
+
+# Cột của bảng kết quả, pages/statistics.py đọc "Quality Factor", "PSNR", "SSIM"
+SWEEP_COLUMNS = ["Quality Factor", "PSNR", "SSIM", "Size (bytes)", "BPP"]
+
+# Trạng thái dùng chung của một lần quét: ảnh gốc, hệ số DCT, table_mode.
+# Với workers > 1 được gửi một lần cho mỗi process qua initializer, không gửi lại theo từng quality.
+_sweep_state = {}
+
+def _init_sweep(state):
+    _sweep_state.clear()
+    _sweep_state.update(state)
+
+def _evaluate_quality(quality):
+    original = _sweep_state['original']
+    quant_blocks = optimize_quantization_for_speed(_sweep_state['dct_blocks'], quality)
+    total_bits = estimate_encoded_bits(quant_blocks, _sweep_state['table_mode'])
+
+    # Tái tạo: giải lượng tử hóa + IDCT một lượt, như decode_pipeline
+    image = merge_blocks(apply_fused_idct_to_image(quant_blocks, quality), original.shape, validate=False)
+    if image.ndim == 3:
+        image = ycbcr_planes_to_rgb(image[:, :, 0], image[:, :, 1], image[:, :, 2])
+
+    num_bytes = (total_bits + 7) // 8
+    return (
+        quality,
+        float(psnr(original, image, data_range=255)),
+        float(ssim(original, image, channel_axis=-1 if original.ndim == 3 else None, data_range=255)),
+        num_bytes,
+        num_bytes * 8 / (original.shape[0] * original.shape[1]),
+    )
+
+def quality_sweep(image, qualities=range(1, 101), table_mode='optimized', dct_engine='einsum', workers=1):
+    """
+    Đo PSNR, SSIM và kích thước nén cho nhiều quality trên cùng một ảnh.
+    Chuyển màu, padding và DCT chỉ chạy một lần; với mỗi quality chỉ lượng tử hóa, tính kích thước
+    entropy bằng chạy khô (estimate_encoded_bits, không ghép bit) và tái tạo ảnh, không ghi file trung gian.
+
+    Parameters:
+    -----------
+    image : ndarray
+        Ảnh gốc (h, w) hoặc (h, w, 3), dtype=uint8
+    qualities : iterable, optional
+        Các hệ số chất lượng (1-100), default=range(1, 101)
+    table_mode : str, optional
+        'optimized' hoặc 'standard', như JPEGProcessor, default='optimized'
+    dct_engine : str, optional
+        Engine DCT số thực trong DCT_ENGINES, default='einsum'
+    workers : int, optional
+        Số process chạy song song các quality, default=1
+
+    Returns:
+    --------
+    list
+        List tuple theo SWEEP_COLUMNS: (quality, psnr, ssim, size_bytes, bpp), cùng thứ tự với qualities
+    """
+    qualities = list(qualities)
+    if image.ndim not in (2, 3):
+        raise ValueError("Ảnh phải là mảng 2D (xám) hoặc 3D (màu)")
+    if not qualities or any(not 1 <= q <= 100 for q in qualities):
+        raise ValueError("Hệ số chất lượng phải từ 1 đến 100")
+    if table_mode not in ('optimized', 'standard'):
+        raise ValueError("table_mode phải là 'optimized' hoặc 'standard'")
+    if dct_engine not in DCT_ENGINES:
+        raise ValueError(f"dct_engine phải là một trong {list(DCT_ENGINES)}")
+    if workers < 1:
+        raise ValueError("workers phải >= 1")
+
+    # uint8 luôn nằm trong [0, 255]: các bước bên dưới không cần quét lại dữ liệu
+    original = np.asarray(image, dtype=np.uint8)
+    if original.ndim == 3:
+        # Mặt phẳng YCbCr (3, H', W') đã pad, như encode_pipeline với ảnh uint8
+        blocks = split_into_blocks(rgb_to_ycbcr_planar(original), validate=False)
+    else:
+        blocks = split_into_blocks(pad_image_to_multiple_of_8(original, validate=False), validate=False)
+    state = {
+        'original': original,
+        'dct_blocks': apply_dct_to_image(blocks, dct_engine, validate=False),
+        'table_mode': table_mode,
+    }
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_sweep, initargs=(state,)) as executor:
+            return list(executor.map(_evaluate_quality, qualities))
+    _init_sweep(state)
+    try:
+        return [_evaluate_quality(q) for q in qualities]
+    finally:
+        _sweep_state.clear()
+
+def write_sweep_csv(rows, output_csv="jpeg_psnr_ssim_results.csv"):
+    """
+    Ghi kết quả quality_sweep ra CSV (mở file một lần), định dạng pages/statistics.py đọc.
+    """
+    with open(output_csv, mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(SWEEP_COLUMNS)
+        writer.writerows(rows)
@@ -0,0 +1,23 @@
+import os
+import numpy as np
+import pytest
+from utils.image_io import load_uploaded_image
+
+TEST_IMAGE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets", "images", "test")
+
+
+@pytest.fixture(autouse=True)
+def processing_dir(tmp_path, monkeypatch):
+    # JPEGProcessor ghi file trung gian vào assets/images/processing (đường dẫn tương đối): chạy trong thư mục tạm
+    monkeypatch.chdir(tmp_path)
+
+
+@pytest.fixture(scope="session")
+def gray_image():
+    return load_uploaded_image(os.path.join(TEST_IMAGE_DIR, "input_gray.jpg"))
+
+
+@pytest.fixture(scope="session")
+def color_image():
+    # Cắt một vùng kích thước không chia hết cho 8/16 để kiểm tra cả phần pad
+    return np.ascontiguousarray(load_uploaded_image(os.path.join(TEST_IMAGE_DIR, "input_color.jpg"))[300:555, 400:701])
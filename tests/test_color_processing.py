@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+from core.color_processing.color_transform import (rgb_to_ycbcr, ycbcr_to_rgb, rgb_to_ycbcr_planar,
+                                                   ycbcr_planes_to_rgb)
+from core.color_processing.subsampling import (SUBSAMPLING_FACTORS, apply_chroma_upsampling,
+                                               upsample_ycbcr_to_rgb)
+
+
+def _ycbcr_grid(y_step=15):
+    # Mọi cặp (Cb, Cr) với Y cách đều: phủ toàn bộ bảng tra của ycbcr_planes_to_rgb
+    y, cb, cr = np.meshgrid(np.arange(0, 256, y_step), np.arange(256), np.arange(256), indexing='ij')
+    return np.stack((y, cb, cr), axis=-1).reshape(-1, 256, 3).astype(np.uint8)
+
+
+@pytest.mark.parametrize("multiple", [(8, 8), (16, 16), (8, 16)])
+def test_rgb_to_ycbcr_planar_matches_float(color_image, multiple):
+    height, width = color_image.shape[:2]
+    planar = rgb_to_ycbcr_planar(color_image, multiple)
+    assert planar.shape == (3, height + (-height % multiple[0]), width + (-width % multiple[1]))
+    # Số nguyên 16 bit phân số làm tròn đúng: cách kết quả float không quá 0.5
+    expected = rgb_to_ycbcr(color_image).transpose(2, 0, 1)
+    assert np.abs(planar[:, :height, :width] - expected).max() <= 0.5 + 1e-3
+    # Phần pad lặp lại pixel biên như pad_image_to_multiple_of_8
+    padded = np.pad(planar[:, :height, :width], ((0, 0), (0, planar.shape[1] - height), (0, planar.shape[2] - width)), mode='edge')
+    np.testing.assert_array_equal(planar, padded)
+
+
+def test_rgb_to_ycbcr_planar_int16_matches_float32(color_image):
+    np.testing.assert_array_equal(rgb_to_ycbcr_planar(color_image, dtype=np.int16),
+                                  rgb_to_ycbcr_planar(color_image, dtype=np.float32))
+
+
+def test_ycbcr_planes_to_rgb_matches_float():
+    ycbcr = _ycbcr_grid()
+    planes = ycbcr_planes_to_rgb(ycbcr[..., 0], ycbcr[..., 1], ycbcr[..., 2])
+    assert planes.dtype == np.uint8
+    # Bảng tra làm tròn từng số hạng riêng: lệch tối đa 1 so với công thức float
+    assert np.abs(planes.astype(np.int16) - ycbcr_to_rgb(ycbcr.astype(np.float32))).max() <= 1
+
+
+def test_ycbcr_planes_to_rgb_rounds_float_planes():
+    rng = np.random.default_rng(0)
+    ycbcr = rng.uniform(0, 255, size=(64, 64, 3)).astype(np.float32)
+    rounded = np.rint(ycbcr).astype(np.uint8)
+    np.testing.assert_array_equal(ycbcr_planes_to_rgb(ycbcr[..., 0], ycbcr[..., 1], ycbcr[..., 2]),
+                                  ycbcr_planes_to_rgb(rounded[..., 0], rounded[..., 1], rounded[..., 2]))
+
+
+def _random_planes(subsampling, chroma_shape=(23, 17), dtype=np.uint8, seed=0):
+    v, h = SUBSAMPLING_FACTORS[subsampling]
+    rng = np.random.default_rng(seed)
+    y = rng.integers(0, 256, size=(chroma_shape[0] * v, chroma_shape[1] * h))
+    cb, cr = rng.integers(0, 256, size=(2,) + chroma_shape)
+    return tuple(plane.astype(dtype) for plane in (y, cb, cr))
+
+
+def _libjpeg_fancy_upsample(plane, v, h):
+    # Tham chiếu vô hướng theo jdsample.c (h2v1_fancy_upsample, h2v2_fancy_upsample)
+    x = plane.astype(np.int64)
+    rows, cols = x.shape
+    out = np.empty((rows * v, cols * h), dtype=np.int64)
+    for r in range(rows):
+        for dr in range(v):
+            if v == 2:
+                near = min(max(r + (1 if dr else -1), 0), rows - 1)
+                colsum = [3 * x[r, c] + x[near, c] for c in range(cols)]
+                bias, shift = (8, 7), 4
+            else:
+                colsum = [x[r, c] for c in range(cols)]
+                bias, shift = (1, 2), 2
+            for c in range(cols):
+                if h == 2:
+                    out[r * v + dr, 2 * c] = (3 * colsum[c] + colsum[max(c - 1, 0)] + bias[0]) >> shift
+                    out[r * v + dr, 2 * c + 1] = (3 * colsum[c] + colsum[min(c + 1, cols - 1)] + bias[1]) >> shift
+                else:
+                    out[r * v + dr, c] = colsum[c]
+    return out.astype(np.uint8)
+
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.float32])
+@pytest.mark.parametrize("subsampling", ['4:4:4', '4:2:2', '4:2:0'])
+def test_upsample_replicate_matches_unfused(subsampling, dtype):
+    y, cb, cr = _random_planes(subsampling, dtype=dtype)
+    upsampled = apply_chroma_upsampling((y, cb, cr), subsampling)
+    expected = ycbcr_planes_to_rgb(upsampled[..., 0], upsampled[..., 1], upsampled[..., 2])
+    # Cùng bảng tra, chỉ bỏ bản lặp Cb/Cr: phải giống hệt
+    np.testing.assert_array_equal(upsample_ycbcr_to_rgb((y, cb, cr), subsampling, 'replicate'), expected)
+
+
+@pytest.mark.parametrize("subsampling", ['4:2:2', '4:2:0'])
+def test_upsample_fancy_matches_libjpeg(subsampling):
+    v, h = SUBSAMPLING_FACTORS[subsampling]
+    y, cb, cr = _random_planes(subsampling)
+    expected = ycbcr_planes_to_rgb(y, _libjpeg_fancy_upsample(cb, v, h), _libjpeg_fancy_upsample(cr, v, h))
+    np.testing.assert_array_equal(upsample_ycbcr_to_rgb((y, cb, cr), subsampling, 'fancy'), expected)
+
+
+def test_upsample_fancy_keeps_flat_chroma():
+    y, cb, cr = _random_planes('4:2:0')
+    cb[:], cr[:] = 90, 200
+    np.testing.assert_array_equal(upsample_ycbcr_to_rgb((y, cb, cr), '4:2:0', 'fancy'),
+                                  upsample_ycbcr_to_rgb((y, cb, cr), '4:2:0', 'replicate'))
+
+
+def test_upsample_rejects_mismatched_planes():
+    y, cb, cr = _random_planes('4:2:0')
+    with pytest.raises(ValueError):
+        upsample_ycbcr_to_rgb((y[:-1], cb, cr), '4:2:0')
+    with pytest.raises(ValueError):
+        upsample_ycbcr_to_rgb((y, cb, cr), '4:2:0', 'bilinear')
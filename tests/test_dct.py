@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+from core.dct.dct import (DCT_ENGINES, check_dct_engine, apply_dct_to_image, apply_idct_to_image,
+                          PRUNED_DENSE_ENGINES, eob_positions, pruned_inverse, _engine,
+                          apply_fused_idct_to_image, apply_fused_dct_to_image)
+from core.dct.block_processing import pad_image_to_multiple_of_8, split_into_blocks, merge_blocks
+from core.quantization.quantization import optimize_quantization_for_speed, quantize_integer
+from core.quantization.dequantization import optimize_dequantization_for_speed, dequantize_integer
+from core.entropy_coding.zigzag_rle import ZIGZAG_INDICES
+from core.color_processing.color_transform import rgb_to_ycbcr_planar
+
+
+@pytest.mark.parametrize("name", sorted(DCT_ENGINES))
+def test_builtin_engine_matches_reference(name):
+    # Sai số float32 so với DCT float64 tham chiếu, cùng ngưỡng register_dct_engine dùng
+    forward_error, inverse_error = check_dct_engine(name, tolerance=1e-2)
+    assert forward_error <= 1e-2 and inverse_error <= 1e-2
+
+
+def test_check_dct_engine_rejects_wrong_engine():
+    with pytest.raises(ValueError):
+        DCT_ENGINES['broken'] = (lambda b: b, lambda c: c)
+        try:
+            check_dct_engine('broken')
+        finally:
+            del DCT_ENGINES['broken']
+
+
+def _dequantized_blocks(image, quality):
+    quant_blocks = optimize_quantization_for_speed(apply_dct_to_image(split_into_blocks(pad_image_to_multiple_of_8(image))), quality)
+    return optimize_dequantization_for_speed(quant_blocks, quality)
+
+
+def test_islow_idct_returns_uint8_pixels(gray_image):
+    blocks = split_into_blocks(pad_image_to_multiple_of_8(gray_image), dtype=np.int16)
+    dct_blocks = dequantize_integer(quantize_integer(apply_dct_to_image(blocks, 'islow'), 50), 50)
+    pixels = apply_idct_to_image(dct_blocks, 'islow')
+    assert pixels.dtype == np.uint8 and pixels.shape == blocks.shape
+    image = merge_blocks(pixels, gray_image.shape)
+    assert image.dtype == np.uint8
+    # Cùng quality, đường số thực chỉ khác sai số làm tròn
+    expected = merge_blocks(apply_idct_to_image(_dequantized_blocks(gray_image, 50)), gray_image.shape)
+    assert np.abs(image - expected).mean() < 0.5
+
+
+def test_eob_positions_match_zigzag_scan():
+    rng = np.random.default_rng(0)
+    coefficients = rng.integers(-3, 4, size=(500, 64)) * (rng.random((500, 64)) < rng.random((500, 1)) ** 3)
+    expected = [max((k + 1 for k in range(64) if row[ZIGZAG_INDICES[k]]), default=0) for row in coefficients]
+    assert eob_positions(coefficients.reshape(-1, 8, 8)).tolist() == expected
+
+
+@pytest.mark.parametrize("quality", [10, 50, 90])
+def test_pruned_inverse_matches_dense(gray_image, quality):
+    coefficients = _dequantized_blocks(gray_image, quality).astype(np.float32).reshape(-1, 8, 8)
+    # Trước khi làm tròn: chỉ khác sai số float32 của thứ tự cộng
+    assert np.abs(pruned_inverse(coefficients) - _engine('einsum', 1)(coefficients)).max() < 1e-3
+
+
+@pytest.mark.parametrize("engine", ["einsum", "aan"])
+def test_pruned_idct_pixels(gray_image, engine):
+    dct_blocks = _dequantized_blocks(gray_image, 50)
+    dense = apply_idct_to_image(dct_blocks, engine)
+    pruned = apply_idct_to_image(dct_blocks, engine, pruned=True)
+    # Sau khi làm tròn: lệch tối đa 1 ở các giá trị sát .5
+    assert np.abs(pruned - dense).max() <= 1
+
+
+@pytest.mark.parametrize("engine", PRUNED_DENSE_ENGINES)
+def test_pruned_rejects_dense_engines(gray_image, engine):
+    with pytest.raises(ValueError):
+        apply_idct_to_image(_dequantized_blocks(gray_image, 50), engine, pruned=True)
+
+
+def _image_blocks(image):
+    if image.ndim == 3:
+        return split_into_blocks(rgb_to_ycbcr_planar(image))
+    return split_into_blocks(pad_image_to_multiple_of_8(image))
+
+
+@pytest.mark.parametrize("quality", [10, 50, 90, 100])
+@pytest.mark.parametrize("image_name, component", [("gray_image", 0), ("gray_image", 1), ("color_image", 0)])
+def test_fused_idct_matches_dequantize_then_idct(request, image_name, component, quality):
+    image_blocks = _image_blocks(request.getfixturevalue(image_name))
+    quant_blocks = optimize_quantization_for_speed(apply_dct_to_image(image_blocks), quality, component)
+    expected = apply_idct_to_image(optimize_dequantization_for_speed(quant_blocks, quality, component), 'gemm')
+    fused = apply_fused_idct_to_image(quant_blocks, quality, component=component)
+    assert fused.dtype == np.uint8 and fused.shape == expected.shape
+    # Cơ sở nhân sẵn bảng lượng tử chỉ đổi thứ tự làm tròn float32: lệch tối đa 1 ở vài pixel sát .5
+    diff = np.abs(fused.astype(np.int16) - expected)
+    assert diff.max() <= 1
+    assert (diff > 0).mean() <= 0.005
+
+
+@pytest.mark.parametrize("quality, max_mismatch", [(10, 0.001), (50, 0.001), (90, 0.001), (100, 0.005)])
+@pytest.mark.parametrize("image_name, component", [("gray_image", 0), ("gray_image", 1), ("color_image", 0)])
+def test_fused_dct_matches_dct_then_quantize(request, image_name, component, quality, max_mismatch):
+    image_blocks = _image_blocks(request.getfixturevalue(image_name))
+    expected = optimize_quantization_for_speed(apply_dct_to_image(image_blocks), quality, component)
+    fused = apply_fused_dct_to_image(image_blocks, quality, component=component)
+    assert fused.dtype == np.int16 and fused.shape == expected.shape
+    # Chia sẵn bảng lượng tử đổi giá trị sát .5 khi làm tròn: lệch tối đa 1, tỉ lệ nhỏ
+    # (đo được 0.001-0.05% với q10-q90; q100 bước lượng tử 1 nên nhiều giá trị sát .5 hơn, ~0.3%)
+    diff = np.abs(fused.astype(np.int32) - expected)
+    assert diff.max() <= 1
+    assert (diff > 0).mean() <= max_mismatch
@@ -0,0 +1,361 @@
+import numpy as np
+import pytest
+from core.entropy_coding.huffman.bitstream import BitWriter, BitReader, split_restart_segments
+from core.entropy_coding.huffman.huffman_encoder import (build_frequency_table, build_huffman_tree,
+                                                         build_huffman_codes, code_pairs, huffman_encode,
+                                                         huffman_encode_symbols, encode_quantized_blocks)
+from core.entropy_coding.huffman.canonical import (MAX_CODE_LENGTH, build_code_lengths,
+                                                   canonical_codes_from_bits, table_to_bytes,
+                                                   table_from_bytes, build_canonical_codes)
+from core.entropy_coding.zigzag_rle import (apply_zigzag_and_rle, apply_inverse_zigzag_and_rle, zigzag_scan,
+                                            zigzag_scan_blocks, inverse_zigzag, inverse_zigzag_blocks)
+from core.entropy_coding.symbols import extract_symbols, count_symbol_frequencies, rle_to_csr, csr_to_rle
+from core.entropy_coding.huffman.standard_tables import standard_codes
+from core.entropy_coding.huffman.huffman_decoder import (huffman_decode_bitstring, LOOKUP_CACHE_SIZE,
+                                                         build_lookup_table, huffman_decode_to_blocks)
+from jpeg_processor import JPEGProcessor
+from utils.image_io import save_rle_csr, load_rle_csr
+from core.color_processing.subsampling import SUBSAMPLING_FACTORS
+from core.entropy_coding.mcu import interleave_mcus, deinterleave_mcus, blocks_per_mcu
+
+
+def _pack_bitstring(bitstring):
+    padded = bitstring + '0' * (-len(bitstring) % 8)
+    return bytes(int(padded[i:i + 8], 2) for i in range(0, len(padded), 8))
+
+
+def _magnitude_string(value, size):
+    # Số âm ghi dạng bù một của |value| (JPEG F.1.2.1)
+    return format(value if value >= 0 else value + (1 << size) - 1, f'0{size}b') if size else ''
+
+
+def _reference_encode(channels, dc_codes, ac_codes):
+    # Bộ mã hóa tham chiếu ghép chuỗi bit '0'/'1' rồi đệm bit 0, như huffman_encode trước khi dùng BitWriter
+    bits = []
+    for blocks in channels:
+        for dc, ac in blocks:
+            size = abs(dc).bit_length()
+            bits.append(dc_codes[size] + _magnitude_string(dc, size))
+            for run, value in ac:
+                size = abs(value).bit_length()
+                bits.append(ac_codes[(run, size)] + _magnitude_string(value, size))
+            if not ac or ac[-1] != (0, 0):
+                bits.append(ac_codes[(0, 0)])
+    bitstring = ''.join(bits)
+    return _pack_bitstring(bitstring), len(bitstring)
+
+
+def _random_rle_blocks(rng, num_blocks):
+    # DC với mọi nhóm độ lớn 0..11, AC nhóm 1..11 và ZRL; một nửa số block kết thúc bằng (0, 0)
+    blocks = []
+    for k in range(num_blocks):
+        size = k % 12
+        dc = int(rng.integers(1 << size >> 1, 1 << size)) * int(rng.choice((-1, 1))) if size else 0
+        ac = []
+        for _ in range(int(rng.integers(0, 8))):
+            if rng.random() < 0.1:
+                ac.append((15, 0))
+            size = int(rng.integers(1, 12))
+            ac.append((int(rng.integers(0, 16)), int(rng.integers(1 << (size - 1), 1 << size)) * int(rng.choice((-1, 1)))))
+        if k % 2:
+            ac.append((0, 0))
+        blocks.append((dc, ac))
+    return blocks
+
+
+@pytest.mark.parametrize("as_pairs", [False, True])
+@pytest.mark.parametrize("num_channels", [1, 3])
+def test_huffman_encode_matches_bitstring_reference(num_channels, as_pairs):
+    rng = np.random.default_rng(num_channels)
+    channels = [_random_rle_blocks(rng, 300) for _ in range(num_channels)]
+    dc_freq, ac_freq = build_frequency_table([block for blocks in channels for block in blocks])
+    dc_codes = build_huffman_codes(build_huffman_tree(dc_freq))
+    ac_codes = build_huffman_codes(build_huffman_tree(ac_freq))
+    expected = _reference_encode(channels, dc_codes, ac_codes)
+    if as_pairs:
+        dc_codes, ac_codes = code_pairs(dc_codes), code_pairs(ac_codes)
+    assert huffman_encode(channels if num_channels > 1 else channels[0], dc_codes, ac_codes) == expected
+
+
+def test_bit_writer_matches_bitstring():
+    rng = np.random.default_rng(0)
+    writer = BitWriter(capacity=1)
+    bits = []
+    for length in rng.integers(1, 33, size=2000).tolist():
+        value = int(rng.integers(0, 1 << length))
+        writer.write(value, length)
+        bits.append(format(value, f'0{length}b'))
+    bitstring = ''.join(bits)
+    assert writer.total_bits == len(bitstring)
+    assert writer.getvalue() == _pack_bitstring(bitstring)
+
+
+def _check_code_table(bits, huffval, num_symbols):
+    codes = canonical_codes_from_bits(bits, huffval)
+    assert len(codes) == num_symbols == sum(bits)
+    strings = sorted(format(code, f'0{length}b') for code, length in codes.values())
+    assert max(len(string) for string in strings) <= MAX_CODE_LENGTH
+    # Không mã nào toàn bit 1 (trùng bit đệm) và không mã nào là tiền tố của mã đứng sau nó
+    assert all('0' in string for string in strings)
+    assert not any(b.startswith(a) for a, b in zip(strings, strings[1:]))
+    return codes
+
+
+def test_code_lengths_limited_to_16_bits():
+    # Tần suất Fibonacci cho cây Huffman lệch hẳn một phía: không giới hạn thì mã dài gần 30 bit
+    fibonacci = [1, 2]
+    while len(fibonacci) < 30:
+        fibonacci.append(fibonacci[-1] + fibonacci[-2])
+    freq_table = dict(enumerate(fibonacci))
+    unlimited, _ = build_code_lengths(freq_table, max_length=32)
+    assert max(length for length, count in enumerate(unlimited, start=1) if count) > MAX_CODE_LENGTH
+
+    bits, huffval = build_code_lengths(freq_table)
+    assert len(bits) == MAX_CODE_LENGTH
+    codes = _check_code_table(bits, huffval, len(fibonacci))
+    # Symbol tần suất cao hơn không nhận mã dài hơn
+    lengths = [codes[symbol][1] for symbol in range(len(fibonacci))]
+    assert lengths == sorted(lengths, reverse=True)
+
+
+def test_single_symbol_table():
+    bits, huffval = build_code_lengths({7: 100})
+    assert _check_code_table(bits, huffval, 1) == {7: (0, 1)}
+    assert table_from_bytes(table_to_bytes(bits, huffval), is_ac=False) == (bits, huffval)
+
+
+def test_full_ac_table_round_trips_through_bytes():
+    # Đủ 162 symbol AC: (run, size) với run 0..15, size 1..10, cộng EOB (0, 0) và ZRL (15, 0)
+    rng = np.random.default_rng(0)
+    symbols = [(run, size) for run in range(16) for size in range(1, 11)] + [(0, 0), (15, 0)]
+    freq_table = dict(zip(symbols, (rng.geometric(0.02, len(symbols)) ** 2).tolist()))
+    bits, huffval = build_code_lengths(freq_table)
+    _check_code_table(bits, huffval, 162)
+    data = table_to_bytes(bits, huffval)
+    assert len(data) == MAX_CODE_LENGTH + 162
+    assert table_from_bytes(data, is_ac=True) == (bits, huffval)
+
+
+def test_table_from_bytes_rejects_truncated_data():
+    bits, huffval = build_code_lengths({size: 1 << (12 - size) for size in range(12)})
+    data = table_to_bytes(bits, huffval)
+    with pytest.raises(ValueError):
+        table_from_bytes(data[:-1], is_ac=False)
+
+
+def _random_quantized(rng, shape):
+    # Hệ số lượng tử giả: DC lớn, AC thưa với mật độ khác nhau theo block (có block toàn 0 và block gần kín)
+    blocks = rng.integers(-60, 61, size=shape + (8, 8)).astype(np.int32)
+    blocks *= rng.random(shape + (8, 8)) < rng.random(shape + (1, 1)) ** 2
+    blocks[..., 0, 0] = rng.integers(-1024, 1024, size=shape)
+    return blocks
+
+
+@pytest.mark.parametrize("shape", [(5, 7), (3, 4, 6)])
+def test_extract_symbols_matches_rle_lists(shape):
+    quant_blocks = _random_quantized(np.random.default_rng(3), shape)
+    rle_data, _ = apply_zigzag_and_rle(quant_blocks)
+    channels = rle_data if len(shape) == 3 else [rle_data]
+    blocks = [block for channel in channels for block in channel]
+
+    symbols = extract_symbols(quant_blocks)
+    block_ptr = symbols['block_ptr']
+    assert symbols['dc_diff'].tolist() == [dc for dc, _ in blocks]
+    for i, (_, ac) in enumerate(blocks):
+        entries = slice(block_ptr[i], block_ptr[i + 1])
+        assert list(zip(symbols['run'][entries].tolist(), symbols['value'][entries].tolist())) == ac
+
+    dc_freq, ac_freq = build_frequency_table(blocks)
+    assert count_symbol_frequencies(symbols) == (dc_freq, ac_freq)
+    dc_codes, _, _ = build_canonical_codes(dc_freq)
+    ac_codes, _, _ = build_canonical_codes(ac_freq)
+    assert huffman_encode_symbols(symbols, dc_codes, ac_codes) == huffman_encode(rle_data, dc_codes, ac_codes)
+
+
+def test_standard_tables_match_annex_k():
+    dc_codes, ac_codes = standard_codes(1)
+    # Vài mã trong bảng K.3 và K.5
+    assert dc_codes[0] == (0b00, 2) and dc_codes[11] == (0b111111110, 9)
+    assert ac_codes[(0, 0)] == (0b1010, 4) and ac_codes[(0, 1)] == (0b00, 2)
+    assert ac_codes[(15, 0)] == (0b11111111001, 11) and ac_codes[(15, 10)] == (0xFFFE, 16)
+    chroma_dc, chroma_ac = standard_codes(3)
+    assert len(chroma_dc) == len(chroma_ac) == 3 and chroma_dc[0] is dc_codes
+
+
+def _encode(quant_blocks, table_mode, restart_interval=0):
+    symbols = extract_symbols(quant_blocks, restart_interval)
+    if table_mode == 'standard':
+        dc_codes, ac_codes = standard_codes(3 if quant_blocks.ndim == 5 else 1)
+    else:
+        dc_freq, ac_freq = count_symbol_frequencies(symbols)
+        dc_codes, ac_codes = build_canonical_codes(dc_freq)[0], build_canonical_codes(ac_freq)[0]
+    encoded_data, total_bits = huffman_encode_symbols(symbols, dc_codes, ac_codes)
+    return encoded_data, total_bits, dc_codes, ac_codes
+
+
+@pytest.mark.parametrize("table_mode", ["optimized", "standard"])
+@pytest.mark.parametrize("shape", [(6, 7), (3, 6, 7)])
+def test_decode_round_trip(shape, table_mode):
+    # Bảng chuẩn có nhiều mã 16 bit: AC ngẫu nhiên đi qua cả đường tra bảng và đường mã dài
+    quant_blocks = _random_quantized(np.random.default_rng(4), shape)
+    encoded_data, total_bits, dc_codes, ac_codes = _encode(quant_blocks, table_mode)
+    decoded = huffman_decode_bitstring(encoded_data, dc_codes, ac_codes, total_bits, shape[-1] * 8, shape[-2] * 8,
+                                       shape[0] if len(shape) == 3 else 1)
+    padded_shape = shape[:-2] + (shape[-2] * 8, shape[-1] * 8)
+    np.testing.assert_array_equal(apply_inverse_zigzag_and_rle(decoded, padded_shape), quant_blocks)
+
+
+def test_lookup_tables_are_cached_with_bounded_size():
+    dc_codes, _ = standard_codes(1)
+    first = build_lookup_table(dc_codes)
+    assert build_lookup_table(dict(dc_codes)) is first
+    for count in range(1, LOOKUP_CACHE_SIZE + 1):
+        build_lookup_table({symbol: (symbol, 8) for symbol in range(count)})
+    # Bảng dùng lâu nhất đã bị đẩy khỏi LRU thay vì giữ mãi
+    assert build_lookup_table(dc_codes) is not first
+
+
+def test_bit_reader_reads_back_bit_writer_output():
+    rng = np.random.default_rng(1)
+    lengths = rng.integers(1, 33, size=1000).tolist()
+    values = [int(rng.integers(0, 1 << length)) for length in lengths]
+    writer = BitWriter()
+    for value, length in zip(values, lengths):
+        writer.write(value, length)
+    reader = BitReader(writer.getvalue(), writer.total_bits)
+    positions = []
+    for value, length in zip(values, lengths):
+        positions.append(reader.position)
+        assert reader.peek(length) == value
+        assert reader.read(length) == value
+    assert reader.position == writer.total_bits
+    # Nhảy ngược về giữa dòng bit rồi đọc tiếp
+    reader.seek(positions[500])
+    assert [reader.read(length) for length in lengths[500:510]] == values[500:510]
+
+
+def _decode(processor, encoded, shape):
+    options = {key: encoded[key] for key in ('table_mode', 'restart_interval', 'subsampling') if key in encoded}
+    return processor.decode_pipeline(encoded['encoded_data'], encoded['dc_codes'], encoded['ac_codes'],
+                                     encoded['padded_shape'], encoded['total_bits'], shape, **options)
+
+
+# 7 không chia hết số block (hay số MCU) của cả hai ảnh thử
+@pytest.mark.parametrize("restart_interval", [1, 3, 7])
+@pytest.mark.parametrize("image_name, subsampling", [("gray_image", '4:4:4'), ("color_image", '4:4:4'),
+                                                     ("color_image", '4:2:2'), ("color_image", '4:2:0')])
+def test_restart_round_trip(request, image_name, subsampling, restart_interval):
+    # Ảnh lấy mẫu phụ: restart_interval tính theo MCU, predictor DC của từng thành phần reset ở mỗi đoạn
+    image = request.getfixturevalue(image_name)
+    expected = _decode(JPEGProcessor(50), JPEGProcessor(50, subsampling=subsampling).encode_pipeline(image),
+                       image.shape)
+    encoded = JPEGProcessor(50, restart_interval=restart_interval, subsampling=subsampling).encode_pipeline(image)
+    for workers in (1, 2):
+        np.testing.assert_array_equal(_decode(JPEGProcessor(50, workers=workers), encoded, image.shape), expected)
+
+
+def test_restart_segments_with_stuffed_bytes():
+    # Nhiễu ở chất lượng cao cho dòng bit gần như ngẫu nhiên: nhiều đoạn chứa byte 0xFF đã nhồi thành 0xFF00
+    image = np.random.default_rng(0).integers(0, 256, size=(64, 64)).astype(np.uint8)
+    expected = _decode(JPEGProcessor(95), JPEGProcessor(95).encode_pipeline(image), image.shape)
+    encoded = JPEGProcessor(95, restart_interval=2).encode_pipeline(image)
+    segments = split_restart_segments(encoded['encoded_data'])
+    assert len(segments) == 32
+    assert b'\xff\x00' in encoded['encoded_data']
+    assert any(b'\xff' in bytes(segment) for segment in segments)
+    for workers in (1, 2):
+        np.testing.assert_array_equal(_decode(JPEGProcessor(95, workers=workers), encoded, image.shape), expected)
+
+
+@pytest.mark.parametrize("restart_interval", [0, 1, 5])
+@pytest.mark.parametrize("shape", [(6, 7), (3, 6, 7)])
+def test_decode_to_blocks_matches_rle_path(shape, restart_interval):
+    quant_blocks = _random_quantized(np.random.default_rng(9), shape)
+    encoded_data, total_bits, dc_codes, ac_codes = _encode(quant_blocks, 'standard', restart_interval)
+    padded_shape = shape[:-2] + (shape[-2] * 8, shape[-1] * 8)
+    decoded = huffman_decode_bitstring(encoded_data, dc_codes, ac_codes, total_bits, shape[-1] * 8, shape[-2] * 8,
+                                       shape[0] if len(shape) == 3 else 1, restart_interval)
+    np.testing.assert_array_equal(apply_inverse_zigzag_and_rle(decoded, padded_shape), quant_blocks)
+    for workers in (1, 2):
+        blocks = huffman_decode_to_blocks(encoded_data, dc_codes, ac_codes, total_bits, padded_shape,
+                                          restart_interval, workers)
+        assert blocks.dtype == np.int32
+        np.testing.assert_array_equal(blocks, quant_blocks)
+    blocks = huffman_decode_to_blocks(encoded_data, dc_codes, ac_codes, total_bits, padded_shape,
+                                      restart_interval, dtype=np.int16)
+    np.testing.assert_array_equal(blocks, quant_blocks)
+
+
+@pytest.mark.parametrize("table_mode", ["optimized", "standard"])
+@pytest.mark.parametrize("shape", [(6, 7), (3, 6, 7)])
+def test_encode_quantized_blocks_matches_symbol_path(shape, table_mode):
+    quant_blocks = _random_quantized(np.random.default_rng(10), shape)
+    result = encode_quantized_blocks(quant_blocks, table_mode, restart_interval=4)
+    encoded_data, total_bits, dc_codes, ac_codes = _encode(quant_blocks, table_mode, restart_interval=4)
+    assert (result['encoded_data'], result['total_bits']) == (encoded_data, total_bits)
+    assert (result['dc_codes'], result['ac_codes']) == (dc_codes, ac_codes)
+
+
+@pytest.mark.parametrize("shape", [(4, 5), (3, 4, 5)])
+def test_zigzag_scan_blocks_matches_per_block_scan(shape):
+    quant_blocks = _random_quantized(np.random.default_rng(11), shape)
+    vectors = zigzag_scan_blocks(quant_blocks)
+    assert vectors.shape == (int(np.prod(shape)), 64) and vectors.flags.c_contiguous
+    expected = [zigzag_scan(block) for block in quant_blocks.reshape(-1, 8, 8)]
+    np.testing.assert_array_equal(vectors, np.stack(expected))
+
+
+@pytest.mark.parametrize("shape", [(5, 7), (3, 4, 6)])
+def test_csr_round_trips_through_rle_lists_and_npz(shape):
+    quant_blocks = _random_quantized(np.random.default_rng(12), shape)
+    symbols = extract_symbols(quant_blocks)
+    rle_data, _ = apply_zigzag_and_rle(quant_blocks)
+    assert csr_to_rle(symbols) == rle_data
+    converted = rle_to_csr(rle_data, shape)
+    for key in ('dc_diff', 'dc_size', 'block_ptr', 'run', 'value', 'size'):
+        np.testing.assert_array_equal(converted[key], symbols[key])
+    assert converted['shape'] == symbols['shape']
+
+    save_rle_csr(symbols, 'symbols.npz')
+    loaded = load_rle_csr('symbols.npz')
+    assert loaded['shape'] == tuple(shape)
+    for key in ('dc_diff', 'block_ptr', 'run', 'value'):
+        np.testing.assert_array_equal(loaded[key], symbols[key])
+
+
+@pytest.mark.parametrize("restart_interval", [0, 5])
+@pytest.mark.parametrize("shape", [(5, 7), (3, 4, 6)])
+def test_inverse_from_csr_and_lists(shape, restart_interval):
+    quant_blocks = _random_quantized(np.random.default_rng(13), shape)
+    padded_shape = shape[:-2] + (shape[-2] * 8, shape[-1] * 8)
+    # DC difference được cộng dồn lại, predictor reset sau mỗi restart_interval block
+    symbols = extract_symbols(quant_blocks, restart_interval)
+    np.testing.assert_array_equal(apply_inverse_zigzag_and_rle(symbols, padded_shape), quant_blocks)
+    encoded_data, total_bits, dc_codes, ac_codes = _encode(quant_blocks, 'optimized', restart_interval)
+    decoded = huffman_decode_bitstring(encoded_data, dc_codes, ac_codes, total_bits, shape[-1] * 8, shape[-2] * 8,
+                                       shape[0] if len(shape) == 3 else 1, restart_interval)
+    np.testing.assert_array_equal(apply_inverse_zigzag_and_rle(decoded, padded_shape), quant_blocks)
+
+
+def test_inverse_zigzag_blocks_matches_per_block():
+    vectors = zigzag_scan_blocks(_random_quantized(np.random.default_rng(14), (3, 4, 6)))
+    blocks = inverse_zigzag_blocks(vectors, (3, 4, 6))
+    np.testing.assert_array_equal(blocks.reshape(-1, 8, 8), np.stack([inverse_zigzag(v) for v in vectors]))
+
+
+@pytest.mark.parametrize("subsampling", ['4:4:4', '4:2:2', '4:2:0'])
+def test_mcu_interleave_round_trip(subsampling):
+    v, h = SUBSAMPLING_FACTORS[subsampling]
+    rng = np.random.default_rng(22)
+    y = rng.integers(-1024, 1024, size=(3 * v, 5 * h, 8, 8)).astype(np.int32)
+    cb, cr = rng.integers(-1024, 1024, size=(2, 3, 5, 8, 8)).astype(np.int32)
+    stream, components = interleave_mcus([y, cb, cr], subsampling)
+    mcu_size = blocks_per_mcu(subsampling)
+    assert stream.shape == (1, 15 * mcu_size, 8, 8)
+    assert components[:mcu_size].tolist() == [0] * (v * h) + [1, 2]
+    # MCU thứ hai (hàng 0, cột 1): v x h block Y theo hàng rồi Cb, Cr cùng vị trí
+    second = stream[0, mcu_size:2 * mcu_size]
+    np.testing.assert_array_equal(second[:v * h].reshape(v, h, 8, 8), y[:v, h:2 * h])
+    np.testing.assert_array_equal(second[v * h:], np.stack((cb[0, 1], cr[0, 1])))
+    for expected, blocks in zip((y, cb, cr), deinterleave_mcus(stream, (3, 5), subsampling)):
+        np.testing.assert_array_equal(blocks, expected)
@@ -0,0 +1,131 @@
+import numpy as np
+import pytest
+from jpeg_processor import JPEGProcessor
+
+
+def _decode(processor, encoded, shape, **options):
+    for key in ('table_mode', 'restart_interval', 'subsampling'):
+        if key in encoded:
+            options.setdefault(key, encoded[key])
+    return processor.decode_pipeline(encoded['encoded_data'], encoded['dc_codes'], encoded['ac_codes'],
+                                     encoded['padded_shape'], encoded['total_bits'], shape, **options)
+
+
+# Vùng nhỏ, vùng lệch block, một pixel; vùng sát biên phải/dưới được thêm theo kích thước ảnh
+REGIONS = [(0, 0, 20, 20), (37, 45, 70, 33), (100, 100, 1, 1)]
+
+
+@pytest.mark.parametrize("options", [{'index_interval': 'row'}, {'index_interval': 5}, {'restart_interval': 7}])
+@pytest.mark.parametrize("image_name, subsampling", [("gray_image", '4:4:4'), ("color_image", '4:4:4'),
+                                                     ("color_image", '4:2:0')])
+def test_decode_region_matches_full_decode(request, image_name, subsampling, options):
+    # Ảnh lấy mẫu phụ: index/restart tính theo MCU, vùng được giải mã theo MCU rồi nội suy Cb/Cr
+    image = request.getfixturevalue(image_name)
+    processor = JPEGProcessor(50, subsampling=subsampling, **options)
+    encoded = processor.encode_pipeline(image)
+    full = _decode(processor, encoded, image.shape)
+    height, width = image.shape[:2]
+    for x, y, w, h in REGIONS + [(width - 40, height - 30, 40, 30)]:
+        np.testing.assert_array_equal(processor.decode_region(encoded, x, y, w, h), full[y:y + h, x:x + w])
+
+
+def test_decode_region_needs_index_or_restart(gray_image):
+    processor = JPEGProcessor(50)
+    with pytest.raises(ValueError):
+        processor.decode_region(processor.encode_pipeline(gray_image), 0, 0, 8, 8)
+
+
+def _psnr(reference, image):
+    mse = np.mean((reference.astype(np.float64) - image) ** 2)
+    return 10 * np.log10(255 ** 2 / mse)
+
+
+@pytest.mark.parametrize("image_name", ["gray_image", "color_image"])
+def test_islow_decode_close_to_float(request, image_name):
+    image = request.getfixturevalue(image_name)
+    reference, islow = JPEGProcessor(75), JPEGProcessor(75, dct_engine='islow')
+    expected = _decode(reference, reference.encode_pipeline(image), image.shape)
+    decoded = _decode(islow, islow.encode_pipeline(image), image.shape)
+    assert decoded.dtype == np.uint8 and decoded.shape == expected.shape
+    # Sai số làm tròn số nguyên chỉ đổi vài hệ số lượng tử: lệch trung bình dưới một mức xám
+    assert np.abs(decoded.astype(np.int16) - expected).mean() < 1
+    assert _psnr(expected, decoded) >= 40
+
+
+def _box_downsample(image, factor):
+    # Trung bình từng ô factor x factor, ô lẻ ở biên được pad lặp pixel như khi encode
+    height, width = image.shape[:2]
+    pad = ((0, -height % factor), (0, -width % factor)) + ((0, 0),) * (image.ndim - 2)
+    padded = np.pad(image.astype(np.float64), pad, mode='edge')
+    rows, cols = padded.shape[0] // factor, padded.shape[1] // factor
+    return padded.reshape((rows, factor, cols, factor) + image.shape[2:]).mean(axis=(1, 3))
+
+
+@pytest.mark.parametrize("scale", [1 / 2, 1 / 4, 1 / 8])
+@pytest.mark.parametrize("image_name", ["gray_image", "color_image"])
+def test_scaled_decode_matches_downsampled_full_decode(request, image_name, scale):
+    image = request.getfixturevalue(image_name)
+    processor = JPEGProcessor(75)
+    encoded = processor.encode_pipeline(image)
+    full = _decode(processor, encoded, image.shape)
+    scaled = _decode(processor, encoded, image.shape, scale=scale)
+    factor = round(1 / scale)
+    assert scaled.shape == (-(-image.shape[0] // factor), -(-image.shape[1] // factor)) + image.shape[2:]
+    # IDCT thu nhỏ xấp xỉ trung bình ô của ảnh giải nén đầy đủ (ở 1/8 đúng bằng DC của block)
+    assert _psnr(_box_downsample(full, factor), scaled) >= 32
+
+
+@pytest.mark.parametrize("restart_interval", [0, 4])
+@pytest.mark.parametrize("image_name", ["gray_image", "color_image"])
+def test_encode_to_target_picks_largest_fitting_quality(request, image_name, restart_interval):
+    image = request.getfixturevalue(image_name)
+    sizes = {}
+
+    def size(quality):
+        if quality not in sizes:
+            encoded = JPEGProcessor(quality, restart_interval=restart_interval).encode_pipeline(image)
+            sizes[quality] = len(encoded['encoded_data'])
+        return sizes[quality]
+
+    for target in (size(30), size(75) - 1, (size(90) + size(91)) // 2):
+        result = JPEGProcessor(restart_interval=restart_interval).encode_to_target(image, target_bytes=target)
+        quality = result['quality']
+        assert len(result['encoded_data']) == size(quality) <= target
+        assert quality == 100 or size(quality + 1) > target
+
+
+def test_encode_to_target_falls_back_to_quality_1(gray_image):
+    size = len(JPEGProcessor(1).encode_pipeline(gray_image)['encoded_data'])
+    result = JPEGProcessor().encode_to_target(gray_image, target_bytes=size - 1)
+    assert result['quality'] == 1 and len(result['encoded_data']) == size
+    # Ngân sách theo bpp quy về số byte
+    height, width = gray_image.shape
+    result = JPEGProcessor().encode_to_target(gray_image, target_bpp=size * 8 / (height * width))
+    assert result['quality'] >= 1 and len(result['encoded_data']) <= size
+
+
+@pytest.mark.parametrize("subsampling, min_psnr", [('4:4:4', 31), ('4:2:2', 28), ('4:2:0', 27)])
+def test_subsampled_round_trip_quality(color_image, subsampling, min_psnr):
+    processor = JPEGProcessor(75, subsampling=subsampling)
+    encoded = processor.encode_pipeline(color_image)
+    decoded = _decode(processor, encoded, color_image.shape)
+    assert decoded.dtype == np.uint8 and decoded.shape == color_image.shape
+    assert _psnr(color_image, decoded) >= min_psnr
+
+
+@pytest.mark.parametrize("validation", ['boundary', 'none'])
+@pytest.mark.parametrize("image_name", ["gray_image", "color_image"])
+def test_validation_levels_give_identical_output(request, image_name, validation):
+    image = request.getfixturevalue(image_name)
+    reference, fast = JPEGProcessor(50), JPEGProcessor(50, validation=validation)
+    expected, encoded = reference.encode_pipeline(image), fast.encode_pipeline(image)
+    assert (encoded['encoded_data'], encoded['total_bits']) == (expected['encoded_data'], expected['total_bits'])
+    np.testing.assert_array_equal(_decode(fast, encoded, image.shape), _decode(reference, expected, image.shape))
+
+
+@pytest.mark.parametrize("validation", ['full', 'boundary'])
+def test_validation_rejects_out_of_range_pixels(gray_image, validation):
+    image = gray_image.astype(np.float32)
+    image[0, 0] = 300
+    with pytest.raises(ValueError):
+        JPEGProcessor(50, validation=validation).encode_pipeline(image)
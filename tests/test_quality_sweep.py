@@ -0,0 +1,21 @@
+import pytest
+from jpeg_processor import JPEGProcessor
+from quality_sweep import quality_sweep
+
+
+@pytest.mark.parametrize("table_mode", ["optimized", "standard"])
+@pytest.mark.parametrize("image_name", ["gray_image", "color_image"])
+def test_sweep_sizes_match_encode_pipeline(request, image_name, table_mode):
+    image = request.getfixturevalue(image_name)
+    qualities = [5, 50, 95]
+    rows = quality_sweep(image, qualities, table_mode)
+    assert [row[0] for row in rows] == qualities
+    # Không có restart marker thì không có byte nhồi: kích thước chạy khô là kích thước thật
+    for quality, _, _, size_bytes, bpp in rows:
+        encoded = JPEGProcessor(quality, table_mode).encode_pipeline(image)
+        assert size_bytes == len(encoded['encoded_data'])
+        assert bpp == size_bytes * 8 / (image.shape[0] * image.shape[1])
+
+
+def test_sweep_workers_match_serial(gray_image):
+    assert quality_sweep(gray_image, [10, 60], workers=2) == quality_sweep(gray_image, [10, 60])
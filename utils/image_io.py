@@ -2,9 +2,12 @@ import os
 import numpy as np
 from PIL import Image
 import io
+from core.entropy_coding.huffman.huffman_encoder import code_strings, tables_per_channel
 
 # Đường dẫn thư mục lưu ảnh
 BASE_DIR = os.path.join("assets", "images", "processing")
+# Tên kênh cho bảng mã theo từng kênh của ảnh màu
+CHANNEL_NAMES = ("Y", "Cb", "Cr")
 
 def ensure_dir():
     """Tạo thư mục lưu ảnh nếu chưa tồn tại"""
@@ -34,6 +37,28 @@ def load_npy(filename: str, allow_pickle: bool = False) -> np.ndarray:
     path = os.path.join(BASE_DIR, filename)
     return np.load(path, allow_pickle=allow_pickle)
 
+def save_rle_csr(symbols: dict, filename: str):
+    """Lưu dạng RLE kiểu CSR (block_ptr, run, value, dc_diff) thành .npz, không cần pickle"""
+    ensure_dir()
+    path = os.path.join(BASE_DIR, filename)
+    np.savez(path, shape=np.array(symbols['shape'], dtype=np.int64),
+             restart_interval=np.array(symbols.get('restart_interval', 0)),
+             block_ptr=symbols['block_ptr'], run=symbols['run'],
+             value=symbols['value'], dc_diff=symbols['dc_diff'])
+
+def load_rle_csr(filename: str) -> dict:
+    """Đọc dạng RLE kiểu CSR đã lưu bằng save_rle_csr."""
+    path = os.path.join(BASE_DIR, filename)
+    with np.load(path) as data:
+        return {
+            'shape': tuple(int(v) for v in data['shape']),
+            'restart_interval': int(data['restart_interval']),
+            'block_ptr': data['block_ptr'],
+            'run': data['run'],
+            'value': data['value'],
+            'dc_diff': data['dc_diff'],
+        }
+
 def load_uploaded_image(uploaded_file) -> np.ndarray:
     """
     Đọc ảnh được upload từ Streamlit file_uploader.
@@ -97,31 +122,38 @@ def save_encoded_bytes_to_jpg(encoded_bytes: bytes, filename: str) -> int:
         f.write(encoded_bytes)
     return file_path
 
-def build_huffman_result(dc_codes: dict, ac_codes: dict) -> dict:
+def build_huffman_result(dc_codes, ac_codes) -> dict:
     """
     Gộp bảng mã Huffman DC và AC thành một dict duy nhất, 
     định dạng key dễ đọc để hiển thị hoặc lưu trữ.
     
     Parameters:
     -----------
-    dc_codes : dict
-        Bảng mã Huffman cho DC coefficients (key: size, value: code)
-    ac_codes : dict
-        Bảng mã Huffman cho AC coefficients (key: (run, size), value: code)
+    dc_codes : dict or list
+        Bảng mã Huffman cho DC coefficients (key: size, value: code hoặc (code, length)),
+        hoặc list bảng mã theo kênh (Y, Cb, Cr) với bảng 'standard' của ảnh màu
+    ac_codes : dict or list
+        Bảng mã Huffman cho AC coefficients (key: (run, size), value: code hoặc (code, length)),
+        hoặc list bảng mã theo kênh
     
     Returns:
     --------
     dict
-        Dict chứa tất cả mã Huffman, key dạng 'DC(x)' hoặc 'AC(run,size)'
+        Dict chứa tất cả mã Huffman, key dạng 'DC(x)' hoặc 'AC(run,size)';
+        với bảng theo kênh thêm tiền tố kênh, ví dụ 'Cb DC(x)'
     """
     huffman_result = {}
-
-    # Gộp DC codes
-    for size, code in dc_codes.items():
-        huffman_result[f"DC({size})"] = code
-
-    # Gộp AC codes
-    for (run, size), code in ac_codes.items():
-        huffman_result[f"AC({run},{size})"] = code
+    per_channel = isinstance(dc_codes, list) or isinstance(ac_codes, list)
+    num_channels = len(CHANNEL_NAMES) if per_channel else 1
+    dc_tables = tables_per_channel(dc_codes, num_channels)
+    ac_tables = tables_per_channel(ac_codes, num_channels)
+    for ch in range(num_channels):
+        prefix = f"{CHANNEL_NAMES[ch]} " if per_channel else ""
+        # Gộp DC codes
+        for size, code in code_strings(dc_tables[ch]).items():
+            huffman_result[f"{prefix}DC({size})"] = code
+        # Gộp AC codes
+        for (run, size), code in code_strings(ac_tables[ch]).items():
+            huffman_result[f"{prefix}AC({run},{size})"] = code
 
     return huffman_result